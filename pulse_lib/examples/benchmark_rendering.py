@@ -0,0 +1,150 @@
+'''
+Micro-benchmarks for the rendering of pulse data.
+'''
+import copy
+import time
+import numpy as np
+
+from pulse_lib.segments.data_classes.data_pulse import pulse_data, PhaseShift
+from pulse_lib.segments.data_classes.data_IQ import IQ_data_single
+from pulse_lib.segments.utility.rounding import iround
+
+
+def make_pulse_data(n_deltas, seed=1):
+    '''
+    Creates pulse data with n_deltas deltas: a mix of blocks and ramps.
+    '''
+    rng = np.random.default_rng(seed)
+    data = pulse_data()
+    t = 0.0
+    for i in range(n_deltas//2):
+        duration = float(rng.integers(5, 50))
+        if i % 2:
+            amplitude = rng.uniform(-200, 200)
+            data.add_delta(t, amplitude, 0.0)
+            data.add_delta(t+duration, -amplitude, 0.0)
+        else:
+            ramp = rng.uniform(-2, 2)
+            data.add_delta(t, 0.0, ramp)
+            data.add_delta(t+duration, -ramp*duration, -ramp)
+        t += duration + 5
+    data._pre_process()
+    return data
+
+
+def time_it(func, n_rep):
+    t_start = time.perf_counter()
+    for _ in range(n_rep):
+        func()
+    return (time.perf_counter() - t_start) / n_rep
+
+
+def benchmark_baseband(sample_rate=1e9):
+    '''
+    Compares the vectorized baseband rendering with the interval-by-interval loop.
+    '''
+    print(f'{"deltas":>8} {"loop [ms]":>10} {"vectorized [ms]":>16} {"speedup":>8}')
+    for n_deltas in [10, 100, 1_000, 10_000, 100_000]:
+        data = make_pulse_data(n_deltas)
+        sr = sample_rate*1e-9
+        t_pt = iround(data._times * sr)
+        n_pt = iround(data.total_time * sr) + 1
+
+        def render_loop():
+            data._render_baseband_loop(np.zeros(n_pt), t_pt)
+
+        def render_vectorized():
+            data._render_baseband(np.zeros(n_pt), t_pt)
+
+        n_rep = max(1, 20_000//n_deltas)
+        t_loop = time_it(render_loop, n_rep)
+        t_vec = time_it(render_vectorized, n_rep)
+        print(f'{n_deltas:8} {t_loop*1000:10.3f} {t_vec*1000:16.3f} {t_loop/t_vec:8.1f}')
+
+
+def benchmark_construction():
+    '''
+    Measures adding, consolidating, copying and repeating deltas.
+    '''
+    print(f'{"deltas":>8} {"add [ms]":>10} {"consolidate [ms]":>17} {"copy [ms]":>10} {"repeat [ms]":>12}')
+    for n_deltas in [10, 100, 1_000, 10_000, 100_000]:
+        n_rep = max(1, 20_000//n_deltas)
+        t_add = t_consolidate = t_copy = t_repeat = 0.0
+        for _ in range(n_rep):
+            t_start = time.perf_counter()
+            data = pulse_data()
+            for i in range(n_deltas//2):
+                data.add_delta(i*10.0, 1.0, 0.0)
+                data.add_delta(i*10.0+5.0, -1.0, 0.0)
+            t1 = time.perf_counter()
+            data._consolidate()
+            t2 = time.perf_counter()
+            data_copy = copy.copy(data)
+            t3 = time.perf_counter()
+            data_copy.repeat(10)
+            t4 = time.perf_counter()
+            t_add += t1 - t_start
+            t_consolidate += t2 - t1
+            t_copy += t3 - t2
+            t_repeat += t4 - t3
+        print(f'{n_deltas:8} {t_add/n_rep*1000:10.3f} {t_consolidate/n_rep*1000:17.3f} '
+              f'{t_copy/n_rep*1000:10.3f} {t_repeat/n_rep*1000:12.3f}')
+
+
+class RefChannelStates:
+    start_time = 0.0
+    start_phase = {'q1': 0.0}
+
+
+def benchmark_MW(sample_rate=1e9):
+    '''
+    Measures rendering of MW pulses with a virtual Z (phase shift) after every pulse.
+    '''
+    print(f'{"pulses":>8} {"render [ms]":>12}')
+    for n_pulses in [10, 100, 1_000, 10_000]:
+        data = pulse_data()
+        for i in range(n_pulses):
+            t = i*25.0
+            data.add_MW_data(IQ_data_single(t, t+20, 100.0, 20e6, 0.0, None, 'q1'))
+            data.add_phase_shift(PhaseShift(t+20, np.pi/2, 'q1'))
+
+        n_rep = max(1, 2_000//n_pulses)
+        t_render = time_it(lambda: data._render(sample_rate, RefChannelStates()), n_rep)
+        print(f'{n_pulses:8} {t_render*1000:12.3f}')
+
+
+def benchmark_repeat(sample_rate=1e9):
+    '''
+    Compares rendering of a repeated unit cell with rendering of the explicit repetitions.
+    '''
+    print(f'{"repeats":>8} {"expanded [ms]":>14} {"repeated [ms]":>14} {"speedup":>8}')
+    for n_repeat in [10, 100, 1_000, 10_000]:
+        cell = pulse_data()
+        cell.add_delta(10.0, 100.0, 0.0)
+        cell.add_delta(60.0, -100.0, 0.0)
+        cell.add_MW_data(IQ_data_single(70.0, 90.0, 100.0, 20e6, 0.0, None, 'q1'))
+        cell.add_phase_shift(PhaseShift(90.0, np.pi/2, 'q1'))
+        cell.wait(10.0)
+
+        def render_expanded():
+            data = copy.copy(cell)
+            data.repeat(n_repeat)
+            data._expand()
+            data._render(sample_rate, RefChannelStates())
+
+        def render_repeated():
+            data = copy.copy(cell)
+            data.repeat(n_repeat)
+            data._render(sample_rate, RefChannelStates())
+
+        n_rep = max(1, 2_000//n_repeat)
+        t_expanded = time_it(render_expanded, n_rep)
+        t_repeated = time_it(render_repeated, n_rep)
+        print(f'{n_repeat:8} {t_expanded*1000:14.3f} {t_repeated*1000:14.3f} {t_expanded/t_repeated:8.1f}')
+
+
+if __name__ == '__main__':
+    benchmark_baseband()
+    benchmark_construction()
+    benchmark_MW()
+    benchmark_repeat()
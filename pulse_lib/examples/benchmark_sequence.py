@@ -0,0 +1,84 @@
+'''
+Benchmarks for the construction and first upload of a 2D swept sequence.
+Measures execution time and peak memory (allocated by Python objects).
+'''
+import time
+import tracemalloc
+
+import pulse_lib.segments.utility.looping as lp
+from pulse_lib.segments.data_classes.data_generic import parent_data
+from pulse_lib.tests.hw_schedule_mock import HardwareScheduleMock
+
+from configuration.small import init_hardware, init_pulselib
+
+
+class Measurement:
+    '''
+    Measures the execution time, or with trace_memory=True the peak memory.
+    Memory tracing slows down the execution considerably.
+    '''
+    def __init__(self, name, trace_memory):
+        self.name = name
+        self.trace_memory = trace_memory
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self.t_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self.t_start
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f'{self.name:16} {peak/1e6:10.1f} MB')
+        else:
+            print(f'{self.name:16} {duration*1000:10.1f} ms')
+
+
+def create_sweep_sequence(pulse, n_pulses=20, n_points=(100, 100)):
+    '''
+    Creates a sequence with 2D sweep: amplitude and pulse duration.
+    '''
+    seg = pulse.mk_segment()
+    amplitude = lp.linspace(10, 100, n_points[0], axis=0, name='amplitude', unit='mV')
+    duration = lp.linspace(100, 200, n_points[1], axis=1, name='duration', unit='ns')
+
+    for i in range(n_pulses):
+        seg.vP1.add_block(0, 100, 50)
+        seg.vP2.add_ramp_ss(0, 100, 20, 80)
+        seg.reset_time()
+    seg.vP1.add_block(0, duration, amplitude)
+    seg.vP2.add_block(0, 1000, -20)
+
+    return pulse.mk_sequence([seg])
+
+
+def benchmark_2D_sweep(n_points=(100, 100), trace_memory=False):
+    awgs = init_hardware()
+    pulse = init_pulselib(awgs, virtual_gates=True)
+    parent_data.clear_waveform_cache()
+    parent_data.waveform_cache.reset_stats()
+
+    with Measurement('add_sequence', trace_memory):
+        sequence = create_sweep_sequence(pulse, n_points=n_points)
+    sequence.set_hw_schedule(HardwareScheduleMock())
+    sequence.n_rep = 1
+
+    with Measurement('first upload', trace_memory):
+        sequence.upload((0, 0))
+        sequence.play((0, 0))
+    with Measurement('next upload', trace_memory):
+        sequence.upload((1, 1))
+        sequence.play((1, 1))
+    print(parent_data.cache_stats())
+
+    sequence.close()
+
+
+if __name__ == '__main__':
+    print('Execution time')
+    benchmark_2D_sweep()
+    print('Peak memory')
+    benchmark_2D_sweep(trace_memory=True)
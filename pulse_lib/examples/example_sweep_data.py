@@ -0,0 +1,53 @@
+import numpy as np
+import matplotlib.pyplot as pt
+
+from pulse_lib.tests.hw_schedule_mock import HardwareScheduleMock
+import pulse_lib.segments.utility.looping as lp
+
+from configuration.small import init_hardware, init_pulselib
+
+from utils.plot import plot_awgs
+
+
+def create_sweep(pulse_lib, sweep_data):
+    seg = pulse_lib.mk_segment()
+    if sweep_data:
+        # store pulses as arrays over the sweep instead of a pulse_data object per index
+        seg.P1.enable_sweep_data()
+        seg.P2.enable_sweep_data()
+
+    v_P1 = lp.linspace(-100, 100, 200, axis=0, name='vP1', unit='mV')
+    v_P2 = lp.linspace(-100, 100, 200, axis=1, name='vP2', unit='mV')
+    t_wait = lp.linspace(1000, 5000, 3, axis=2, name='t_wait', unit='ns')
+
+    seg.P1.add_block(0, 1000, v_P1)
+    seg.P2.add_block(0, 1000, v_P2)
+    seg.P1.add_ramp_ss(1000, 1200, v_P1, 0)
+    seg.P2.wait(t_wait)
+    seg.reset_time()
+    seg.add_block(0, 500, ['vP1', 'vP2'], [20, -20])
+
+    # generate the sequence from segments
+    my_seq = pulse_lib.mk_sequence([seg])
+    my_seq.set_hw_schedule(HardwareScheduleMock())
+    my_seq.n_rep = 1
+
+    return my_seq
+
+
+# create "AWG1"
+awgs = init_hardware()
+
+# create channels P1, P2
+p = init_pulselib(awgs, virtual_gates=True)
+
+my_seq = create_sweep(p, sweep_data=True)
+print(f"sweep shape: {my_seq.shape}")
+
+index = (1, 150, 50)
+my_seq.upload(index)
+my_seq.play(index)
+
+plot_awgs(awgs)
+pt.title(f'AWG upload of index {index}')
+pt.grid(True)
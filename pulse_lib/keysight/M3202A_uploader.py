@@ -1,9 +1,20 @@
 import time
+import threading
 import numpy as np
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from typing import List, Dict, Optional
 
+from .delta_upload import ChannelUpload, DeltaUploadCache, get_layout_key
+from .job_registry import JobRegistry
+from .upload_pipeline import PendingWaveform, UploadFuture, UploadPipeline
+from .waveform_pool import SharedWaveform, WaveformPool, get_awg_reference
+from .render_engine import ChannelRenderDescription, render_channels
+from pulse_lib.segments.data_classes.data_generic import parent_data
+from pulse_lib.segments.utility.ref_channels import RefChannels
+from .run_length import compress_waveform, MIN_RUN_SAMPLES
+
 
 class AwgConfig:
     MAX_AMPLITUDE = 1500 # mV
@@ -33,7 +44,16 @@ class M3202A_Uploader:
         self.qubit_channels = qubit_channels
         self.digitizer_channels = digitizer_channels
 
-        self.jobs = []
+        self.jobs = JobRegistry()
+        # lock for AWG access and job release
+        self._lock = threading.RLock()
+        self._pipeline = None
+        self._render_executor = None
+        self._owns_render_executor = False
+        self._waveform_pool = None
+        self._delta_cache = None
+        self._playing_job = None
+        self._run_length_min_samples = None
 
         self._config_marker_channels()
 
@@ -66,7 +86,7 @@ class M3202A_Uploader:
     def create_job(self, sequence, index, seq_id, n_rep, sample_rate, neutralize=True):
         # remove any old job with same sequencer and index
         self.release_memory(seq_id, index)
-        return Job(self.jobs, sequence, index, seq_id, n_rep, sample_rate, neutralize)
+        return Job(self.jobs, sequence, index, seq_id, n_rep, sample_rate, neutralize, lock=self._lock)
 
 
     def add_upload_job(self, job):
@@ -87,16 +107,148 @@ class M3202A_Uploader:
         '''
         start = time.perf_counter()
 
-        aggregator = UploadAggregator(self.awg_channels, self.marker_channels,
-                                      self.qubit_channels, self.digitizer_channels)
+        self.jobs.add(job)
 
-        aggregator.upload_job(job, self.__upload_to_awg) # @@@ TODO split generation and upload
+        if self._pipeline is not None:
+            # render and upload in background
+            self._pipeline.submit(job)
+            return
 
-        self.jobs.append(job)
+        try:
+            self._render_job(job, self.__upload_to_awg)
+        except Exception as ex:
+            job._set_exception(ex)
+            job.release()
+            raise
+        job._set_done()
 
         duration = time.perf_counter() - start
         logging.debug(f'generated upload data ({duration*1000:6.3f} ms)')
 
+    def _render_job(self, job, awg_upload_func):
+        aggregator = UploadAggregator(self.awg_channels, self.marker_channels,
+                                      self.qubit_channels, self.digitizer_channels,
+                                      executor=self._render_executor,
+                                      delta_cache=self._delta_cache,
+                                      run_length_min_samples=self._run_length_min_samples)
+
+        # record the cached waveforms used by the job
+        with parent_data.waveform_cache.record_keys(job.cache_keys):
+            aggregator.upload_job(job, awg_upload_func)
+
+    def set_render_executor(self, executor):
+        '''
+        Sets the executor to render the AWG channels concurrently.
+        Rendering releases the GIL for most of the numpy operations.
+        A ProcessRenderEngine renders the channels in other processes.
+        Args:
+            executor (Union[concurrent.futures.Executor, ProcessRenderEngine, int, None]):
+                executor, number of render threads, or None to render channels sequentially.
+        '''
+        if self._owns_render_executor:
+            self._render_executor.shutdown()
+        self._owns_render_executor = isinstance(executor, int)
+        if self._owns_render_executor:
+            executor = ThreadPoolExecutor(executor, thread_name_prefix='pulselib-render-channel')
+        self._render_executor = executor
+
+    def set_waveform_pool(self, max_bytes_per_module):
+        '''
+        Enables reuse of uploaded waveforms. Waveforms with equal content are uploaded
+        once and shared between jobs. Waveforms that are not used anymore are kept in
+        the AWG memory till the budget is reached.
+        Args:
+            max_bytes_per_module (Optional[int]):
+                AWG memory budget of the pool per module. None disables the pool.
+        '''
+        with self._lock:
+            if self._waveform_pool is not None:
+                self._waveform_pool.close()
+            if max_bytes_per_module is not None:
+                self._waveform_pool = WaveformPool(max_bytes_per_module)
+            else:
+                self._waveform_pool = None
+
+    def get_waveform_pool_stats(self):
+        '''
+        Returns list with the statistics of the waveform pool per AWG module.
+        '''
+        if self._waveform_pool is None:
+            return []
+        return self._waveform_pool.stats()
+
+    def set_delta_upload(self, enable):
+        '''
+        Enables delta uploads. A channel is only rendered and uploaded when its waveform
+        differs from the waveform of the previous upload of the sequence. The waveforms
+        of the last upload of every channel are kept in AWG memory till the sequence is released.
+        Args:
+            enable (bool): if True reuse waveforms of unchanged channels.
+        '''
+        with self._lock:
+            if self._delta_cache is not None:
+                self._delta_cache.release()
+            self._delta_cache = DeltaUploadCache(self._lock) if enable else None
+
+    def get_delta_upload_stats(self):
+        '''
+        Returns the number of rendered and reused channel waveforms, or None if delta upload is disabled.
+        '''
+        if self._delta_cache is None:
+            return None
+        return self._delta_cache.stats()
+
+    def set_run_length_compression(self, min_samples):
+        '''
+        Enables run-length compression of the waveforms. Constant runs of at least
+        min_samples, e.g. waits and DC compensation, are uploaded as a short waveform
+        that is queued with cycles > 1. A run is only compressed when the saved samples
+        outweigh the cost of the extra waveforms and queue entries.
+        Identical constant chunks are uploaded once per job.
+        Args:
+            min_samples (Optional[int]): minimum length of a constant run to compress,
+                at least 200. E.g. 1000. None disables compression.
+        '''
+        if min_samples is not None and min_samples < MIN_RUN_SAMPLES:
+            raise ValueError(f'min_samples must be at least {MIN_RUN_SAMPLES}')
+        self._run_length_min_samples = min_samples
+
+    def start_pipeline(self, max_ready_jobs=4):
+        '''
+        Starts pipelined upload. Jobs are rendered in a background thread and uploaded
+        to the AWGs in a second thread while the AWG plays the current index.
+        `sequencer.upload()` returns immediately. Use `job.result()` to wait for the upload.
+        Args:
+            max_ready_jobs (int): maximum number of rendered jobs waiting for upload.
+        '''
+        if self._pipeline is None:
+            self._pipeline = UploadPipeline(self._render_pending_waveforms,
+                                            self._upload_pending_waveforms,
+                                            max_ready_jobs)
+
+    def stop_pipeline(self):
+        '''
+        Stops pipelined upload after all submitted jobs have been uploaded.
+        '''
+        if self._pipeline is not None:
+            self._pipeline.stop()
+            self._pipeline = None
+
+    def _render_pending_waveforms(self, job):
+        self._render_job(job, PendingWaveform)
+
+    def _upload_pending_waveforms(self, job):
+        for queue in job.channel_queues.values():
+            for queue_item in queue:
+                with self._lock:
+                    if job.released:
+                        return
+                    pending = queue_item.wave_reference
+                    if isinstance(pending, SharedWaveform):
+                        pending.upload_pending(self.__upload_to_awg)
+                    elif isinstance(pending, PendingWaveform):
+                        queue_item.wave_reference = self.__upload_to_awg(pending.channel_name, pending.waveform)
+
 
     def __upload_to_awg(self, channel_name, waveform):
 #        vmin = waveform.min()
@@ -110,7 +262,11 @@ class M3202A_Uploader:
         else:
             raise Exception(f'Channel {channel_name} not found in configuration')
         awg = self.AWGs[awg_name]
-        wave_ref = awg.upload_waveform(waveform)
+        with self._lock:
+            if self._waveform_pool is not None:
+                wave_ref = self._waveform_pool.upload(awg, waveform)
+            else:
+                wave_ref = awg.upload_waveform(waveform)
         return wave_ref
 
     def __upload_markers(self, channel_name, table):
@@ -132,9 +288,9 @@ class M3202A_Uploader:
         Return:
             job (upload_job) :job, with locations of the sequences to be uploaded.
         """
-        for job in self.jobs:
-            if job.seq_id == seq_id and job.index == index and not job.released:
-                return job
+        job = self.jobs.get(seq_id, index)
+        if job is not None and not job.released:
+            return job
 
         logging.error(f'Job not found for index {index} of seq {seq_id}')
         raise ValueError(f'Sequence with id {seq_id}, index {index} not placed for upload .. . Always make sure to first upload your segment and then do the playback.')
@@ -150,78 +306,109 @@ class M3202A_Uploader:
         """
 
         job =  self.__get_job(seq_id, index)
+        # wait till job is uploaded. Raises exception if upload failed.
+        job.result()
         self.wait_until_AWG_idle()
 
-        for channel_name, marker_table in job.marker_tables.items():
-            self.__upload_markers(channel_name, marker_table)
-
-        # queue waveforms
-        for channel_name, queue in job.channel_queues.items():
-            offset = 0
-
-            if channel_name in self.awg_channels:
-                channel = self.awg_channels[channel_name]
-                awg_name = channel.awg_name
-                channel_number = channel.channel_number
-                amplitude = channel.amplitude if channel.amplitude is not None else AwgConfig.MAX_AMPLITUDE
-            elif channel_name in self.marker_channels:
-                channel = self.marker_channels[channel_name]
-                awg_name = channel.module_name
-                channel_number = channel.channel_number
-                amplitude = channel.amplitude
-                if channel.invert:
-                    offset = amplitude
-                    amplitude = -amplitude
-            else:
-                raise Exception(f'Undefined channel {channel_name}')
+        with self._lock:
+            self._set_playing_job(job)
 
-            self.AWGs[awg_name].set_channel_amplitude(amplitude/1000, channel_number)
-            self.AWGs[awg_name].set_channel_offset(offset/1000, channel_number)
+            for channel_name, marker_table in job.marker_tables.items():
+                self.__upload_markers(channel_name, marker_table)
 
-            # empty AWG queue
-            self.AWGs[awg_name].awg_flush(channel_number)
+            # queue waveforms
+            for channel_name, queue in job.channel_queues.items():
+                offset = 0
 
-            start_delay = 0 # no start delay
-            trigger_mode = 1 # software/HVI trigger
-            cycles = 1
-            for queue_item in queue:
-                awg = self.AWGs[awg_name]
-                prescaler = awg.convert_sample_rate_to_prescaler(queue_item.sample_rate)
-                awg.awg_queue_waveform(
-                        channel_number, queue_item.wave_reference,
-                        trigger_mode, start_delay, cycles, prescaler)
-                trigger_mode = 0 # Auto tigger -- next waveform will play automatically.
-
-        # start hvi (start function loads schedule if not yet loaded)
-        acquire_triggers = {f'dig_trigger_{i+1}':t for i,t in enumerate(job.digitizer_triggers)}
-        trigger_channels = {f'dig_trigger_channels_{dig_name}':triggers
-                            for dig_name, triggers in job.digitizer_trigger_channels.items()}
-        schedule_params = job.schedule_params.copy()
-        schedule_params.update(acquire_triggers)
-        schedule_params.update(trigger_channels)
-        job.hw_schedule.set_configuration(schedule_params, job.n_waveforms)
-        job.hw_schedule.start(job.playback_time, job.n_rep, schedule_params)
+                if channel_name in self.awg_channels:
+                    channel = self.awg_channels[channel_name]
+                    awg_name = channel.awg_name
+                    channel_number = channel.channel_number
+                    amplitude = channel.amplitude if channel.amplitude is not None else AwgConfig.MAX_AMPLITUDE
+                elif channel_name in self.marker_channels:
+                    channel = self.marker_channels[channel_name]
+                    awg_name = channel.module_name
+                    channel_number = channel.channel_number
+                    amplitude = channel.amplitude
+                    if channel.invert:
+                        offset = amplitude
+                        amplitude = -amplitude
+                else:
+                    raise Exception(f'Undefined channel {channel_name}')
+
+                self.AWGs[awg_name].set_channel_amplitude(amplitude/1000, channel_number)
+                self.AWGs[awg_name].set_channel_offset(offset/1000, channel_number)
+
+                # empty AWG queue
+                self.AWGs[awg_name].awg_flush(channel_number)
+
+                start_delay = 0 # no start delay
+                trigger_mode = 1 # software/HVI trigger
+                for queue_item in queue:
+                    awg = self.AWGs[awg_name]
+                    prescaler = awg.convert_sample_rate_to_prescaler(queue_item.sample_rate)
+                    awg.awg_queue_waveform(
+                            channel_number, get_awg_reference(queue_item.wave_reference),
+                            trigger_mode, start_delay, queue_item.cycles, prescaler)
+                    trigger_mode = 0 # Auto tigger -- next waveform will play automatically.
+
+            # start hvi (start function loads schedule if not yet loaded)
+            acquire_triggers = {f'dig_trigger_{i+1}':t for i,t in enumerate(job.digitizer_triggers)}
+            trigger_channels = {f'dig_trigger_channels_{dig_name}':triggers
+                                for dig_name, triggers in job.digitizer_trigger_channels.items()}
+            schedule_params = job.schedule_params.copy()
+            schedule_params.update(acquire_triggers)
+            schedule_params.update(trigger_channels)
+            job.hw_schedule.set_configuration(schedule_params, job.n_waveforms)
+            job.hw_schedule.start(job.playback_time, job.n_rep, schedule_params)
 
         if release_job:
             job.release()
 
 
+    def _set_playing_job(self, job):
+        # The waveforms of the playing job stay pinned in the waveform cache
+        # till the next job is played, also when the job is released.
+        previous = self._playing_job
+        if previous is job:
+            return
+        if job is not None:
+            job.pin_cached_waveforms()
+            job.playing = True
+        if previous is not None:
+            previous.playing = False
+            if previous.released:
+                previous.unpin_cached_waveforms()
+        self._playing_job = job
+
     def release_memory(self, seq_id=None, index=None):
         """
         Release job memory for `seq_id` and `index`.
         Args:
-            seq_id (uuid) : id of the sequence. if None release all
-            index (tuple) : index that has to be released; if None release all.
+            seq_id (uuid) : id of the sequence. if None release all, including the unused waveforms in the pool.
+            index (tuple) : index that has to be released; if None release all, including the waveforms kept for delta upload.
         """
-        for job in self.jobs:
-            if (seq_id is None
-                or (job.seq_id == seq_id and (index is None or job.index == index))):
-                job.release()
+        self.jobs.release(seq_id, index)
+        if index is None and self._delta_cache is not None:
+            with self._lock:
+                self._delta_cache.release(seq_id)
+        if seq_id is None and self._waveform_pool is not None:
+            self._waveform_pool.clear()
+        if seq_id is None:
+            with self._lock:
+                self._set_playing_job(None)
 
 
     def release_jobs(self):
-        for job in self.jobs:
-            job.release()
+        self.jobs.release()
+        with self._lock:
+            self._set_playing_job(None)
+
+    def get_job_stats(self):
+        '''
+        Returns the number of outstanding jobs and the size of their waveforms.
+        '''
+        return self.jobs.stats()
 
 
     def wait_until_AWG_idle(self):
@@ -232,7 +419,10 @@ class M3202A_Uploader:
         channel = list(self.awg_channels.values())[0]
         awg = self.AWGs[channel.awg_name]
 
-        while awg.awg_is_running(channel.channel_number):
+        while True:
+            with self._lock:
+                if not awg.awg_is_running(channel.channel_number):
+                    return
             time.sleep(0.001)
 
 
@@ -240,14 +430,16 @@ class M3202A_Uploader:
 class AwgQueueItem:
     wave_reference: object
     sample_rate: float
+    cycles: int = 1
 
 
-class Job(object):
+class Job(UploadFuture):
     """docstring for upload_job"""
-    def __init__(self, job_list, sequence, index, seq_id, n_rep, sample_rate, neutralize=True, priority=0):
+    def __init__(self, job_registry, sequence, index, seq_id, n_rep, sample_rate, neutralize=True, priority=0,
+                 lock=None):
         '''
         Args:
-            job_list (list): list with all jobs.
+            job_registry (JobRegistry): registry with all jobs.
             sequence (list of list): list with list of the sequence
             index (tuple) : index that needs to be uploaded
             seq_id (uuid) : if of the sequence
@@ -255,8 +447,9 @@ class Job(object):
             sample_rate (float) : sample rate
             neutralize (bool) : place a neutralizing segment at the end of the upload
             priority (int) : priority of the job (the higher one will be excuted first)
+            lock (threading.RLock): lock for AWG access shared with uploader.
         '''
-        self.job_list = job_list
+        self.job_registry = job_registry
         self.sequence = sequence
         self.seq_id = seq_id
         self.index = index
@@ -267,9 +460,16 @@ class Job(object):
         self.playback_time = 0 #total playtime of the waveform
 
         self.released = False
+        self.playing = False
+        # keys of the waveforms in the waveform cache used by the job
+        self.cache_keys = set()
+        self._pinned_cache = None
 
         self.channel_queues = dict()
+        self.waveform_nbytes = 0
         self.hw_schedule = None
+        self._lock = lock if lock is not None else threading.RLock()
+        self._init_future()
         logging.debug(f'new job {seq_id}-{index}')
 
 
@@ -283,28 +483,47 @@ class Job(object):
         self.hw_schedule = hw_schedule
         self.schedule_params = schedule_params
 
-    def add_waveform(self, channel_name, wave_ref, sample_rate):
+    def add_waveform(self, channel_name, wave_ref, sample_rate, nbytes=0, cycles=1):
         if channel_name not in self.channel_queues:
             self.channel_queues[channel_name] = []
 
-        self.channel_queues[channel_name].append(AwgQueueItem(wave_ref, sample_rate))
+        self.channel_queues[channel_name].append(AwgQueueItem(wave_ref, sample_rate, cycles))
+        self.waveform_nbytes += nbytes
 
 
     def release(self):
-        if self.released:
-            logging.warning(f'job {self.seq_id}-{self.index} already released')
-            return
+        with self._lock:
+            if self.released:
+                logging.warning(f'job {self.seq_id}-{self.index} already released')
+                return
 
-        self.upload_info = None
-        logging.debug(f'release job {self.seq_id}-{self.index}')
-        self.released = True
+            self.upload_info = None
+            logging.debug(f'release job {self.seq_id}-{self.index}')
+            self.released = True
 
-        for channel_name, queue in self.channel_queues.items():
-            for queue_item in queue:
-                queue_item.wave_reference.release()
+            for channel_name, queue in self.channel_queues.items():
+                for queue_item in queue:
+                    queue_item.wave_reference.release()
+
+            if not self.playing:
+                self.unpin_cached_waveforms()
+
+            self.job_registry.remove(self)
+
+    def pin_cached_waveforms(self):
+        '''
+        Pins the waveforms used by the job in the waveform cache.
+        '''
+        with self._lock:
+            if self._pinned_cache is None:
+                self._pinned_cache = parent_data.waveform_cache
+                self._pinned_cache.pin_keys(self.cache_keys)
 
-        if self in self.job_list:
-            self.job_list.remove(self)
+    def unpin_cached_waveforms(self):
+        with self._lock:
+            if self._pinned_cache is not None:
+                self._pinned_cache.unpin_keys(self.cache_keys)
+                self._pinned_cache = None
 
 
     def __del__(self):
@@ -317,6 +536,7 @@ class Job(object):
 @dataclass
 class ChannelInfo:
     # static data
+    awg_name: str = ''
     delay_ns: float = 0
     amplitude: float = 0
     attenuation: float = 1.0
@@ -349,6 +569,8 @@ class JobUploadInfo:
     sections: List[RenderSection] = field(default_factory=list)
     dc_compensation_duration: float = 0.0
     dc_compensation_voltages: Dict[str, float] = field(default_factory=dict)
+    # wave references of constant chunks of compressed waveforms {(channel, n_samples, value): SharedWaveform}
+    constant_chunks: Dict[tuple, SharedWaveform] = field(default_factory=dict)
 
 
 @dataclass
@@ -370,28 +592,26 @@ class SegmentRenderInfo:
     def t_end(self):
         return self.t_start + self.npt / self.sample_rate
 
-@dataclass
-class RefChannels:
-    start_time: float
-    start_phase: Dict[str,float] = field(default_factory=dict)
-    start_phases_all: List[Dict[str,float]] = field(default_factory=list)
-
-
 class UploadAggregator:
     verbose = False
 
-    def __init__(self, awg_channels, marker_channels, qubit_channels, digitizer_channels):
+    def __init__(self, awg_channels, marker_channels, qubit_channels, digitizer_channels, executor=None,
+                 delta_cache=None, run_length_min_samples=None):
         self.npt = 0
         self.marker_channels = marker_channels
         self.digitizer_channels = digitizer_channels
         self.qubit_channels = qubit_channels
         self.channels = dict()
+        self.executor = executor
+        self.delta_cache = delta_cache
+        self.run_length_min_samples = run_length_min_samples
 
         delays = []
         for channel in awg_channels.values():
             info = ChannelInfo()
             self.channels[channel.name] = info
 
+            info.awg_name = channel.awg_name
             info.attenuation = channel.attenuation
             info.delay_ns = channel.delay
             info.amplitude = channel.amplitude if channel.amplitude is not None else AwgConfig.MAX_AMPLITUDE
@@ -531,130 +751,111 @@ class UploadAggregator:
 
 
     def _generate_upload(self, job, awg_upload_func):
-        segments = self.segments
-        sections = job.upload_info.sections
-        ref_channel_states = RefChannels(0)
+        start_phases_all = [dict() for i in range(len(job.sequence))]
 
         # loop over all qubit channels to accumulate total phase shift
-        for i in range(len(job.sequence)):
-            ref_channel_states.start_phases_all.append(dict())
         for channel_name, qubit_channel in self.qubit_channels.items():
             phase = 0
             for iseg,seg in enumerate(job.sequence):
-                ref_channel_states.start_phases_all[iseg][channel_name] = phase
+                start_phases_all[iseg][channel_name] = phase
                 #print(f'phase: {channel_name}.{iseg}: {phase}')
                 seg_ch = getattr(seg, channel_name)
                 phase += seg_ch.get_accumulated_phase(job.index)
 
+        channels = []
         for channel_name, channel_info in self.channels.items():
-            section = sections[0]
-            buffer = np.zeros(section.npt)
-            bias_T_compensation_mV = 0
-
-            for iseg,(seg,seg_render) in enumerate(zip(job.sequence,segments)):
-
-                sample_rate = seg_render.sample_rate
-                n_delay = round(channel_info.delay_ns * sample_rate)
-
-                seg_ch = getattr(seg, channel_name)
-                ref_channel_states.start_time = seg_render.t_start
-                ref_channel_states.start_phase = ref_channel_states.start_phases_all[iseg]
-                start = time.perf_counter()
-                #print(f'start: {channel_name}.{iseg}: {ref_channel_states.start_time}')
-                wvf = seg_ch.get_segment(job.index, sample_rate*1e9, ref_channel_states)
-                duration = time.perf_counter() - start
-                logging.debug(f'generated [{job.index}]{iseg}:{channel_name} {len(wvf)} Sa, in {duration*1000:6.3f} ms')
-
-                if len(wvf) != seg_render.npt:
-                    logging.warn(f'waveform {iseg}:{channel_name} {len(wvf)} Sa <> sequence length {seg_render.npt}')
-
-                i_start = 0
-                if seg_render.start_section:
-                    if section != seg_render.start_section:
-                        logging.error(f'OOPS section mismatch {iseg}, {channel_name}')
-
-                    # add n_start_transition - n_delay to start_section
-#                    n_delay_welding = round(channel_info.delay_ns * section.sample_rate)
-                    t_welding = (section.t_end - seg_render.t_start)
-                    i_start = round(t_welding*sample_rate) - n_delay
-                    n_section = round(t_welding*section.sample_rate) + round(-channel_info.delay_ns * section.sample_rate)
-
-                    if n_section > 0:
-                        if np.round(n_section*sample_rate/section.sample_rate) >= len(wvf):
-                            raise Exception(f'segment {iseg} too short for welding. (nwelding:{n_section}, len_wvf:{len(wvf)})')
-
-                        isub = [np.round(i*sample_rate/section.sample_rate) for i in np.arange(n_section)]
-                        welding_samples = np.take(wvf, isub)
-                        buffer[-n_section:] = welding_samples
-
-                    bias_T_compensation_mV = self._add_bias_T_compensation(buffer, bias_T_compensation_mV,
-                                                                           section.sample_rate, channel_info)
-                    self._upload_wvf(job, channel_name, buffer, channel_info.amplitude, channel_info.attenuation,
-                                     section.sample_rate, awg_upload_func)
-
-                    section = seg_render.section
-                    buffer = np.zeros(section.npt)
-
-
-                if seg_render.end_section:
-                    next_section = seg_render.end_section
-                    # add n_end_transition + n_delay to next section. First complete this section
-                    n_delay_welding = round(channel_info.delay_ns * section.sample_rate)
-                    t_welding = (seg_render.t_end - next_section.t_start)
-                    i_end = len(wvf) - round(t_welding*sample_rate) + n_delay_welding
-
-                    if i_start != i_end:
-                        buffer[-(i_end-i_start):] = wvf[i_start:i_end]
-
-                    bias_T_compensation_mV = self._add_bias_T_compensation(buffer, bias_T_compensation_mV,
-                                                                           section.sample_rate, channel_info)
-                    self._upload_wvf(job, channel_name, buffer, channel_info.amplitude, channel_info.attenuation,
-                                     section.sample_rate, awg_upload_func)
-
-                    section = next_section
-                    buffer = np.zeros(section.npt)
-
-                    n_section = round(t_welding*section.sample_rate) + round(channel_info.delay_ns * section.sample_rate)
-                    if np.round(n_section*sample_rate/section.sample_rate) >= len(wvf):
-                        raise Exception(f'segment {iseg} too short for welding. (nwelding:{n_section}, len_wvf:{len(wvf)})')
-
-                    isub = [min(len(wvf)-1, i_end + np.round(i*sample_rate/section.sample_rate)) for i in np.arange(n_section)]
-                    welding_samples = np.take(wvf, isub)
-                    buffer[:n_section] = welding_samples
-
-                else:
-                    if section != seg_render.section:
-                        logging.error(f'OOPS-2 section mismatch {iseg}, {channel_name}')
-                    offset = seg_render.offset + n_delay
-                    buffer[offset+i_start:offset + len(wvf)] = wvf[i_start:]
-
-
-            if job.neutralize:
-                if section != sections[-1]:
-                    # Corner case, DC compensation is in a new section # @@@ can this occur??
-                    bias_T_compensation_mV = self._add_bias_T_compensation(buffer, bias_T_compensation_mV,
-                                                                           section.sample_rate, channel_info)
-                    self._upload_wvf(job, channel_name, buffer, channel_info.amplitude, channel_info.attenuation,
-                                     section.sample_rate, awg_upload_func)
-                    section = sections[-1]
-                    buffer = np.zeros(section.npt)
-                    logging.info(f'DC compensation: Corner case {section}')
-
-                compensation_npt = round(job.upload_info.dc_compensation_duration * section.sample_rate)
-
-                if compensation_npt > 0 and channel_info.dc_compensation:
-                    compensation_voltage = -channel_info.integral * sample_rate / compensation_npt * 1e9
-                    job.upload_info.dc_compensation_voltages[channel_name] = compensation_voltage
-                    buffer[-(compensation_npt+1):-1] = compensation_voltage
-                    logging.debug(f'DC compensation {channel_name}: {compensation_voltage:6.1f} mV {compensation_npt} Sa')
-                else:
-                    job.upload_info.dc_compensation_voltages[channel_name] = 0
-                    # TODO: @@@ reduce length of waveform?
-
-            bias_T_compensation_mV = self._add_bias_T_compensation(buffer, bias_T_compensation_mV,
-                                                                   section.sample_rate, channel_info)
-            self._upload_wvf(job, channel_name, buffer, channel_info.amplitude, channel_info.attenuation,
-                             section.sample_rate, awg_upload_func)
+            channels.append((channel_name, channel_info))
+
+        if self.delta_cache is not None:
+            layout_key = get_layout_key(self.segments, job.upload_info)
+
+        # list with (channel_name, key, description) or (channel_name, key, uploaded waveforms)
+        channel_uploads = []
+        for channel_name, channel_info in channels:
+            key = None
+            if self.delta_cache is not None:
+                # reuse the uploaded waveforms if channel did not change
+                key = self.delta_cache.get_key(job, channel_name, layout_key, start_phases_all)
+                upload = self.delta_cache.get(job.seq_id, channel_name, key)
+                if upload is not None:
+                    channel_uploads.append((channel_name, key, upload))
+                    continue
+            description = self._get_channel_description(job, channel_name, channel_info, start_phases_all)
+            channel_uploads.append((channel_name, key, description))
+
+        i = 0
+        try:
+            # channels are rendered in a buffer per AWG module
+            rendered_channels = iter(render_channels(
+                    [item for _, _, item in channel_uploads if isinstance(item, ChannelRenderDescription)],
+                    self.executor, job.cache_keys))
+            # upload in channel order for deterministic result.
+            for i, (channel_name, key, item) in enumerate(channel_uploads):
+                if isinstance(item, ChannelUpload):
+                    self._add_channel_upload(job, channel_name, item)
+                    continue
+                self._upload_rendered_channel(job, next(rendered_channels), awg_upload_func, key)
+        except:
+            # release the reused waveforms that have not been added to the job
+            for _, _, item in channel_uploads[i:]:
+                if isinstance(item, ChannelUpload):
+                    item.release()
+            raise
+
+    def _get_channel_description(self, job, channel_name, channel_info, start_phases_all):
+        waveforms = []
+        for iseg,(seg,seg_render) in enumerate(zip(job.sequence,self.segments)):
+            seg_ch = getattr(seg, channel_name)
+            ref_channel_states = RefChannels(seg_render.t_start,
+                                             start_phase=start_phases_all[iseg],
+                                             start_phases_all=start_phases_all)
+            waveforms.append(seg_ch.get_indexed_waveform(job.index, ref_channel_states))
+
+        return ChannelRenderDescription(channel_name, job.index, channel_info,
+                                        self.segments, job.upload_info.sections, waveforms,
+                                        job.neutralize, job.upload_info.dc_compensation_duration)
+
+    def _upload_rendered_channel(self, job, rendered, awg_upload_func, key=None):
+        if rendered.dc_compensation_voltage is not None:
+            job.upload_info.dc_compensation_voltages[rendered.name] = rendered.dc_compensation_voltage
+        upload = None
+        if self.delta_cache is not None:
+            upload = ChannelUpload(key, rendered.dc_compensation_voltage)
+        for waveform, sample_rate in rendered.waveforms:
+            for part, cycles in self._compress(waveform):
+                wave_ref = self._upload_part(job, rendered.name, part, cycles, awg_upload_func)
+                if upload is not None:
+                    if not isinstance(wave_ref, SharedWaveform):
+                        wave_ref = SharedWaveform(wave_ref)
+                    upload.waveforms.append((wave_ref, sample_rate, part.nbytes, cycles))
+                job.add_waveform(rendered.name, wave_ref, sample_rate*1e9, part.nbytes, cycles)
+        if upload is not None:
+            self.delta_cache.add(job.seq_id, rendered.name, upload)
+
+    def _add_channel_upload(self, job, channel_name, upload):
+        # the job takes ownership of the waveforms returned by delta_cache.get()
+        if upload.dc_compensation_voltage is not None:
+            job.upload_info.dc_compensation_voltages[channel_name] = upload.dc_compensation_voltage
+        for wave_ref, sample_rate, nbytes, cycles in upload.waveforms:
+            job.add_waveform(channel_name, wave_ref, sample_rate*1e9, nbytes, cycles)
+
+    def _compress(self, waveform):
+        if self.run_length_min_samples is None:
+            return [(waveform, 1)]
+        return compress_waveform(waveform, self.run_length_min_samples, AwgConfig.ALIGNMENT)
+
+    def _upload_part(self, job, channel_name, part, cycles, awg_upload_func):
+        if cycles == 1:
+            return awg_upload_func(channel_name, part)
+        # constant chunk: upload once per job
+        key = (channel_name, len(part), float(part[0]))
+        constant_chunks = job.upload_info.constant_chunks
+        wave_ref = constant_chunks.get(key)
+        if wave_ref is None:
+            wave_ref = SharedWaveform(awg_upload_func(channel_name, part))
+            constant_chunks[key] = wave_ref
+            return wave_ref
+        return wave_ref.share()
 
     def _render_markers(self, job, awg_upload_func):
         for channel_name, marker_channel in self.marker_channels.items():
@@ -744,8 +945,9 @@ class UploadAggregator:
     def _upload_wvf(self, job, channel_name, waveform, amplitude, attenuation, sample_rate, awg_upload_func):
         # note: numpy inplace multiplication is much faster than standard multiplication
         waveform *= 1/(attenuation * amplitude)
-        wave_ref = awg_upload_func(channel_name, waveform)
-        job.add_waveform(channel_name, wave_ref, sample_rate*1e9)
+        for part, cycles in self._compress(waveform):
+            wave_ref = self._upload_part(job, channel_name, part, cycles, awg_upload_func)
+            job.add_waveform(channel_name, wave_ref, sample_rate*1e9, part.nbytes, cycles)
 
     def _generate_digitizer_triggers(self, job):
         trigger_channels = {}
@@ -827,15 +1029,3 @@ class UploadAggregator:
             result = -channel_info.integral / channel_info.dc_compensation_min
         return result
 
-
-    def _add_bias_T_compensation(self, buffer, bias_T_compensation_mV, sample_rate, channel_info):
-
-        if channel_info.bias_T_RC_time:
-            compensation_factor = 1 / (sample_rate * 1e9 * channel_info.bias_T_RC_time)
-            compensation = np.cumsum(buffer) * compensation_factor + bias_T_compensation_mV
-            bias_T_compensation_mV = compensation[-1]
-            logging.info(f'bias-T compensation  min:{np.min(compensation):5.1f} max:{np.max(compensation):5.1f} mV')
-            buffer += compensation
-
-        return bias_T_compensation_mV
-
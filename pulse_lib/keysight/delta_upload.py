@@ -0,0 +1,209 @@
+"""
+Delta uploads: only channels with a changed waveform are rendered and uploaded.
+
+When a sweep steps through the indices of a sequence often only a few channels
+change. The loop axes a channel depends on are determined from the shape and the
+content of the pulse data of the channel. The uploaded waveforms of a channel are
+reused when the index on these axes, the time layout of the job, the DC compensation
+duration and the phases of the IQ reference channels are unchanged.
+"""
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+import numpy as np
+
+from pulse_lib.segments.utility.data_handling_functions import reduce_arr
+
+
+@dataclass
+class DeltaUploadStats:
+    '''
+    Statistics of the delta uploads.
+    '''
+    n_rendered: int
+    n_reused: int
+
+    @property
+    def reuse_rate(self):
+        n_channels = self.n_rendered + self.n_reused
+        return self.n_reused / n_channels if n_channels > 0 else 0.0
+
+    def __str__(self):
+        return f'rendered:{self.n_rendered} reused:{self.n_reused} ({self.reuse_rate:.1%})'
+
+
+@dataclass
+class ChannelUpload:
+    '''
+    Uploaded waveforms of a channel.
+    '''
+    key: Any
+    dc_compensation_voltage: Optional[float] = None
+    # list with (SharedWaveform, sample_rate, nbytes, cycles)
+    waveforms: List = field(default_factory=list)
+
+    def release(self):
+        for wave_ref, *_ in self.waveforms:
+            wave_ref.release()
+        self.waveforms = []
+
+
+@dataclass
+class _ChannelDependencies:
+    # loop axes the pulse data depends on. None if unknown.
+    axes: Optional[List[int]]
+    # names of the IQ reference channels
+    ref_channels: List[str]
+
+
+def _get_segment_channels(seg, channel_name):
+    # conditional segments have branches with the channels
+    branches = getattr(seg, 'branches', [seg])
+    return [getattr(branch, channel_name) for branch in branches]
+
+
+def get_data_axes(data, max_size):
+    '''
+    Returns the loop axes along which the pulse data changes.
+
+    Args:
+        data (data_container): pulse data of all indices of a segment channel.
+        max_size (int): maximum number of elements to compare on content.
+            The shape is used for larger data.
+    '''
+    if data.size <= max_size:
+        # compare content of the pulse data on fingerprint
+        fingerprint_ids = np.empty(data.shape, dtype=int)
+        fingerprints = {}
+        for i, element in np.ndenumerate(data):
+            fingerprint = getattr(element, 'fingerprint', None)
+            if fingerprint is None:
+                break
+            fingerprint_ids[i] = fingerprints.setdefault(fingerprint, len(fingerprints))
+        else:
+            _, data_axis = reduce_arr(fingerprint_ids)
+            return data_axis
+
+    ndim = len(data.shape)
+    return [ndim-i-1 for i,n in enumerate(data.shape) if n > 1]
+
+
+class DeltaUploadCache:
+    '''
+    Keeps the uploaded waveforms of the last rendered index per channel and sequence.
+
+    Args:
+        lock (threading.RLock): lock for AWG access shared with the uploader.
+    '''
+    # maximum number of pulse data elements per segment channel to compare on content.
+    MAX_ANALYSIS_SIZE = 4096
+
+    def __init__(self, lock=None):
+        # {seq_id: {channel_name: _ChannelDependencies}}
+        self._dependencies = {}
+        # {seq_id: {channel_name: ChannelUpload}}
+        self._uploads = {}
+        self._lock = lock if lock is not None else threading.RLock()
+        self._n_rendered = 0
+        self._n_reused = 0
+
+    def _get_dependencies(self, sequence, seq_id, channel_name):
+        seq_dependencies = self._dependencies.setdefault(seq_id, {})
+        dependencies = seq_dependencies.get(channel_name)
+        if dependencies is None:
+            axes = set()
+            ref_channels = set()
+            for seg in sequence:
+                for seg_ch in _get_segment_channels(seg, channel_name):
+                    ref_channels.update(ref.virtual_channel_name for ref in getattr(seg_ch, 'IQ_ref_channels', []))
+                    if axes is not None:
+                        data = getattr(seg_ch, 'pulse_data_all', None)
+                        if data is None:
+                            axes = None
+                        else:
+                            axes.update(get_data_axes(data, DeltaUploadCache.MAX_ANALYSIS_SIZE))
+            dependencies = _ChannelDependencies(sorted(axes) if axes is not None else None,
+                                                sorted(ref_channels))
+            logging.debug(f'{channel_name} depends on loop axes {dependencies.axes}')
+            seq_dependencies[channel_name] = dependencies
+        return dependencies
+
+    def get_key(self, job, channel_name, layout_key, start_phases_all):
+        '''
+        Returns the key of the channel waveforms of the job.
+        Channel waveforms with equal key are equal.
+
+        Args:
+            job: upload job.
+            channel_name (str): name of the channel.
+            layout_key (tuple): description of the time layout and DC compensation of the job.
+            start_phases_all (List[Dict[str,float]]): start phase of qubit channels per segment.
+        '''
+        with self._lock:
+            dependencies = self._get_dependencies(job.sequence, job.seq_id, channel_name)
+        if dependencies.axes is None:
+            index = tuple(job.index)
+        else:
+            index = tuple(job.index[-axis-1] for axis in dependencies.axes)
+        phases = tuple(start_phases.get(name) for start_phases in start_phases_all
+                       for name in dependencies.ref_channels)
+        return (index, layout_key, phases, job.neutralize)
+
+    def get(self, seq_id, channel_name, key):
+        '''
+        Returns a copy of the uploaded waveforms with the key, or None.
+        The caller owns the returned waveforms and must release them.
+        '''
+        with self._lock:
+            upload = self._uploads.get(seq_id, {}).get(channel_name)
+            if upload is not None and upload.key == key:
+                self._n_reused += 1
+                return ChannelUpload(upload.key, upload.dc_compensation_voltage,
+                                     [(wave_ref.share(), *info)
+                                      for wave_ref, *info in upload.waveforms])
+            self._n_rendered += 1
+            return None
+
+    def add(self, seq_id, channel_name, upload):
+        '''
+        Stores the uploaded waveforms of a channel. They replace the previous waveforms.
+        '''
+        for wave_ref, *_ in upload.waveforms:
+            wave_ref.share()
+        with self._lock:
+            seq_uploads = self._uploads.setdefault(seq_id, {})
+            old_upload = seq_uploads.get(channel_name)
+            seq_uploads[channel_name] = upload
+            if old_upload is not None:
+                old_upload.release()
+
+    def release(self, seq_id=None):
+        '''
+        Releases the waveforms and dependencies of the sequence, or of all sequences if seq_id is None.
+        '''
+        with self._lock:
+            if seq_id is None:
+                seq_ids = list(self._uploads.keys() | self._dependencies.keys())
+            else:
+                seq_ids = [seq_id]
+            for seq_id in seq_ids:
+                self._dependencies.pop(seq_id, None)
+                for upload in self._uploads.pop(seq_id, {}).values():
+                    upload.release()
+
+    def stats(self):
+        with self._lock:
+            return DeltaUploadStats(self._n_rendered, self._n_reused)
+
+
+def get_layout_key(segments, upload_info):
+    '''
+    Returns a key for the time layout of the job: sections, position of segments and
+    DC compensation duration. The DC compensation duration depends on the integrals of all channels.
+    '''
+    return (tuple((section.sample_rate, section.t_start, section.npt) for section in upload_info.sections),
+            tuple((seg.sample_rate, seg.t_start, seg.npt, seg.offset, seg.n_start_transition, seg.n_end_transition)
+                  for seg in segments),
+            upload_info.dc_compensation_duration)
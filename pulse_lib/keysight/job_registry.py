@@ -0,0 +1,111 @@
+import threading
+from dataclasses import dataclass
+
+
+@dataclass
+class JobRegistryStats:
+    '''
+    Statistics of the outstanding upload jobs.
+    '''
+    n_sequences: int
+    n_jobs: int
+    n_waveforms: int
+    nbytes: int
+
+    def __str__(self):
+        return (f'{self.n_jobs} jobs of {self.n_sequences} sequences, '
+                f'{self.n_waveforms} waveforms, {self.nbytes/1e6:.1f} MB')
+
+
+class JobRegistry:
+    '''
+    Registry of upload jobs keyed on sequence id and index.
+    Lookup, add and remove are O(1).
+    '''
+    def __init__(self):
+        # {seq_id: {index: job}}
+        self._jobs = {}
+        self._n_jobs = 0
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _index_key(index):
+        return tuple(index)
+
+    def add(self, job):
+        '''
+        Adds job. A job with the same sequence id and index is replaced.
+        '''
+        with self._lock:
+            seq_jobs = self._jobs.setdefault(job.seq_id, {})
+            key = JobRegistry._index_key(job.index)
+            if key not in seq_jobs:
+                self._n_jobs += 1
+            seq_jobs[key] = job
+
+    def get(self, seq_id, index):
+        '''
+        Returns the job for seq_id and index, or None.
+        '''
+        with self._lock:
+            seq_jobs = self._jobs.get(seq_id)
+            if seq_jobs is None:
+                return None
+            return seq_jobs.get(JobRegistry._index_key(index))
+
+    def remove(self, job):
+        '''
+        Removes job if it is registered.
+        '''
+        with self._lock:
+            seq_jobs = self._jobs.get(job.seq_id)
+            if seq_jobs is None:
+                return
+            key = JobRegistry._index_key(job.index)
+            if seq_jobs.get(key) is job:
+                del seq_jobs[key]
+                self._n_jobs -= 1
+                if len(seq_jobs) == 0:
+                    del self._jobs[job.seq_id]
+
+    def get_jobs(self, seq_id=None):
+        '''
+        Returns list with the jobs of seq_id, or all jobs if seq_id is None.
+        '''
+        with self._lock:
+            if seq_id is None:
+                return [job for seq_jobs in self._jobs.values() for job in seq_jobs.values()]
+            return list(self._jobs.get(seq_id, {}).values())
+
+    def release(self, seq_id=None, index=None):
+        '''
+        Releases jobs.
+        Args:
+            seq_id (uuid) : id of the sequence. if None release all
+            index (tuple) : index that has to be released; if None release all of the sequence.
+        '''
+        if seq_id is not None and index is not None:
+            job = self.get(seq_id, index)
+            jobs = [job] if job is not None else []
+        else:
+            jobs = self.get_jobs(seq_id)
+        # Job.release removes the job from the registry
+        for job in jobs:
+            if not job.released:
+                job.release()
+            else:
+                self.remove(job)
+
+    def __len__(self):
+        return self._n_jobs
+
+    def __iter__(self):
+        return iter(self.get_jobs())
+
+    def stats(self):
+        jobs = self.get_jobs()
+        with self._lock:
+            n_sequences = len(self._jobs)
+        return JobRegistryStats(n_sequences, len(jobs),
+                                sum(len(queue) for job in jobs for queue in list(job.channel_queues.values())),
+                                sum(job.waveform_nbytes for job in jobs))
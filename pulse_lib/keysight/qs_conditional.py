@@ -10,6 +10,7 @@ from pulse_lib.segments.segment_base import segment_base
 from pulse_lib.segments.segment_acquisition import segment_acquisition
 from pulse_lib.segments.segment_IQ import segment_IQ
 from pulse_lib.segments.segment_markers import segment_marker
+from pulse_lib.segments.data_classes.data_generic import copy_into
 
 from pulse_lib.segments.utility.measurement_ref import MeasurementRef
 
@@ -83,10 +84,51 @@ class ConditionalWaveform:
 
         return wvfs[0]
 
+    def render_into(self, out, offset, index=[0], sample_rate=1e9, ref_channel_states=None):
+        '''
+        Renders waveform for not-sequenced channel in out[offset:offset+n_samples].
+        All branches must be equals
+        '''
+        wvf = self.get_segment(index, sample_rate, ref_channel_states)
+        copy_into(out, offset, wvf)
+        return len(wvf)
+
+    def get_indexed_waveform(self, index=[0], ref_channel_states=None):
+        return ConditionalIndexedWaveform([seg_ch.get_indexed_waveform(index, ref_channel_states)
+                                           for seg_ch in self.seg_channels])
+
+    def get_fingerprint(self, index=[0], sample_rate=1e9, ref_channel_states=None):
+        fingerprints = [seg_ch.get_fingerprint(index, sample_rate, ref_channel_states) for seg_ch in self.seg_channels]
+        if any(fp != fingerprints[0] for fp in fingerprints[1:]):
+            # get_segment will check the waveforms of the branches.
+            return None
+        return fingerprints[0]
+
     def integrate(self, index, sample_rate=1e9):
         integrals = [seg_ch.integrate(index, sample_rate) for seg_ch in self.seg_channels]
         return integrals[0]
 
+class ConditionalIndexedWaveform:
+    '''
+    Waveform of a not-sequenced channel in a conditional segment for a single index.
+    All branches must be equal.
+    '''
+    def __init__(self, branch_waveforms):
+        self.branch_waveforms = branch_waveforms
+
+    def render(self, sample_rate):
+        wvfs = [waveform.render(sample_rate) for waveform in self.branch_waveforms]
+        for wvf in wvfs[1:]:
+            if not np.array_equal(wvf, wvfs[0]):
+                raise Exception('Non-sequenced channels must be equal for all branches.')
+        return wvfs[0]
+
+    def render_into(self, out, offset, sample_rate):
+        wvf = self.render(sample_rate)
+        copy_into(out, offset, wvf)
+        return len(wvf)
+
+
 def get_acquisition_names(conditional:conditional_segment):
     condition = conditional.condition
     refs = condition if isinstance(condition, Iterable) else [condition]
@@ -1,9 +1,19 @@
 import time
+import threading
 import numpy as np
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from typing import List, Dict, Optional, Union
 
+from .delta_upload import ChannelUpload, DeltaUploadCache, get_layout_key
+from .job_registry import JobRegistry
+from .upload_pipeline import PendingWaveform, UploadFuture, UploadPipeline
+from .waveform_pool import SharedWaveform, WaveformPool, get_awg_reference
+from .waveform_table import WaveformTable, SequencerWaveformLibrary, get_envelope_digest
+from .render_engine import ChannelRenderDescription, render_channels
+from pulse_lib.segments.data_classes.data_generic import parent_data
+
 from .sequencer_device import add_sequencers
 from .qs_conditional import get_conditional_channel, get_acquisition_names, QsConditionalSegment
 from pulse_lib.segments.data_classes.data_IQ import IQ_data_single
@@ -11,6 +21,7 @@ from pulse_lib.segments.conditional_segment import conditional_segment
 from pulse_lib.tests.mock_m3202a_qs import AwgInstruction, AwgConditionalInstruction
 from pulse_lib.tests.mock_m3102a_qs import DigitizerInstruction
 from pulse_lib.segments.utility.rounding import iround
+from pulse_lib.segments.utility.ref_channels import RefChannels
 
 
 class AwgConfig:
@@ -35,7 +46,17 @@ class QsUploader:
         self.digitizers = digitizers
         self.digitizer_channels = digitizer_channels
 
-        self.jobs = []
+        self.jobs = JobRegistry()
+        # lock for AWG access and job release
+        self._lock = threading.RLock()
+        self._pipeline = None
+        self._render_executor = None
+        self._owns_render_executor = False
+        self._waveform_pool = None
+        self._delta_cache = None
+        self._playing_job = None
+        self._sequencer_waveform_stats = {}
+        self._sequencer_libraries = None
 
         add_sequencers(self, awg_devices, awg_channels, IQ_channels)
 
@@ -85,7 +106,7 @@ class QsUploader:
     def create_job(self, sequence, index, seq_id, n_rep, sample_rate, neutralize=True):
         # remove any old job with same sequencer and index
         self.release_memory(seq_id, index)
-        return Job(self.jobs, sequence, index, seq_id, n_rep, sample_rate, neutralize)
+        return Job(self.jobs, sequence, index, seq_id, n_rep, sample_rate, neutralize, lock=self._lock)
 
 
     def add_upload_job(self, job):
@@ -106,16 +127,172 @@ class QsUploader:
         '''
         start = time.perf_counter()
 
-        aggregator = UploadAggregator(self.AWGs, self.awg_channels, self.marker_channels, self.digitizer_channels,
-                                      self.qubit_channels, self.sequencer_channels, self.sequencer_out_channels)
+        self.jobs.add(job)
 
-        aggregator.upload_job(job, self.__upload_to_awg) # @@@ TODO split generation and upload
+        if self._pipeline is not None:
+            # render and upload in background
+            self._pipeline.submit(job)
+            return
 
-        self.jobs.append(job)
+        try:
+            self._render_job(job, self.__upload_to_awg)
+        except Exception as ex:
+            job._set_exception(ex)
+            job.release()
+            raise
+        job._set_done()
 
         duration = time.perf_counter() - start
         logging.debug(f'generated upload data ({duration*1000:6.3f} ms)')
 
+    def _render_job(self, job, awg_upload_func):
+        aggregator = UploadAggregator(self.AWGs, self.awg_channels, self.marker_channels, self.digitizer_channels,
+                                      self.qubit_channels, self.sequencer_channels, self.sequencer_out_channels,
+                                      executor=self._render_executor,
+                                      delta_cache=self._delta_cache)
+
+        # record the cached waveforms used by the job
+        with parent_data.waveform_cache.record_keys(job.cache_keys):
+            aggregator.upload_job(job, awg_upload_func)
+        self._sequencer_waveform_stats = job.sequencer_waveform_stats
+
+    def set_render_executor(self, executor):
+        '''
+        Sets the executor to render the AWG channels concurrently.
+        Rendering releases the GIL for most of the numpy operations.
+        A ProcessRenderEngine renders the channels in other processes.
+        Args:
+            executor (Union[concurrent.futures.Executor, ProcessRenderEngine, int, None]):
+                executor, number of render threads, or None to render channels sequentially.
+        '''
+        if self._owns_render_executor:
+            self._render_executor.shutdown()
+        self._owns_render_executor = isinstance(executor, int)
+        if self._owns_render_executor:
+            executor = ThreadPoolExecutor(executor, thread_name_prefix='pulselib-render-channel')
+        self._render_executor = executor
+
+    def set_waveform_pool(self, max_bytes_per_module):
+        '''
+        Enables reuse of uploaded waveforms. Waveforms with equal content are uploaded
+        once and shared between jobs. Waveforms that are not used anymore are kept in
+        the AWG memory till the budget is reached.
+        Args:
+            max_bytes_per_module (Optional[int]):
+                AWG memory budget of the pool per module. None disables the pool.
+        '''
+        with self._lock:
+            if self._waveform_pool is not None:
+                self._waveform_pool.close()
+            if max_bytes_per_module is not None:
+                self._waveform_pool = WaveformPool(max_bytes_per_module)
+            else:
+                self._waveform_pool = None
+
+    def get_waveform_pool_stats(self):
+        '''
+        Returns list with the statistics of the waveform pool per AWG module.
+        '''
+        if self._waveform_pool is None:
+            return []
+        return self._waveform_pool.stats()
+
+    def set_delta_upload(self, enable):
+        '''
+        Enables delta uploads. A channel is only rendered and uploaded when its waveform
+        differs from the waveform of the previous upload of the sequence. The waveforms
+        of the last upload of every channel are kept in AWG memory till the sequence is released.
+        Args:
+            enable (bool): if True reuse waveforms of unchanged channels.
+        '''
+        with self._lock:
+            if self._delta_cache is not None:
+                self._delta_cache.release()
+            self._delta_cache = DeltaUploadCache(self._lock) if enable else None
+
+    def get_delta_upload_stats(self):
+        '''
+        Returns the number of rendered and reused channel waveforms, or None if delta upload is disabled.
+        '''
+        if self._delta_cache is None:
+            return None
+        return self._delta_cache.stats()
+
+    def get_sequencer_waveform_stats(self):
+        '''
+        Returns dict with the statistics of the sequencer waveform table per qubit channel
+        of the last rendered job.
+        '''
+        return self._sequencer_waveform_stats
+
+    def set_sequencer_waveform_library(self, enable, max_waveforms=64):
+        '''
+        Enables the persistent waveform library of the IQ sequencers. The waveforms stay
+        in sequencer memory across jobs and a job only uploads the waveforms that are not
+        yet in memory. When the memory is full the least recently used waveforms are overwritten.
+        Args:
+            enable (bool): if True keep the sequencer waveforms across jobs.
+            max_waveforms (int): number of waveforms in the memory of a sequencer.
+        '''
+        with self._lock:
+            if self._sequencer_libraries is not None:
+                # waveforms in sequencer memory are not tracked anymore
+                for awg_sequencer in self.sequencer_channels.values():
+                    awg = self.AWGs[awg_sequencer.module_name]
+                    awg.get_sequencer(awg_sequencer.sequencer_index).flush_waveforms()
+            if enable:
+                self._sequencer_libraries = {
+                        awg_sequencer.channel_name:SequencerWaveformLibrary(awg_sequencer.channel_name, max_waveforms)
+                        for awg_sequencer in self.sequencer_channels.values()}
+            else:
+                self._sequencer_libraries = None
+
+    def get_sequencer_waveform_library_stats(self):
+        '''
+        Returns list with the statistics of the waveform library per sequencer,
+        or None if the library is disabled.
+        '''
+        with self._lock:
+            if self._sequencer_libraries is None:
+                return None
+            return [library.stats() for library in self._sequencer_libraries.values()]
+
+    def start_pipeline(self, max_ready_jobs=4):
+        '''
+        Starts pipelined upload. Jobs are rendered in a background thread and uploaded
+        to the AWGs in a second thread while the AWG plays the current index.
+        `sequencer.upload()` returns immediately. Use `job.result()` to wait for the upload.
+        Args:
+            max_ready_jobs (int): maximum number of rendered jobs waiting for upload.
+        '''
+        if self._pipeline is None:
+            self._pipeline = UploadPipeline(self._render_pending_waveforms,
+                                            self._upload_pending_waveforms,
+                                            max_ready_jobs)
+
+    def stop_pipeline(self):
+        '''
+        Stops pipelined upload after all submitted jobs have been uploaded.
+        '''
+        if self._pipeline is not None:
+            self._pipeline.stop()
+            self._pipeline = None
+
+    def _render_pending_waveforms(self, job):
+        self._render_job(job, PendingWaveform)
+
+    def _upload_pending_waveforms(self, job):
+        for queue in job.channel_queues.values():
+            for queue_item in queue:
+                with self._lock:
+                    if job.released:
+                        return
+                    pending = queue_item.wave_reference
+                    if isinstance(pending, SharedWaveform):
+                        pending.upload_pending(self.__upload_to_awg)
+                    elif isinstance(pending, PendingWaveform):
+                        queue_item.wave_reference = self.__upload_to_awg(pending.channel_name, pending.waveform)
+
 
     def __upload_to_awg(self, channel_name, waveform):
 #        vmin = waveform.min()
@@ -129,7 +306,11 @@ class QsUploader:
         else:
             raise Exception(f'Channel {channel_name} not found in configuration')
         awg = self.AWGs[awg_name]
-        wave_ref = awg.upload_waveform(waveform)
+        with self._lock:
+            if self._waveform_pool is not None:
+                wave_ref = self._waveform_pool.upload(awg, waveform)
+            else:
+                wave_ref = awg.upload_waveform(waveform)
         return wave_ref
 
     def __upload_markers(self, channel_name, table):
@@ -151,9 +332,9 @@ class QsUploader:
         Return:
             job (upload_job) :job, with locations of the sequences to be uploaded.
         """
-        for job in self.jobs:
-            if job.seq_id == seq_id and job.index == index and not job.released:
-                return job
+        job = self.jobs.get(seq_id, index)
+        if job is not None and not job.released:
+            return job
 
         logging.error(f'Job not found for index {index} of seq {seq_id}')
         raise ValueError(f'Sequence with id {seq_id}, index {index} not placed for upload .. . Always make sure to first upload your segment and then do the playback.')
@@ -169,133 +350,179 @@ class QsUploader:
         """
 
         job =  self.__get_job(seq_id, index)
+        # wait till job is uploaded. Raises exception if upload failed.
+        job.result()
         self.wait_until_AWG_idle()
 
-        for channel_name, marker_table in job.marker_tables.items():
-            self.__upload_markers(channel_name, marker_table)
-
-        for awg_channel in self.awg_channels.values():
-            awg_name = awg_channel.awg_name
-            channel_number = awg_channel.channel_number
-            # empty AWG queue
-            self.AWGs[awg_name].awg_flush(channel_number)
-
-        # queue waveforms
-        for channel_name, queue in job.channel_queues.items():
-            offset = 0
-
-            if channel_name in self.awg_channels:
-                channel = self.awg_channels[channel_name]
-                awg_name = channel.awg_name
-                channel_number = channel.channel_number
-                amplitude = channel.amplitude if channel.amplitude is not None else AwgConfig.MAX_AMPLITUDE
-            elif channel_name in self.marker_channels:
-                channel = self.marker_channels[channel_name]
-                awg_name = channel.module_name
-                channel_number = channel.channel_number
-                amplitude = channel.amplitude
-                if channel.invert:
-                    offset = amplitude
-                    amplitude = -amplitude
-            else:
-                raise Exception(f'Undefined channel {channel_name}')
+        with self._lock:
+            self._set_playing_job(job)
 
-            awg = self.AWGs[awg_name]
-            awg.set_channel_amplitude(amplitude/1000, channel_number)
-            awg.set_channel_offset(offset/1000, channel_number)
+            for channel_name, marker_table in job.marker_tables.items():
+                self.__upload_markers(channel_name, marker_table)
 
-            start_delay = 0 # no start delay
-            trigger_mode = 1 # software/HVI trigger
-            cycles = 1
-            for queue_item in queue:
-                prescaler = awg.convert_sample_rate_to_prescaler(queue_item.sample_rate)
-                awg.awg_queue_waveform(
-                        channel_number, queue_item.wave_reference,
-                        trigger_mode, start_delay, cycles, prescaler)
-                trigger_mode = 0 # Auto tigger -- next waveform will play automatically.
+            for awg_channel in self.awg_channels.values():
+                awg_name = awg_channel.awg_name
+                channel_number = awg_channel.channel_number
+                # empty AWG queue
+                self.AWGs[awg_name].awg_flush(channel_number)
 
-        start = time.perf_counter()
-        for awg_sequencer in self.sequencer_channels.values():
-            awg = self.AWGs[awg_sequencer.module_name]
-            seq = awg.get_sequencer(awg_sequencer.sequencer_index)
-            seq.flush_waveforms()
-            schedule = []
-            if awg_sequencer.channel_name in job.sequencer_waveforms:
-                t1 = time.perf_counter()
-
-                # TODO @@@ cleanup frequency update hack
-                qubit_channel = self.qubit_channels[awg_sequencer.channel_name]
-                seq._frequency = qubit_channel.reference_frequency - qubit_channel.iq_channel.LO
-
-                for number,wvf in enumerate(job.sequencer_waveforms[awg_sequencer.channel_name]):
-                    seq.upload_waveform(number, wvf.offset, wvf.duration,
-                                        wvf.amplitude, wvf.am_envelope,
-                                        wvf.frequency, wvf.pm_envelope,
-                                        wvf.prephase, wvf.postphase, wvf.restore_frequency)
-
-                t2 = time.perf_counter()
-                for i,entry in enumerate(job.sequencer_sequences[awg_sequencer.channel_name]):
-                    if isinstance(entry, SequenceConditionalEntry):
-                        schedule.append(AwgConditionalInstruction(i, entry.time_after,
-                                                                  wave_numbers=entry.waveform_indices,
-                                                                  condition_register=entry.cr))
+            # queue waveforms
+            for channel_name, queue in job.channel_queues.items():
+                offset = 0
+
+                if channel_name in self.awg_channels:
+                    channel = self.awg_channels[channel_name]
+                    awg_name = channel.awg_name
+                    channel_number = channel.channel_number
+                    amplitude = channel.amplitude if channel.amplitude is not None else AwgConfig.MAX_AMPLITUDE
+                elif channel_name in self.marker_channels:
+                    channel = self.marker_channels[channel_name]
+                    awg_name = channel.module_name
+                    channel_number = channel.channel_number
+                    amplitude = channel.amplitude
+                    if channel.invert:
+                        offset = amplitude
+                        amplitude = -amplitude
+                else:
+                    raise Exception(f'Undefined channel {channel_name}')
+
+                awg = self.AWGs[awg_name]
+                awg.set_channel_amplitude(amplitude/1000, channel_number)
+                awg.set_channel_offset(offset/1000, channel_number)
+
+                start_delay = 0 # no start delay
+                trigger_mode = 1 # software/HVI trigger
+                cycles = 1
+                for queue_item in queue:
+                    prescaler = awg.convert_sample_rate_to_prescaler(queue_item.sample_rate)
+                    awg.awg_queue_waveform(
+                            channel_number, get_awg_reference(queue_item.wave_reference),
+                            trigger_mode, start_delay, cycles, prescaler)
+                    trigger_mode = 0 # Auto tigger -- next waveform will play automatically.
+
+            start = time.perf_counter()
+            for awg_sequencer in self.sequencer_channels.values():
+                awg = self.AWGs[awg_sequencer.module_name]
+                seq = awg.get_sequencer(awg_sequencer.sequencer_index)
+                library = None
+                if self._sequencer_libraries is not None:
+                    library = self._sequencer_libraries[awg_sequencer.channel_name]
+                else:
+                    seq.flush_waveforms()
+                schedule = []
+                if awg_sequencer.channel_name in job.sequencer_waveforms:
+                    t1 = time.perf_counter()
+
+                    # TODO @@@ cleanup frequency update hack
+                    qubit_channel = self.qubit_channels.get(awg_sequencer.channel_name)
+                    if qubit_channel is not None:
+                        seq._frequency = qubit_channel.reference_frequency - qubit_channel.iq_channel.LO
+
+                    waveforms = job.sequencer_waveforms[awg_sequencer.channel_name]
+                    if library is not None:
+                        wave_numbers, uploads = library.add_waveforms(waveforms, seq._frequency)
                     else:
-                        schedule.append(AwgInstruction(i, entry.time_after, wave_number=entry.waveform_index))
-                t3 = time.perf_counter()
-                logging.debug(f'{awg_sequencer.channel_name} create waves:{(t2-t1)*1000:6.3f}, seq:{(t3-t2)*1000:6.3f} ms')
-            seq.load_schedule(schedule)
-        logging.debug(f'loaded awg sequences in {(time.perf_counter() - start)*1000:6.3f} ms')
+                        wave_numbers = list(range(len(waveforms)))
+                        uploads = list(enumerate(waveforms))
+
+                    for number,wvf in uploads:
+                        seq.upload_waveform(number, wvf.offset, wvf.duration,
+                                            wvf.amplitude, wvf.am_envelope,
+                                            wvf.frequency, wvf.pm_envelope,
+                                            wvf.prephase, wvf.postphase, wvf.restore_frequency)
+
+                    t2 = time.perf_counter()
+                    for i,entry in enumerate(job.sequencer_sequences[awg_sequencer.channel_name]):
+                        if isinstance(entry, SequenceConditionalEntry):
+                            schedule.append(AwgConditionalInstruction(i, entry.time_after,
+                                                                      wave_numbers=[wave_numbers[index] for index in entry.waveform_indices],
+                                                                      condition_register=entry.cr))
+                        else:
+                            wave_number = wave_numbers[entry.waveform_index] if entry.waveform_index is not None else None
+                            schedule.append(AwgInstruction(i, entry.time_after, wave_number=wave_number))
+                    t3 = time.perf_counter()
+                    logging.debug(f'{awg_sequencer.channel_name} create {len(uploads)} waves:{(t2-t1)*1000:6.3f}, '
+                                  f'seq:{(t3-t2)*1000:6.3f} ms')
+                seq.load_schedule(schedule)
+            logging.debug(f'loaded awg sequences in {(time.perf_counter() - start)*1000:6.3f} ms')
 
-        start = time.perf_counter()
-        for dig_channel in self.digitizer_channels.values():
-            dig = self.digitizers[dig_channel.module_name]
-            if QsUploader.use_digitizer_sequencers and hasattr(dig, 'get_sequencer'):
-                seq_numbers = dig_channel.channel_numbers
-                for seq_nr in seq_numbers:
-                    seq = dig.get_sequencer(seq_nr)
-
-                    schedule = []
-                    for i,entry in enumerate(job.digitizer_sequences[dig_channel.name]):
-                        schedule.append(DigitizerInstruction(i, entry.time_after,
-                                                             t_measure=entry.t_measure,
-                                                             n_cycles=entry.n_cycles,
-                                                             measurement_id=entry.measurement_id,
-                                                             pxi=entry.pxi_trigger,
-                                                             threshold=entry.threshold))
-                    seq.load_schedule(schedule)
-
-        logging.debug(f'loaded dig sequences in {(time.perf_counter() - start)*1000:6.3f} ms')
-
-        # start hvi (start function loads schedule if not yet loaded)
-        acquire_triggers = {f'dig_trigger_{i+1}':t for i,t in enumerate(job.digitizer_triggers)}
-        trigger_channels = {f'dig_trigger_channels_{dig_name}':triggers
-                            for dig_name, triggers in job.digitizer_trigger_channels.items()}
-        schedule_params = job.schedule_params.copy()
-        schedule_params.update(acquire_triggers)
-        schedule_params.update(trigger_channels)
-        job.hw_schedule.set_configuration(schedule_params, job.n_waveforms)
-        job.hw_schedule.start(job.playback_time, job.n_rep, schedule_params)
+            start = time.perf_counter()
+            for dig_channel in self.digitizer_channels.values():
+                dig = self.digitizers[dig_channel.module_name]
+                if QsUploader.use_digitizer_sequencers and hasattr(dig, 'get_sequencer'):
+                    seq_numbers = dig_channel.channel_numbers
+                    for seq_nr in seq_numbers:
+                        seq = dig.get_sequencer(seq_nr)
+
+                        schedule = []
+                        for i,entry in enumerate(job.digitizer_sequences[dig_channel.name]):
+                            schedule.append(DigitizerInstruction(i, entry.time_after,
+                                                                 t_measure=entry.t_measure,
+                                                                 n_cycles=entry.n_cycles,
+                                                                 measurement_id=entry.measurement_id,
+                                                                 pxi=entry.pxi_trigger,
+                                                                 threshold=entry.threshold))
+                        seq.load_schedule(schedule)
+
+            logging.debug(f'loaded dig sequences in {(time.perf_counter() - start)*1000:6.3f} ms')
+
+            # start hvi (start function loads schedule if not yet loaded)
+            acquire_triggers = {f'dig_trigger_{i+1}':t for i,t in enumerate(job.digitizer_triggers)}
+            trigger_channels = {f'dig_trigger_channels_{dig_name}':triggers
+                                for dig_name, triggers in job.digitizer_trigger_channels.items()}
+            schedule_params = job.schedule_params.copy()
+            schedule_params.update(acquire_triggers)
+            schedule_params.update(trigger_channels)
+            job.hw_schedule.set_configuration(schedule_params, job.n_waveforms)
+            job.hw_schedule.start(job.playback_time, job.n_rep, schedule_params)
 
         if release_job:
             job.release()
 
 
+    def _set_playing_job(self, job):
+        # The waveforms of the playing job stay pinned in the waveform cache
+        # till the next job is played, also when the job is released.
+        previous = self._playing_job
+        if previous is job:
+            return
+        if job is not None:
+            job.pin_cached_waveforms()
+            job.playing = True
+        if previous is not None:
+            previous.playing = False
+            if previous.released:
+                previous.unpin_cached_waveforms()
+        self._playing_job = job
+
     def release_memory(self, seq_id=None, index=None):
         """
         Release job memory for `seq_id` and `index`.
         Args:
-            seq_id (uuid) : id of the sequence. if None release all
-            index (tuple) : index that has to be released; if None release all.
+            seq_id (uuid) : id of the sequence. if None release all, including the unused waveforms in the pool.
+            index (tuple) : index that has to be released; if None release all, including the waveforms kept for delta upload.
         """
-        for job in self.jobs:
-            if (seq_id is None
-                or (job.seq_id == seq_id and (index is None or job.index == index))):
-                job.release()
+        self.jobs.release(seq_id, index)
+        if index is None and self._delta_cache is not None:
+            with self._lock:
+                self._delta_cache.release(seq_id)
+        if seq_id is None and self._waveform_pool is not None:
+            self._waveform_pool.clear()
+        if seq_id is None:
+            with self._lock:
+                self._set_playing_job(None)
 
 
     def release_jobs(self):
-        for job in self.jobs:
-            job.release()
+        self.jobs.release()
+        with self._lock:
+            self._set_playing_job(None)
+
+    def get_job_stats(self):
+        '''
+        Returns the number of outstanding jobs and the size of their waveforms.
+        '''
+        return self.jobs.stats()
 
 
     def wait_until_AWG_idle(self):
@@ -306,7 +533,10 @@ class QsUploader:
         channel = list(self.awg_channels.values())[0]
         awg = self.AWGs[channel.awg_name]
 
-        while awg.awg_is_running(channel.channel_number):
+        while True:
+            with self._lock:
+                if not awg.awg_is_running(channel.channel_number):
+                    return
             time.sleep(0.001)
 
 
@@ -316,12 +546,13 @@ class AwgQueueItem:
     sample_rate: float
 
 
-class Job(object):
+class Job(UploadFuture):
     """docstring for upload_job"""
-    def __init__(self, job_list, sequence, index, seq_id, n_rep, sample_rate, neutralize=True, priority=0):
+    def __init__(self, job_registry, sequence, index, seq_id, n_rep, sample_rate, neutralize=True, priority=0,
+                 lock=None):
         '''
         Args:
-            job_list (list): list with all jobs.
+            job_registry (JobRegistry): registry with all jobs.
             sequence (list of list): list with list of the sequence
             index (tuple) : index that needs to be uploaded
             seq_id (uuid) : if of the sequence
@@ -329,8 +560,9 @@ class Job(object):
             sample_rate (float) : sample rate
             neutralize (bool) : place a neutralizing segment at the end of the upload
             priority (int) : priority of the job (the higher one will be excuted first)
+            lock (threading.RLock): lock for AWG access shared with uploader.
         '''
-        self.job_list = job_list
+        self.job_registry = job_registry
         self.sequence = sequence
         self.seq_id = seq_id
         self.index = index
@@ -341,9 +573,16 @@ class Job(object):
         self.playback_time = 0 #total playtime of the waveform
 
         self.released = False
+        self.playing = False
+        # keys of the waveforms in the waveform cache used by the job
+        self.cache_keys = set()
+        self._pinned_cache = None
 
         self.channel_queues = dict()
+        self.waveform_nbytes = 0
         self.hw_schedule = None
+        self._lock = lock if lock is not None else threading.RLock()
+        self._init_future()
         logging.debug(f'new job {seq_id}-{index}')
 
 
@@ -357,28 +596,47 @@ class Job(object):
         self.hw_schedule = hw_schedule
         self.schedule_params = schedule_params
 
-    def add_waveform(self, channel_name, wave_ref, sample_rate):
+    def add_waveform(self, channel_name, wave_ref, sample_rate, nbytes=0):
         if channel_name not in self.channel_queues:
             self.channel_queues[channel_name] = []
 
         self.channel_queues[channel_name].append(AwgQueueItem(wave_ref, sample_rate))
+        self.waveform_nbytes += nbytes
 
 
     def release(self):
-        if self.released:
-            logging.warning(f'job {self.seq_id}-{self.index} already released')
-            return
+        with self._lock:
+            if self.released:
+                logging.warning(f'job {self.seq_id}-{self.index} already released')
+                return
 
-        self.upload_info = None
-        logging.debug(f'release job {self.seq_id}-{self.index}')
-        self.released = True
+            self.upload_info = None
+            logging.debug(f'release job {self.seq_id}-{self.index}')
+            self.released = True
 
-        for channel_name, queue in self.channel_queues.items():
-            for queue_item in queue:
-                queue_item.wave_reference.release()
+            for channel_name, queue in self.channel_queues.items():
+                for queue_item in queue:
+                    queue_item.wave_reference.release()
 
-        if self in self.job_list:
-            self.job_list.remove(self)
+            if not self.playing:
+                self.unpin_cached_waveforms()
+
+            self.job_registry.remove(self)
+
+    def pin_cached_waveforms(self):
+        '''
+        Pins the waveforms used by the job in the waveform cache.
+        '''
+        with self._lock:
+            if self._pinned_cache is None:
+                self._pinned_cache = parent_data.waveform_cache
+                self._pinned_cache.pin_keys(self.cache_keys)
+
+    def unpin_cached_waveforms(self):
+        with self._lock:
+            if self._pinned_cache is not None:
+                self._pinned_cache.unpin_keys(self.cache_keys)
+                self._pinned_cache = None
 
 
     def __del__(self):
@@ -391,6 +649,7 @@ class Job(object):
 @dataclass
 class ChannelInfo:
     # static data
+    awg_name: str = ''
     delay_ns: float = 0
     amplitude: float = 0
     attenuation: float = 1.0
@@ -444,13 +703,6 @@ class SegmentRenderInfo:
     def t_end(self):
         return self.t_start + self.npt / self.sample_rate
 
-@dataclass
-class RefChannels:
-    start_time: float
-    start_phase: Dict[str,float] = field(default_factory=dict)
-    start_phases_all: List[Dict[str,float]] = field(default_factory=list)
-
-
 @dataclass
 class Waveform:
     wvf_id: str
@@ -471,11 +723,21 @@ class Waveform:
                 and self.frequency == other.frequency
                 and np.all(self.pm_envelope == other.pm_envelope)
                 and self.prephase == other.prephase
+                and self.postphase == other.postphase
                 and self.duration == other.duration
                 and self.restore_frequency == other.restore_frequency
                 and self.offset == other.offset
                 )
 
+    def digest(self):
+        '''
+        Returns a hashable key of the waveform. Equal waveforms have equal keys.
+        '''
+        return (self.wvf_id, self.amplitude, get_envelope_digest(self.am_envelope),
+                self.frequency, get_envelope_digest(self.pm_envelope),
+                self.prephase, self.postphase, self.duration, self.offset,
+                self.restore_frequency)
+
 @dataclass
 class SequenceEntry:
     time_after: float = 0
@@ -501,7 +763,8 @@ class UploadAggregator:
     verbose = False
 
     def __init__(self, AWGs, awg_channels, marker_channels, digitizer_channels,
-                 qubit_channels, sequencer_channels, sequencer_out_channels):
+                 qubit_channels, sequencer_channels, sequencer_out_channels, executor=None,
+                 delta_cache=None):
         self.AWGs = AWGs
         self.npt = 0
         self.marker_channels = marker_channels
@@ -511,12 +774,15 @@ class UploadAggregator:
         self.qubit_channels = qubit_channels
 
         self.channels = dict()
+        self.executor = executor
+        self.delta_cache = delta_cache
 
         delays = []
         for channel in awg_channels.values():
             info = ChannelInfo()
             self.channels[channel.name] = info
 
+            info.awg_name = channel.awg_name
             info.attenuation = channel.attenuation
             info.delay_ns = channel.delay
             info.amplitude = channel.amplitude if channel.amplitude is not None else AwgConfig.MAX_AMPLITUDE
@@ -660,13 +926,9 @@ class UploadAggregator:
 
 
     def _generate_upload_wvf(self, job, awg_upload_func):
-        segments = self.segments
-        sections = job.upload_info.sections
-        ref_channel_states = RefChannels(0)
+        start_phases_all = [dict() for i in range(len(job.sequence))]
 
         # loop over all qubit channels to accumulate total phase shift
-        for i in range(len(job.sequence)):
-            ref_channel_states.start_phases_all.append(dict())
         for channel_name, qubit_channel in self.qubit_channels.items():
             if (QsUploader.use_iq_sequencers
                 and channel_name in self.sequencer_channels):
@@ -674,10 +936,11 @@ class UploadAggregator:
                 continue
             phase = 0
             for iseg,seg in enumerate(job.sequence):
-                ref_channel_states.start_phases_all[iseg][channel_name] = phase
+                start_phases_all[iseg][channel_name] = phase
                 seg_ch = seg[channel_name]
                 phase += seg_ch.get_accumulated_phase(job.index)
 
+        channels = []
         for channel_name, channel_info in self.channels.items():
             if (QsUploader.use_iq_sequencers
                 and channel_name in self.sequencer_out_channels):
@@ -687,119 +950,82 @@ class UploadAggregator:
                 and channel_name in self.sequencer_channels):
                 # skip baseband sequencer channels
                 continue
-
-            section = sections[0]
-            buffer = np.zeros(section.npt)
-            bias_T_compensation_mV = 0
-
-            for iseg,(seg,seg_render) in enumerate(zip(job.sequence,segments)):
-
-                sample_rate = seg_render.sample_rate
-                n_delay = round(channel_info.delay_ns * sample_rate)
-
-                if isinstance(seg, conditional_segment):
-                    logging.debug(f'conditional for {channel_name}')
-                    seg_ch = get_conditional_channel(seg, channel_name)
-                else:
-                    seg_ch = seg[channel_name]
-                ref_channel_states.start_time = seg_render.t_start
-                ref_channel_states.start_phase = ref_channel_states.start_phases_all[iseg]
-                start = time.perf_counter()
-                #print(f'start: {channel_name}.{iseg}: {ref_channel_states.start_time}')
-                wvf = seg_ch.get_segment(job.index, sample_rate*1e9, ref_channel_states)
-                duration = time.perf_counter() - start
-                logging.debug(f'generated [{job.index}]{iseg}:{channel_name} {len(wvf)} Sa, in {duration*1000:6.3f} ms')
-
-                if len(wvf) != seg_render.npt:
-                    logging.warn(f'waveform {iseg}:{channel_name} {len(wvf)} Sa <> sequence length {seg_render.npt}')
-
-                i_start = 0
-                if seg_render.start_section:
-                    if section != seg_render.start_section:
-                        logging.error(f'OOPS section mismatch {iseg}, {channel_name}')
-
-                    # add n_start_transition - n_delay to start_section
-#                    n_delay_welding = round(channel_info.delay_ns * section.sample_rate)
-                    t_welding = (section.t_end - seg_render.t_start)
-                    i_start = round(t_welding*sample_rate) - n_delay
-                    n_section = round(t_welding*section.sample_rate) + round(-channel_info.delay_ns * section.sample_rate)
-
-                    if n_section > 0:
-                        if np.round(n_section*sample_rate/section.sample_rate) >= len(wvf):
-                            raise Exception(f'segment {iseg} too short for welding. (nwelding:{n_section}, len_wvf:{len(wvf)})')
-
-                        isub = [np.round(i*sample_rate/section.sample_rate) for i in np.arange(n_section)]
-                        welding_samples = np.take(wvf, isub)
-                        buffer[-n_section:] = welding_samples
-
-                    bias_T_compensation_mV = self._add_bias_T_compensation(buffer, bias_T_compensation_mV,
-                                                                           section.sample_rate, channel_info)
-                    self._upload_wvf(job, channel_name, buffer, channel_info.amplitude, channel_info.attenuation,
-                                     section.sample_rate, awg_upload_func)
-
-                    section = seg_render.section
-                    buffer = np.zeros(section.npt)
-
-
-                if seg_render.end_section:
-                    next_section = seg_render.end_section
-                    # add n_end_transition + n_delay to next section. First complete this section
-                    n_delay_welding = round(channel_info.delay_ns * section.sample_rate)
-                    t_welding = (seg_render.t_end - next_section.t_start)
-                    i_end = len(wvf) - round(t_welding*sample_rate) + n_delay_welding
-
-                    if i_start != i_end:
-                        buffer[-(i_end-i_start):] = wvf[i_start:i_end]
-
-                    bias_T_compensation_mV = self._add_bias_T_compensation(buffer, bias_T_compensation_mV,
-                                                                           section.sample_rate, channel_info)
-                    self._upload_wvf(job, channel_name, buffer, channel_info.amplitude, channel_info.attenuation,
-                                     section.sample_rate, awg_upload_func)
-
-                    section = next_section
-                    buffer = np.zeros(section.npt)
-
-                    n_section = round(t_welding*section.sample_rate) + round(channel_info.delay_ns * section.sample_rate)
-                    if np.round(n_section*sample_rate/section.sample_rate) >= len(wvf):
-                        raise Exception(f'segment {iseg} too short for welding. (nwelding:{n_section}, len_wvf:{len(wvf)})')
-
-                    isub = [min(len(wvf)-1, i_end + np.round(i*sample_rate/section.sample_rate)) for i in np.arange(n_section)]
-                    welding_samples = np.take(wvf, isub)
-                    buffer[:n_section] = welding_samples
-
-                else:
-                    if section != seg_render.section:
-                        logging.error(f'OOPS-2 section mismatch {iseg}, {channel_name}')
-                    offset = seg_render.offset + n_delay
-                    buffer[offset+i_start:offset + len(wvf)] = wvf[i_start:]
-
-
-            if job.neutralize:
-                if section != sections[-1]:
-                    # Corner case, DC compensation is in a new section # @@@ can this occur??
-                    bias_T_compensation_mV = self._add_bias_T_compensation(buffer, bias_T_compensation_mV,
-                                                                           section.sample_rate, channel_info)
-                    self._upload_wvf(job, channel_name, buffer, channel_info.amplitude, channel_info.attenuation,
-                                     section.sample_rate, awg_upload_func)
-                    section = sections[-1]
-                    buffer = np.zeros(section.npt)
-                    logging.info(f'DC compensation: Corner case {section}')
-
-                compensation_npt = round(job.upload_info.dc_compensation_duration * section.sample_rate)
-
-                if compensation_npt > 0 and channel_info.dc_compensation:
-                    compensation_voltage = -channel_info.integral * sample_rate / compensation_npt * 1e9
-                    job.upload_info.dc_compensation_voltages[channel_name] = compensation_voltage
-                    buffer[-(compensation_npt+1):-1] = compensation_voltage
-                    logging.debug(f'DC compensation {channel_name}: {compensation_voltage:6.1f} mV {compensation_npt} Sa')
-                else:
-                    job.upload_info.dc_compensation_voltages[channel_name] = 0
-                    # TODO: @@@ reduce length of waveform?
-
-            bias_T_compensation_mV = self._add_bias_T_compensation(buffer, bias_T_compensation_mV,
-                                                                   section.sample_rate, channel_info)
-            self._upload_wvf(job, channel_name, buffer, channel_info.amplitude, channel_info.attenuation,
-                             section.sample_rate, awg_upload_func)
+            channels.append((channel_name, channel_info))
+
+        if self.delta_cache is not None:
+            layout_key = get_layout_key(self.segments, job.upload_info)
+
+        # list with (channel_name, key, description) or (channel_name, key, uploaded waveforms)
+        channel_uploads = []
+        for channel_name, channel_info in channels:
+            key = None
+            if self.delta_cache is not None:
+                # reuse the uploaded waveforms if channel did not change
+                key = self.delta_cache.get_key(job, channel_name, layout_key, start_phases_all)
+                upload = self.delta_cache.get(job.seq_id, channel_name, key)
+                if upload is not None:
+                    channel_uploads.append((channel_name, key, upload))
+                    continue
+            description = self._get_channel_description(job, channel_name, channel_info, start_phases_all)
+            channel_uploads.append((channel_name, key, description))
+
+        i = 0
+        try:
+            # channels are rendered in a buffer per AWG module
+            rendered_channels = iter(render_channels(
+                    [item for _, _, item in channel_uploads if isinstance(item, ChannelRenderDescription)],
+                    self.executor, job.cache_keys))
+            # upload in channel order for deterministic result.
+            for i, (channel_name, key, item) in enumerate(channel_uploads):
+                if isinstance(item, ChannelUpload):
+                    self._add_channel_upload(job, channel_name, item)
+                    continue
+                self._upload_rendered_channel(job, next(rendered_channels), awg_upload_func, key)
+        except:
+            # release the reused waveforms that have not been added to the job
+            for _, _, item in channel_uploads[i:]:
+                if isinstance(item, ChannelUpload):
+                    item.release()
+            raise
+
+    def _get_channel_description(self, job, channel_name, channel_info, start_phases_all):
+        waveforms = []
+        for iseg,(seg,seg_render) in enumerate(zip(job.sequence,self.segments)):
+            if isinstance(seg, conditional_segment):
+                logging.debug(f'conditional for {channel_name}')
+                seg_ch = get_conditional_channel(seg, channel_name)
+            else:
+                seg_ch = seg[channel_name]
+            ref_channel_states = RefChannels(seg_render.t_start,
+                                             start_phase=start_phases_all[iseg],
+                                             start_phases_all=start_phases_all)
+            waveforms.append(seg_ch.get_indexed_waveform(job.index, ref_channel_states))
+
+        return ChannelRenderDescription(channel_name, job.index, channel_info,
+                                        self.segments, job.upload_info.sections, waveforms,
+                                        job.neutralize, job.upload_info.dc_compensation_duration)
+
+    def _upload_rendered_channel(self, job, rendered, awg_upload_func, key=None):
+        if rendered.dc_compensation_voltage is not None:
+            job.upload_info.dc_compensation_voltages[rendered.name] = rendered.dc_compensation_voltage
+        upload = None
+        if self.delta_cache is not None:
+            upload = ChannelUpload(key, rendered.dc_compensation_voltage)
+        for waveform, sample_rate in rendered.waveforms:
+            wave_ref = awg_upload_func(rendered.name, waveform)
+            if upload is not None:
+                wave_ref = SharedWaveform(wave_ref)
+                upload.waveforms.append((wave_ref, sample_rate, waveform.nbytes, 1))
+            job.add_waveform(rendered.name, wave_ref, sample_rate*1e9, waveform.nbytes)
+        if upload is not None:
+            self.delta_cache.add(job.seq_id, rendered.name, upload)
+
+    def _add_channel_upload(self, job, channel_name, upload):
+        # the job takes ownership of the waveforms returned by delta_cache.get()
+        if upload.dc_compensation_voltage is not None:
+            job.upload_info.dc_compensation_voltages[channel_name] = upload.dc_compensation_voltage
+        for wave_ref, sample_rate, nbytes, _ in upload.waveforms:
+            job.add_waveform(channel_name, wave_ref, sample_rate*1e9, nbytes)
 
     def _render_markers(self, job, awg_upload_func):
         for channel_name, marker_channel in self.marker_channels.items():
@@ -894,7 +1120,7 @@ class UploadAggregator:
         # note: numpy inplace multiplication is much faster than standard multiplication
         waveform *= 1/(attenuation * amplitude)
         wave_ref = awg_upload_func(channel_name, waveform)
-        job.add_waveform(channel_name, wave_ref, sample_rate*1e9)
+        job.add_waveform(channel_name, wave_ref, sample_rate*1e9, waveform.nbytes)
 
     def _preprocess_conditional_segments(self, job):
         self.conditional_segments = [None] * len(job.sequence)
@@ -925,13 +1151,8 @@ class UploadAggregator:
     def _render_phase_shift(self, phase_shift) -> Waveform:
         return Waveform('', prephase=phase_shift, duration=2)
 
-    def _get_waveform_index(self, waveforms:List[Waveform], waveform:Waveform):
-        try:
-            index = waveforms.index(waveform)
-        except ValueError:
-            index = len(waveforms)
-            waveforms.append(waveform)
-        return index
+    def _get_waveform_index(self, waveforms:WaveformTable, waveform:Waveform):
+        return waveforms.get_index(waveform)
 
     def _generate_sequencer_iq_upload(self, job):
         segments = self.segments
@@ -946,7 +1167,7 @@ class UploadAggregator:
             if delays[0] != delays[1]:
                 raise Exception(f'I/Q Channel delays must be equal ({channel_name})')
 
-            waveforms = []
+            waveforms = WaveformTable(channel_name)
             sequence = []
             # TODO improve for alignment on 1 ns. -> set channel delay in FPGA
             # subtract 10 ns, because it's started 10 ns before 'classical' queued waveform
@@ -1036,29 +1257,137 @@ class UploadAggregator:
                 sequence.pop()
 
             job.sequencer_sequences[channel_name] = sequence
-            job.sequencer_waveforms[channel_name] = waveforms
+            job.sequencer_waveforms[channel_name] = waveforms.waveforms
+            job.sequencer_waveform_stats[channel_name] = waveforms.stats()
+            duration = time.perf_counter() - start
+            logging.debug(f'generated iq sequence {channel_name} {duration*1000:6.3f} ms '
+                          f'({waveforms.stats()})')
+
+    def _generate_sequencer_baseband_upload(self, job):
+        segments = self.segments
+        sections = job.upload_info.sections
+
+        for channel_name, channel_info in self.channels.items():
+            if channel_name not in self.sequencer_channels:
+                # skip standard AWG channels
+                continue
+            start = time.perf_counter()
+            # sequencer is started 10 ns before 'classical' queued waveform
+            t_start = -self.max_pre_start_ns - 10
+
+            # linear intervals on 1 ns grid relative to t_start. The channel delay is added to the intervals.
+            intervals = []
+            for iseg,(seg,seg_render) in enumerate(zip(job.sequence,segments)):
+                if isinstance(seg, conditional_segment):
+                    raise Exception(f'Conditional segments are not supported on baseband sequencer '
+                                    f'({channel_name} segment:{iseg})')
+                data = seg[channel_name]._get_data_all_at(job.index)
+                if len(data.MW_pulse_data) > 0 or len(data.custom_pulse_data) > 0:
+                    raise Exception(f'MW and custom pulses are not supported on baseband sequencer '
+                                    f'({channel_name} segment:{iseg})')
+                start_pt, n_pt, amplitudes, steps = data.get_baseband_intervals()
+                # samples after the end of the segment are not rendered
+                seg_npt = iround(seg_render.npt / seg_render.sample_rate)
+                n_pt = np.minimum(n_pt, seg_npt - start_pt)
+                t_offset = iround(seg_render.t_start + channel_info.delay_ns - t_start)
+                for t, n, amplitude, step in zip(start_pt, n_pt, amplitudes, steps):
+                    if n > 0 and (amplitude != 0 or step != 0):
+                        intervals.append((t_offset + t, n, amplitude, step))
+
+            compensation_duration = iround(job.upload_info.dc_compensation_duration)
+            if job.neutralize and channel_info.dc_compensation and compensation_duration > 0:
+                # compensation at end of last section, like the rendered channels. It is not delayed.
+                section = sections[-1]
+                compensation_voltage = -channel_info.integral / compensation_duration * 1e9
+                t_compensation = iround(section.t_end - 1/section.sample_rate - t_start) - compensation_duration
+                intervals.append((t_compensation, compensation_duration, compensation_voltage, 0.0))
+                job.upload_info.dc_compensation_voltages[channel_name] = compensation_voltage
+
+            t_end = iround(sections[-1].t_end - t_start)
+            sequence, waveforms = self._compile_baseband_sequence(intervals, t_end, channel_info.attenuation,
+                                                                  WaveformTable(channel_name))
+
+            job.sequencer_sequences[channel_name] = sequence
+            job.sequencer_waveforms[channel_name] = waveforms.waveforms
+            job.sequencer_waveform_stats[channel_name] = waveforms.stats()
             duration = time.perf_counter() - start
-            logging.debug(f'generated iq sequence {channel_name} {duration*1000:6.3f} ms')
-
-#    def _generate_sequencer_baseband_upload(self, job):
-# TODO @@@ baseband pulses
-#        for channel_name, channel_info in self.channels.items():
-#            if channel_name not in self.sequencer_channels:
-#                # skip standard AWG channels
-#                continue
-#
-#            section = sections[0]
-#            buffer = np.zeros(section.npt)
-#
-#            for iseg,(seg,seg_render) in enumerate(zip(job.sequence,segments)):
-#
-#                sample_rate = seg_render.sample_rate
-#                n_delay = round(channel_info.delay_ns * sample_rate)
-#
-#                seg_ch = getattr(seg, channel_name)
-#                start = time.perf_counter()
-#                wvf = seg_ch.get_segment(job.index, sample_rate*1e9)
-#                duration = time.perf_counter() - start
+            logging.debug(f'generated baseband sequence {channel_name} {len(sequence)} instructions '
+                          f'{duration*1000:6.3f} ms ({waveforms.stats()})')
+
+    def _compile_baseband_sequence(self, intervals, t_end, attenuation, waveforms):
+        '''
+        Compiles linear intervals in block, ramp and transition waveforms.
+        Instructions are aligned on 5 ns. A long interval is played as a single block or ramp.
+        A 5 ns transition waveform with the samples is played when the boundary of
+        an interval is not aligned.
+
+        Args:
+            intervals (List[Tuple[int,int,float,float]]): start, number of samples,
+                amplitude and step per sample of linear intervals in ns. Intervals may not overlap.
+            t_end (int): end time of the sequence.
+            attenuation (float): attenuation of the channel.
+            waveforms (WaveformTable): table to add the waveforms to.
+        Returns:
+            sequence (List[SequenceEntry]), waveforms (WaveformTable)
+        '''
+        intervals = sorted(intervals)
+        starts = np.array([interval[0] for interval in intervals], dtype=int)
+        stops = np.array([interval[0] + interval[1] for interval in intervals], dtype=int)
+
+        # window boundaries on 5 ns grid. Unaligned boundaries get a 5 ns transition window.
+        boundaries = np.concatenate([starts, stops])
+        grid = boundaries // 5 * 5
+        grid = np.unique(np.concatenate([grid, grid[boundaries != grid] + 5, [0]]))
+        grid = grid[grid < t_end]
+        grid = np.append(grid, t_end)
+
+        # (t, waveform) per instruction. Waveform None is a wait.
+        instructions = []
+        for t0, t1 in zip(grid[:-1], grid[1:]):
+            first = np.searchsorted(stops, t0, side='right')
+            last = np.searchsorted(starts, t1, side='left')
+            if first >= last:
+                wvf = None
+            elif last - first == 1 and starts[first] <= t0 and stops[first] >= t1:
+                # window in a single interval: block or ramp
+                _, _, amplitude, step = intervals[first]
+                v_start = amplitude + (t0 - starts[first]) * step
+                if step == 0:
+                    wvf = Waveform('', v_start / attenuation, 1.0, duration=int(t1-t0))
+                else:
+                    samples = v_start + np.arange(t1-t0) * step
+                    wvf = self._get_baseband_envelope_waveform(samples, attenuation)
+            else:
+                # transition between intervals
+                samples = np.zeros(t1-t0)
+                for i in range(first, last):
+                    t, n, amplitude, step = intervals[i]
+                    i0 = max(t, t0)
+                    i1 = min(t + n, t1)
+                    samples[i0-t0:i1-t0] = amplitude + np.arange(i0-t, i1-t) * step
+                wvf = self._get_baseband_envelope_waveform(samples, attenuation)
+
+            if wvf is None and len(instructions) > 0 and instructions[-1][1] is None:
+                # extend wait
+                continue
+            instructions.append((int(t0), wvf))
+
+        sequence = []
+        for i, (t, wvf) in enumerate(instructions):
+            t_next = instructions[i+1][0] if i+1 < len(instructions) else t_end
+            index = waveforms.get_index(wvf) if wvf is not None else None
+            sequence.append(SequenceEntry(int(t_next - t), index))
+
+        # remove useless entries from the end
+        while (len(sequence) > 0 and sequence[-1].waveform_index is None):
+            sequence.pop()
+        return sequence, waveforms
+
+    def _get_baseband_envelope_waveform(self, samples, attenuation):
+        amplitude = np.max(np.abs(samples))
+        if amplitude == 0:
+            return None
+        return Waveform('', amplitude / attenuation, samples / amplitude, duration=len(samples))
 
     def _generate_digitizer_triggers(self, job):
         offset = int(self.max_pre_start_ns)
@@ -1167,6 +1496,7 @@ class UploadAggregator:
         job.marker_tables = {} # @@@ add to upload_info?
         job.sequencer_sequences = {}
         job.sequencer_waveforms = {}
+        job.sequencer_waveform_stats = {}
         job.digitizer_sequences = {}
         job.digitizer_triggers = {}
         job.digitizer_trigger_channels = {}
@@ -1184,8 +1514,8 @@ class UploadAggregator:
         if QsUploader.use_iq_sequencers:
             self._generate_sequencer_iq_upload(job)
 
-#        if QsUploader.use_baseband_sequencers:
-#            self._generate_sequencer_baseband_upload(job)
+        if QsUploader.use_baseband_sequencers:
+            self._generate_sequencer_baseband_upload(job)
 
         if QsUploader.use_digitizer_sequencers:
             self._generate_digitizer_sequences(job)
@@ -1221,15 +1551,3 @@ class UploadAggregator:
             result = -channel_info.integral / channel_info.dc_compensation_min
         return result
 
-
-    def _add_bias_T_compensation(self, buffer, bias_T_compensation_mV, sample_rate, channel_info):
-
-        if channel_info.bias_T_RC_time:
-            compensation_factor = 1 / (sample_rate * 1e9 * channel_info.bias_T_RC_time)
-            compensation = np.cumsum(buffer) * compensation_factor + bias_T_compensation_mV
-            bias_T_compensation_mV = compensation[-1]
-            logging.info(f'bias-T compensation  min:{np.min(compensation):5.1f} max:{np.max(compensation):5.1f} mV')
-            buffer += compensation
-
-        return bias_T_compensation_mV
-
@@ -0,0 +1,435 @@
+"""
+Rendering of the waveform of an AWG channel for one index of a sequence.
+
+The channel is described by a ChannelRenderDescription which contains only the data
+of the index. The description can be pickled to render the channel in another process.
+
+The channels of an AWG module are rendered in the rows of a ModuleRenderBuffer.
+Bias-T compensation and scaling to the AWG output are applied to the whole module buffer.
+"""
+import logging
+import pickle
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+from pulse_lib.segments.data_classes.data_generic import parent_data
+
+
+@dataclass
+class RenderedChannel:
+    name: str
+    # list with (waveform, sample_rate) per section.
+    # render_channel returns the waveforms in mV without bias-T compensation.
+    # render_channels returns the waveforms scaled to the AWG output.
+    waveforms: List = field(default_factory=list)
+    dc_compensation_voltage: Optional[float] = None
+
+
+@dataclass
+class ChannelRenderDescription:
+    '''
+    Description of the waveform of a channel for one index of the sequence.
+    '''
+    name: str
+    index: Tuple[int]
+    # ChannelInfo of the uploader
+    channel_info: Any
+    # SegmentRenderInfo per segment
+    segments: List[Any]
+    # RenderSection of the job
+    sections: List[Any]
+    # IndexedWaveform per segment
+    waveforms: List[Any]
+    neutralize: bool
+    dc_compensation_duration: float
+
+
+class ModuleRenderBuffer:
+    '''
+    Render buffer of the channels of an AWG module.
+    Every section has one (n_channels, npt) array with a row per channel.
+    The rows are passed as zero-copy views to rendering and upload.
+
+    Args:
+        sections (List[RenderSection]): sections of the job.
+        channel_names (List[str]): names of the channels in row order.
+        channel_infos (List[ChannelInfo]): info of the channels in row order.
+    '''
+    def __init__(self, sections, channel_names, channel_infos):
+        self.sections = sections
+        self.channel_names = channel_names
+        self.channel_infos = channel_infos
+        self.data = [np.zeros((len(channel_infos), section.npt)) for section in sections]
+
+    def get_channel_buffers(self, row):
+        '''
+        Returns the buffer per section of the channel in the row.
+        '''
+        return [data[row] for data in self.data]
+
+    def scale_to_output(self):
+        '''
+        Adds the bias-T compensation and scales the data to the AWG output
+        for all channels at once. Logs a warning when a channel exceeds the AWG amplitude.
+        '''
+        channel_names = self.channel_names
+        infos = self.channel_infos
+        scaling = np.array([1/(info.attenuation * info.amplitude) for info in infos])[:, None]
+        bias_T_rows = [i for i, info in enumerate(infos) if info.bias_T_RC_time]
+        rc_times = np.array([infos[i].bias_T_RC_time for i in bias_T_rows])[:, None]
+        bias_T_compensation_mV = np.zeros((len(bias_T_rows), 1))
+        peak = np.zeros(len(infos))
+
+        for section, data in zip(self.sections, self.data):
+            if len(bias_T_rows) > 0:
+                compensation_factor = 1 / (section.sample_rate * 1e9 * rc_times)
+                compensation = np.cumsum(data[bias_T_rows], axis=1) * compensation_factor + bias_T_compensation_mV
+                bias_T_compensation_mV = compensation[:, -1:]
+                if logging.getLogger().isEnabledFor(logging.INFO):
+                    for row, vmin, vmax in zip(bias_T_rows, np.min(compensation, axis=1),
+                                               np.max(compensation, axis=1)):
+                        logging.info(f'bias-T compensation {channel_names[row]} '
+                                     f'min:{vmin:5.1f} max:{vmax:5.1f} mV')
+                data[bias_T_rows] += compensation
+            # note: numpy inplace multiplication is much faster than standard multiplication
+            data *= scaling
+            if data.shape[1] > 0:
+                peak = np.maximum(peak, np.maximum(np.max(data, axis=1), -np.min(data, axis=1)))
+
+        for name, info, value in zip(channel_names, infos, peak):
+            if value > 1.0:
+                logging.warning(f'Waveform of {name} exceeds AWG amplitude '
+                                f'({value*info.amplitude:.1f} mV > {info.amplitude} mV). Output is clipped.')
+
+
+def render_channel(description, buffers=None):
+    '''
+    Renders the waveforms of a channel with welding of sections and DC compensation.
+    The waveforms are in mV. Bias-T compensation and scaling to AWG output are
+    applied afterwards on the ModuleRenderBuffer.
+
+    Args:
+        description (ChannelRenderDescription): description of channel.
+        buffers (Optional[List[np.ndarray]]): zero initialized buffer per section.
+            If None new buffers are allocated.
+
+    Returns:
+        RenderedChannel: waveform per section and DC compensation voltage.
+    '''
+    channel_name = description.name
+    channel_info = description.channel_info
+    segments = description.segments
+    sections = description.sections
+    rendered = RenderedChannel(channel_name)
+
+    def get_buffer(i_section):
+        if buffers is not None:
+            return buffers[i_section]
+        return np.zeros(sections[i_section].npt)
+
+    section = sections[0]
+    buffer = get_buffer(0)
+
+    for iseg,(waveform,seg_render) in enumerate(zip(description.waveforms,segments)):
+
+        sample_rate = seg_render.sample_rate
+        n_delay = round(channel_info.delay_ns * sample_rate)
+
+        start = time.perf_counter()
+        if seg_render.start_section or seg_render.end_section:
+            # welding needs the samples of the segment
+            wvf = waveform.render(sample_rate*1e9)
+            n_samples = len(wvf)
+        else:
+            # render directly in buffer
+            wvf = None
+            offset = seg_render.offset + n_delay
+            n_samples = waveform.render_into(buffer, offset, sample_rate*1e9)
+        duration = time.perf_counter() - start
+        logging.debug(f'generated [{description.index}]{iseg}:{channel_name} {n_samples} Sa, in {duration*1000:6.3f} ms')
+
+        if n_samples != seg_render.npt:
+            logging.warn(f'waveform {iseg}:{channel_name} {n_samples} Sa <> sequence length {seg_render.npt}')
+
+        i_start = 0
+        if seg_render.start_section:
+            if section != seg_render.start_section:
+                logging.error(f'OOPS section mismatch {iseg}, {channel_name}')
+
+            # add n_start_transition - n_delay to start_section
+#            n_delay_welding = round(channel_info.delay_ns * section.sample_rate)
+            t_welding = (section.t_end - seg_render.t_start)
+            i_start = round(t_welding*sample_rate) - n_delay
+            n_section = round(t_welding*section.sample_rate) + round(-channel_info.delay_ns * section.sample_rate)
+
+            if n_section > 0:
+                if np.round(n_section*sample_rate/section.sample_rate) >= len(wvf):
+                    raise Exception(f'segment {iseg} too short for welding. (nwelding:{n_section}, len_wvf:{len(wvf)})')
+
+                isub = [np.round(i*sample_rate/section.sample_rate) for i in np.arange(n_section)]
+                welding_samples = np.take(wvf, isub)
+                buffer[-n_section:] = welding_samples
+
+            rendered.waveforms.append((buffer, section.sample_rate))
+
+            section = seg_render.section
+            buffer = get_buffer(len(rendered.waveforms))
+
+
+        if seg_render.end_section:
+            next_section = seg_render.end_section
+            # add n_end_transition + n_delay to next section. First complete this section
+            n_delay_welding = round(channel_info.delay_ns * section.sample_rate)
+            t_welding = (seg_render.t_end - next_section.t_start)
+            i_end = len(wvf) - round(t_welding*sample_rate) + n_delay_welding
+
+            if i_start != i_end:
+                buffer[-(i_end-i_start):] = wvf[i_start:i_end]
+
+            rendered.waveforms.append((buffer, section.sample_rate))
+
+            section = next_section
+            buffer = get_buffer(len(rendered.waveforms))
+
+            n_section = round(t_welding*section.sample_rate) + round(channel_info.delay_ns * section.sample_rate)
+            if np.round(n_section*sample_rate/section.sample_rate) >= len(wvf):
+                raise Exception(f'segment {iseg} too short for welding. (nwelding:{n_section}, len_wvf:{len(wvf)})')
+
+            isub = [min(len(wvf)-1, i_end + np.round(i*sample_rate/section.sample_rate)) for i in np.arange(n_section)]
+            welding_samples = np.take(wvf, isub)
+            buffer[:n_section] = welding_samples
+
+        else:
+            if section != seg_render.section:
+                logging.error(f'OOPS-2 section mismatch {iseg}, {channel_name}')
+            if wvf is not None:
+                offset = seg_render.offset + n_delay
+                buffer[offset+i_start:offset + len(wvf)] = wvf[i_start:]
+
+
+    if description.neutralize:
+        if section != sections[-1]:
+            # Corner case, DC compensation is in a new section # @@@ can this occur??
+            rendered.waveforms.append((buffer, section.sample_rate))
+            section = sections[-1]
+            buffer = get_buffer(len(rendered.waveforms))
+            logging.info(f'DC compensation: Corner case {section}')
+
+        compensation_npt = round(description.dc_compensation_duration * section.sample_rate)
+
+        if compensation_npt > 0 and channel_info.dc_compensation:
+            compensation_voltage = -channel_info.integral * sample_rate / compensation_npt * 1e9
+            rendered.dc_compensation_voltage = compensation_voltage
+            buffer[-(compensation_npt+1):-1] = compensation_voltage
+            logging.debug(f'DC compensation {channel_name}: {compensation_voltage:6.1f} mV {compensation_npt} Sa')
+        else:
+            rendered.dc_compensation_voltage = 0
+            # TODO: @@@ reduce length of waveform?
+
+    rendered.waveforms.append((buffer, section.sample_rate))
+
+    return rendered
+
+
+def submit_render(executor, description, buffers=None):
+    '''
+    Submits rendering of a channel to the executor.
+
+    Args:
+        executor (Union[concurrent.futures.Executor, ProcessRenderEngine]): executor.
+        description (ChannelRenderDescription): description of channel.
+        buffers (Optional[List[np.ndarray]]): zero initialized buffer per section.
+
+    Returns:
+        Future with RenderedChannel.
+    '''
+    if isinstance(executor, ProcessRenderEngine):
+        return executor.submit(description, buffers)
+    return executor.submit(render_channel, description, buffers)
+
+
+def _render_channel_recording_keys(description, buffers, cache_keys):
+    with parent_data.waveform_cache.record_keys(cache_keys):
+        return render_channel(description, buffers)
+
+
+def render_channels(descriptions, executor=None, cache_keys=None):
+    '''
+    Renders the channels in a ModuleRenderBuffer per AWG module and scales
+    the waveforms to the AWG output.
+
+    Args:
+        descriptions (List[ChannelRenderDescription]): descriptions of the channels.
+            channel_info.awg_name specifies the AWG module of the channel.
+        executor (Union[concurrent.futures.Executor, ProcessRenderEngine, None]):
+            executor to render the channels concurrently.
+        cache_keys (Optional[set]): set to record the keys of the waveform cache used by
+            the render threads. Keys are not recorded for rendering in other processes.
+
+    Returns:
+        List[RenderedChannel]: rendered channels in order of descriptions.
+            The waveforms are views on the rows of the module buffers.
+    '''
+    if len(descriptions) == 0:
+        return []
+    sections = descriptions[0].sections
+    module_channels = {}
+    for description in descriptions:
+        module_channels.setdefault(description.channel_info.awg_name, []).append(description)
+
+    modules = {}
+    channel_buffers = {}
+    for awg_name, module_descriptions in module_channels.items():
+        module = ModuleRenderBuffer(sections, [d.name for d in module_descriptions],
+                                    [d.channel_info for d in module_descriptions])
+        modules[awg_name] = module
+        for row, description in enumerate(module_descriptions):
+            channel_buffers[description.name] = module.get_channel_buffers(row)
+
+    if executor is not None:
+        # channels are rendered concurrently. Channel state (integral) is local per channel.
+        if cache_keys is not None and not isinstance(executor, ProcessRenderEngine):
+            futures = [executor.submit(_render_channel_recording_keys, description,
+                                       channel_buffers[description.name], cache_keys)
+                       for description in descriptions]
+        else:
+            futures = [submit_render(executor, description, channel_buffers[description.name])
+                       for description in descriptions]
+        try:
+            rendered_channels = [future.result() for future in futures]
+        finally:
+            # cancel remaining rendering on failure
+            for future in futures:
+                future.cancel()
+    else:
+        rendered_channels = [render_channel(description, channel_buffers[description.name])
+                             for description in descriptions]
+
+    for module in modules.values():
+        module.scale_to_output()
+
+    return rendered_channels
+
+
+class _UnpicklingFailed:
+    '''
+    Result of the worker when the description cannot be unpickled,
+    e.g. because the module of a custom pulse function cannot be imported.
+    '''
+    def __init__(self, message):
+        self.message = message
+
+
+def _render_to_shared_memory(pickled_description, shm_name):
+    try:
+        description = pickle.loads(pickled_description)
+    except (pickle.UnpicklingError, ImportError, AttributeError, EOFError) as ex:
+        return _UnpicklingFailed(f'{type(ex).__name__}: {ex}')
+    rendered = render_channel(description)
+    shm = SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shm.size // 8, dtype=np.float64, buffer=shm.buf)
+        layout = []
+        offset = 0
+        for waveform, sample_rate in rendered.waveforms:
+            n = len(waveform)
+            out[offset:offset+n] = waveform
+            layout.append((offset, n, sample_rate))
+            offset += n
+        # release buffer before closing shared memory
+        del out
+    finally:
+        shm.close()
+    return rendered.dc_compensation_voltage, layout
+
+
+class ProcessRenderEngine:
+    '''
+    Renders channels in a pool of processes. This avoids the limitation of the GIL on the
+    python code in the rendering of pulses.
+
+    The channel description is pickled and sent to the worker process. The rendered
+    waveforms are returned via shared memory instead of pickled arrays.
+    Channels with data that cannot be pickled, e.g. custom pulses with a lambda function,
+    are rendered in the calling thread. Functions are pickled by reference. Channels with
+    functions that the worker process cannot import are rendered locally after the worker
+    failed to unpickle the description. This is the case for functions defined in `__main__`
+    of a Jupyter notebook or in modules that are created interactively.
+
+    The workers are started with the 'spawn' method. On Windows, and with spawn in general,
+    the main script must be protected with `if __name__ == '__main__':`.
+
+    Args:
+        max_workers (int): maximum number of processes. Default: number of CPUs.
+        mp_context: multiprocessing context. Default: 'spawn' context.
+    '''
+    def __init__(self, max_workers=None, mp_context=None):
+        if mp_context is None:
+            # spawn does not inherit locks held by threads of the uploader.
+            mp_context = get_context('spawn')
+        self._executor = ProcessPoolExecutor(max_workers, mp_context=mp_context)
+
+    def submit(self, description, buffers=None):
+        '''
+        Submits rendering of a channel.
+
+        Args:
+            description (ChannelRenderDescription): description of channel.
+            buffers (Optional[List[np.ndarray]]): buffer per section to copy the result to.
+
+        Returns:
+            Future with RenderedChannel.
+        '''
+        future = Future()
+        # rendering cannot be cancelled halfway; the shared memory must be released.
+        future.set_running_or_notify_cancel()
+        try:
+            pickled_description = pickle.dumps(description, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, AttributeError, TypeError) as ex:
+            logging.info(f'Rendering {description.name} in local process: {ex}')
+            try:
+                future.set_result(render_channel(description, buffers))
+            except Exception as ex:
+                future.set_exception(ex)
+            return future
+
+        npt = sum(section.npt for section in description.sections)
+        shm = SharedMemory(create=True, size=max(npt, 1) * 8)
+        process_future = self._executor.submit(_render_to_shared_memory, pickled_description, shm.name)
+
+        def copy_result(process_future):
+            try:
+                result = process_future.result()
+                if isinstance(result, _UnpicklingFailed):
+                    logging.info(f'Rendering {description.name} in local process: {result.message}')
+                    future.set_result(render_channel(description, buffers))
+                    return
+                dc_compensation_voltage, layout = result
+                data = np.ndarray(shm.size // 8, dtype=np.float64, buffer=shm.buf)
+                if buffers is None:
+                    waveforms = [(data[offset:offset+n].copy(), sample_rate)
+                                 for offset, n, sample_rate in layout]
+                else:
+                    waveforms = []
+                    for buffer, (offset, n, sample_rate) in zip(buffers, layout):
+                        buffer[:] = data[offset:offset+n]
+                        waveforms.append((buffer, sample_rate))
+                del data
+                future.set_result(RenderedChannel(description.name, waveforms, dc_compensation_voltage))
+            except Exception as ex:
+                future.set_exception(ex)
+            finally:
+                shm.close()
+                shm.unlink()
+
+        process_future.add_done_callback(copy_result)
+        return future
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait)
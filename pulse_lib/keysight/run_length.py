@@ -0,0 +1,87 @@
+"""
+Run-length compression of AWG waveforms.
+
+Long constant regions, e.g. waits and the DC compensation plateau, are replaced by
+a short waveform that is queued with cycles > 1.
+Every split costs an extra waveform in the AWG memory and extra queue entries.
+A constant region is only split off when the saved samples outweigh this cost.
+"""
+import heapq
+
+import numpy as np
+
+
+# maximum number of cycles of a queued waveform.
+MAX_CYCLES = 65535
+
+# minimum length of a constant run that can be compressed.
+MIN_RUN_SAMPLES = 200
+
+# estimated cost of an extra waveform and queue entry expressed in samples.
+PART_COST = 500
+
+# maximum number of parts a waveform is split in.
+MAX_PARTS = 9
+
+
+def compress_waveform(waveform, min_samples, alignment, max_parts=MAX_PARTS):
+    '''
+    Splits the waveform in parts. Constant runs of at least min_samples are replaced
+    by a short waveform that is repeated when the number of saved samples is larger
+    than the cost of the extra parts (PART_COST per part). The runs with the largest
+    gain are compressed, with at most max_parts parts in total.
+    All parts have a length that is a multiple of alignment. Samples of a run that
+    are not compressed, because of alignment or partial cycles, stay in the
+    neighbouring part.
+
+    Args:
+        waveform (np.ndarray): waveform with length multiple of alignment.
+        min_samples (int): minimum number of samples of a constant run to compress.
+        alignment (int): alignment of the waveform length.
+        max_parts (int): maximum number of parts.
+    Returns:
+        List[Tuple[np.ndarray, int]]: list with waveform and number of cycles.
+            The parts are views on waveform.
+    '''
+    n = len(waveform)
+    if n < min_samples or n % alignment != 0:
+        return [(waveform, 1)]
+
+    # start and end of runs of equal samples
+    changes = np.flatnonzero(waveform[1:] != waveform[:-1]) + 1
+    run_starts = np.concatenate([[0], changes])
+    run_ends = np.concatenate([changes, [n]])
+    long_runs = np.flatnonzero(run_ends - run_starts >= min_samples)
+
+    candidates = []
+    for i in long_runs:
+        # aligned part of run
+        start = -(-run_starts[i] // alignment) * alignment
+        end = run_ends[i] // alignment * alignment
+        n_run = end - start
+        if n_run < min_samples:
+            continue
+        # short waveform with maximum MAX_CYCLES repetitions
+        n_cycle = -(-n_run // (alignment * MAX_CYCLES)) * alignment
+        cycles = n_run // n_cycle
+        n_compressed = cycles * n_cycle
+        # the run adds a part before and after it, unless it is at the start or end.
+        n_extra = (start > 0) + (start + n_compressed < n)
+        gain = n_compressed - n_cycle - n_extra * PART_COST
+        if gain > 0:
+            candidates.append((gain, int(start), int(n_cycle), int(cycles)))
+
+    # every run adds at most 2 parts
+    selected = heapq.nlargest((max_parts - 1) // 2, candidates)
+    selected.sort(key=lambda run: run[1])
+
+    parts = []
+    pos = 0
+    for _, start, n_cycle, cycles in selected:
+        if start > pos:
+            parts.append((waveform[pos:start], 1))
+        parts.append((waveform[start:start+n_cycle], cycles))
+        pos = start + cycles * n_cycle
+    if pos < n:
+        parts.append((waveform[pos:], 1))
+    return parts
@@ -60,11 +60,11 @@ class SequencerDevice:
         index = 1 if channel_number in [3,4] else 0
         if self.iq_channels[index] is not None:
             raise Exception(f'sequencer cannot combine IQ and BB channels on same output')
-        if self.sequencers[channel_number] is not None:
+        if self.sequencers[channel_number-1] is not None:
             raise Exception(f'sequencer cannot have multiple BB channels on same output')
         phases = [90,0] if channel_number % 2 == 1 else [0,90]
         sequencer = SequencerInfo(self.name, channel_number, channel_name, None, phases, [channel_number])
-        self.sequencers[channel_number] = sequencer
+        self.sequencers[channel_number-1] = sequencer
         return sequencer
 
 def add_sequencers(obj, AWGs, awg_channels, IQ_channels):
@@ -98,15 +98,17 @@ def add_sequencers(obj, AWGs, awg_channels, IQ_channels):
         for iseq,seq in enumerate(qubit_sequencers):
             obj.sequencer_channels[seq.channel_name] = seq
 
-# @@@ commented out, because base band channels do not yet work.
-#    for awg_channel in awg_channels.values():
-#        if (awg_channel.awg_name in obj.sequencer_devices
-#            and awg_channel.name not in obj.sequencer_out_channels):
-#            seq_device = obj.sequencer_devices[awg_channel.awg_name]
-#            bb_seq = seq_device.add_bb_channel(awg_channel.channel_number, awg_channel.name)
-#
-#            obj.sequencer_channels[bb_seq.channel_name] = bb_seq
-#            obj.sequencer_out_channels += [bb_seq.channel_name]
+    if obj.use_baseband_sequencers:
+        for awg_channel in awg_channels.values():
+            # bias-T compensation cannot be compiled to sequencer instructions.
+            if (awg_channel.awg_name in obj.sequencer_devices
+                and awg_channel.name not in obj.sequencer_out_channels
+                and not awg_channel.bias_T_RC_time):
+                seq_device = obj.sequencer_devices[awg_channel.awg_name]
+                bb_seq = seq_device.add_bb_channel(awg_channel.channel_number, awg_channel.name)
+
+                obj.sequencer_channels[bb_seq.channel_name] = bb_seq
+                obj.sequencer_out_channels += [bb_seq.channel_name]
 
     for dev in obj.sequencer_devices.values():
         awg = dev.awg
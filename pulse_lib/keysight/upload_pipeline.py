@@ -0,0 +1,134 @@
+import logging
+import queue
+import threading
+import time
+
+
+class PendingWaveform:
+    '''
+    Waveform that is rendered, but not yet uploaded to the AWG.
+    It is replaced by the AWG waveform reference in the upload stage of the pipeline.
+    '''
+    def __init__(self, channel_name, waveform):
+        self.channel_name = channel_name
+        self.waveform = waveform
+
+    def release(self):
+        self.waveform = None
+
+
+class UploadFuture:
+    '''
+    Future-like state of an upload job.
+    The job is done when all waveforms have been uploaded to the AWGs.
+    '''
+    def _init_future(self):
+        self._done_event = threading.Event()
+        self._exception = None
+
+    def done(self):
+        '''
+        Returns True if the job has been uploaded, or if the upload failed.
+        '''
+        return self._done_event.is_set()
+
+    def result(self, timeout=None):
+        '''
+        Waits till the job has been uploaded.
+        Args:
+            timeout (float): maximum time to wait in seconds. None waits forever.
+        Returns:
+            the job.
+        Raises:
+            TimeoutError if the upload did not complete within the timeout.
+            The exception raised during rendering or upload of the job.
+        '''
+        if not self._done_event.wait(timeout):
+            raise TimeoutError(f'Upload of job {self.seq_id}-{self.index} not completed')
+        if self._exception is not None:
+            raise self._exception
+        return self
+
+    def exception(self, timeout=None):
+        '''
+        Waits till the job has been uploaded and returns the exception raised during
+        rendering or upload, or None.
+        '''
+        if not self._done_event.wait(timeout):
+            raise TimeoutError(f'Upload of job {self.seq_id}-{self.index} not completed')
+        return self._exception
+
+    def _set_done(self):
+        self._done_event.set()
+
+    def _set_exception(self, exception):
+        self._exception = exception
+        self._done_event.set()
+
+
+class UploadPipeline:
+    '''
+    Renders upload jobs in a background thread and uploads the rendered waveforms
+    in a second thread. The rendered jobs wait in a bounded queue for upload.
+
+    Args:
+        render_func (Callable[[Job], None]): renders the waveforms of a job.
+        upload_func (Callable[[Job], None]): uploads the rendered waveforms of a job.
+        max_ready_jobs (int): maximum number of rendered jobs waiting for upload.
+    '''
+    def __init__(self, render_func, upload_func, max_ready_jobs=4):
+        self._render_func = render_func
+        self._upload_func = upload_func
+        self._jobs = queue.Queue()
+        self._ready_jobs = queue.Queue(maxsize=max_ready_jobs)
+        self._render_thread = threading.Thread(target=self._render_loop,
+                                               name='pulselib-render', daemon=True)
+        self._upload_thread = threading.Thread(target=self._upload_loop,
+                                               name='pulselib-upload', daemon=True)
+        self._render_thread.start()
+        self._upload_thread.start()
+
+    def submit(self, job):
+        self._jobs.put(job)
+
+    def stop(self):
+        '''
+        Stops the pipeline after all submitted jobs have been processed.
+        '''
+        self._jobs.put(None)
+        self._render_thread.join()
+        self._upload_thread.join()
+
+    def _render_loop(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                self._ready_jobs.put(None)
+                return
+            if job.released:
+                job._set_done()
+                continue
+            try:
+                start = time.perf_counter()
+                self._render_func(job)
+                logging.debug(f'rendered job {job.seq_id}-{job.index} ({(time.perf_counter()-start)*1000:6.3f} ms)')
+            except Exception as ex:
+                logging.error(f'Rendering of job {job.seq_id}-{job.index} failed', exc_info=True)
+                job._set_exception(ex)
+                continue
+            self._ready_jobs.put(job)
+
+    def _upload_loop(self):
+        while True:
+            job = self._ready_jobs.get()
+            if job is None:
+                return
+            try:
+                start = time.perf_counter()
+                self._upload_func(job)
+                logging.debug(f'uploaded job {job.seq_id}-{job.index} ({(time.perf_counter()-start)*1000:6.3f} ms)')
+            except Exception as ex:
+                logging.error(f'Upload of job {job.seq_id}-{job.index} failed', exc_info=True)
+                job._set_exception(ex)
+                continue
+            job._set_done()
@@ -0,0 +1,244 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .upload_pipeline import PendingWaveform
+
+
+@dataclass
+class WaveformPoolStats:
+    '''
+    Statistics of the waveform pool of an AWG module.
+    '''
+    module_name: str
+    max_bytes: int
+    nbytes: int
+    n_waveforms: int
+    n_in_use: int
+    hits: int
+    misses: int
+    evictions: int
+
+    @property
+    def hit_rate(self):
+        n_uploads = self.hits + self.misses
+        return self.hits / n_uploads if n_uploads > 0 else 0.0
+
+    def __str__(self):
+        return (f'{self.module_name}: {self.nbytes/1e6:.1f}/{self.max_bytes/1e6:.1f} MB, '
+                f'{self.n_waveforms} waveforms ({self.n_in_use} in use), '
+                f'hits:{self.hits} misses:{self.misses} ({self.hit_rate:.1%}) evictions:{self.evictions}')
+
+
+class _PoolEntry:
+    def __init__(self, module, key, awg_reference, nbytes):
+        self.module = module
+        self.key = key
+        self.awg_reference = awg_reference
+        self.nbytes = nbytes
+        self.refcount = 0
+
+
+class PooledWaveform:
+    '''
+    Reference to a waveform in the pool. It is used as wave reference in the job.
+    '''
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    @property
+    def awg_reference(self):
+        return self._entry.awg_reference
+
+    def release(self):
+        if self._entry is not None:
+            self._pool._release(self._entry)
+            self._entry = None
+
+
+class _ModulePool:
+    def __init__(self, name, max_bytes):
+        self.name = name
+        self.max_bytes = max_bytes
+        # entries in LRU order. The least recently used entry is first.
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class WaveformPool:
+    '''
+    Pool of waveforms uploaded to the AWG modules.
+    The waveforms are keyed by a hash of their content. An uploaded waveform is reused
+    by all jobs that upload the same waveform to the same module. The waveforms are
+    reference counted. A waveform that is not used by any job stays in the AWG memory
+    until the memory budget of the module is reached. Then the least recently
+    used waveforms are released.
+
+    Args:
+        max_bytes_per_module (int): memory budget per AWG module. The size of a waveform is
+            estimated with AWG_BYTES_PER_SAMPLE.
+    '''
+    AWG_BYTES_PER_SAMPLE = 2
+
+    def __init__(self, max_bytes_per_module):
+        self.max_bytes_per_module = max_bytes_per_module
+        self._modules = {}
+        self._closed = False
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _get_key(waveform):
+        h = hashlib.blake2b(waveform.tobytes(), digest_size=16)
+        return (waveform.dtype.str, len(waveform), h.digest())
+
+    def upload(self, awg, waveform):
+        '''
+        Returns a reference to the waveform in the memory of the AWG.
+        The waveform is only uploaded if it is not yet in the pool.
+
+        Args:
+            awg: AWG module.
+            waveform (np.ndarray): waveform to upload.
+
+        Returns:
+            PooledWaveform: reference to release when the waveform is not used anymore.
+        '''
+        key = WaveformPool._get_key(waveform)
+        with self._lock:
+            module = self._modules.get(awg.name)
+            if module is None:
+                module = _ModulePool(awg.name, self.max_bytes_per_module)
+                self._modules[awg.name] = module
+
+            entry = module.entries.get(key)
+            if entry is not None:
+                module.hits += 1
+                module.entries.move_to_end(key)
+            else:
+                module.misses += 1
+                nbytes = len(waveform) * WaveformPool.AWG_BYTES_PER_SAMPLE
+                self._evict(module, module.max_bytes - nbytes)
+                awg_reference = self._upload(awg, module, waveform)
+                entry = _PoolEntry(module, key, awg_reference, nbytes)
+                module.entries[key] = entry
+                module.nbytes += nbytes
+                if module.nbytes > module.max_bytes:
+                    logging.warning(f'Waveform pool of {module.name} exceeds budget: '
+                                    f'{module.nbytes/1e6:.1f} MB in use')
+            entry.refcount += 1
+            return PooledWaveform(self, entry)
+
+    def _upload(self, awg, module, waveform):
+        while True:
+            try:
+                return awg.upload_waveform(waveform)
+            except Exception:
+                # AWG memory full? Retry after release of unused waveform.
+                if not self._evict_one(module):
+                    raise
+                logging.info(f'Upload to {module.name} failed. Retry after release of waveform')
+
+    def _evict(self, module, max_bytes):
+        while module.nbytes > max_bytes:
+            if not self._evict_one(module):
+                return
+
+    def _evict_one(self, module):
+        for key, entry in module.entries.items():
+            if entry.refcount == 0:
+                del module.entries[key]
+                module.nbytes -= entry.nbytes
+                module.evictions += 1
+                entry.awg_reference.release()
+                return True
+        return False
+
+    def _release(self, entry):
+        with self._lock:
+            entry.refcount -= 1
+            if entry.refcount == 0 and entry.key in entry.module.entries:
+                entry.module.entries.move_to_end(entry.key)
+                if self._closed:
+                    self._evict(entry.module, 0)
+
+    def clear(self):
+        '''
+        Releases all waveforms that are not used by a job.
+        '''
+        with self._lock:
+            for module in self._modules.values():
+                self._evict(module, 0)
+
+    def close(self):
+        '''
+        Releases all waveforms that are not used by a job. The other waveforms are
+        released when the jobs release them.
+        '''
+        with self._lock:
+            self._closed = True
+            self.clear()
+
+    def stats(self):
+        '''
+        Returns list with statistics per AWG module.
+        '''
+        with self._lock:
+            return [WaveformPoolStats(module.name, module.max_bytes, module.nbytes, len(module.entries),
+                                      sum(1 for entry in module.entries.values() if entry.refcount > 0),
+                                      module.hits, module.misses, module.evictions)
+                    for module in self._modules.values()]
+
+
+class SharedWaveform:
+    '''
+    Wave reference shared by multiple jobs. The wrapped reference is released
+    when the last user releases it.
+    '''
+    def __init__(self, wave_reference):
+        self.wave_reference = wave_reference
+        self._refcount = 1
+        self._lock = threading.Lock()
+
+    @property
+    def awg_reference(self):
+        return get_awg_reference(self.wave_reference)
+
+    def share(self):
+        '''
+        Adds a user of the reference.
+        '''
+        with self._lock:
+            self._refcount += 1
+        return self
+
+    def upload_pending(self, upload_func):
+        '''
+        Uploads the waveform if it has not yet been uploaded.
+        Args:
+            upload_func: function(channel_name, waveform) returning the wave reference.
+        '''
+        with self._lock:
+            pending = self.wave_reference
+            if self._refcount > 0 and isinstance(pending, PendingWaveform):
+                self.wave_reference = upload_func(pending.channel_name, pending.waveform)
+
+    def release(self):
+        with self._lock:
+            self._refcount -= 1
+            if self._refcount == 0:
+                self.wave_reference.release()
+
+
+def get_awg_reference(wave_reference):
+    '''
+    Returns the AWG waveform reference of a wave reference in a job.
+    '''
+    if isinstance(wave_reference, (PooledWaveform, SharedWaveform)):
+        return wave_reference.awg_reference
+    return wave_reference
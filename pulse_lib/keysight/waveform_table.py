@@ -0,0 +1,172 @@
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class WaveformTableStats:
+    '''
+    Statistics of the waveform table of a sequencer channel.
+    '''
+    channel_name: str
+    n_waveforms: int
+    hits: int
+    misses: int
+
+    @property
+    def hit_rate(self):
+        n_lookups = self.hits + self.misses
+        return self.hits / n_lookups if n_lookups > 0 else 0.0
+
+    def __str__(self):
+        return (f'{self.channel_name}: {self.n_waveforms} waveforms, '
+                f'hits:{self.hits} misses:{self.misses} ({self.hit_rate:.1%})')
+
+
+@dataclass
+class SequencerWaveformLibraryStats:
+    '''
+    Statistics of the waveform library of a sequencer.
+    '''
+    channel_name: str
+    max_waveforms: int
+    n_waveforms: int
+    n_samples: int
+    n_uploaded: int
+    n_reused: int
+
+    @property
+    def reuse_rate(self):
+        n_waveforms = self.n_uploaded + self.n_reused
+        return self.n_reused / n_waveforms if n_waveforms > 0 else 0.0
+
+    def __str__(self):
+        return (f'{self.channel_name}: {self.n_waveforms}/{self.max_waveforms} waveforms, '
+                f'{self.n_samples} samples, uploaded:{self.n_uploaded} reused:{self.n_reused} '
+                f'({self.reuse_rate:.1%})')
+
+
+def get_envelope_digest(envelope):
+    '''
+    Returns a hashable digest of an envelope, which is None, a number or an array.
+    '''
+    if isinstance(envelope, np.ndarray):
+        data = np.ascontiguousarray(envelope)
+        return (data.dtype.str, data.shape, hashlib.blake2b(data.tobytes(), digest_size=16).digest())
+    return envelope
+
+
+class WaveformTable:
+    '''
+    Table with the unique waveforms of a sequencer channel.
+    The waveforms are indexed on their digest, which makes the lookup independent
+    of the number of waveforms in the table.
+    '''
+    def __init__(self, channel_name):
+        self.channel_name = channel_name
+        self.waveforms = []
+        self._indices = {}
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self):
+        return len(self.waveforms)
+
+    def get_index(self, waveform):
+        '''
+        Returns the index of the waveform in the table. The waveform is added
+        when there is no waveform with the same digest.
+        '''
+        key = waveform.digest()
+        index = self._indices.get(key)
+        if index is None:
+            index = len(self.waveforms)
+            self.waveforms.append(waveform)
+            self._indices[key] = index
+            self._misses += 1
+        else:
+            self._hits += 1
+        return index
+
+    def stats(self):
+        return WaveformTableStats(self.channel_name, len(self.waveforms), self._hits, self._misses)
+
+
+class _LibraryEntry:
+    def __init__(self, number, duration):
+        self.number = number
+        self.duration = duration
+
+
+class SequencerWaveformLibrary:
+    '''
+    Waveforms in the memory of a sequencer. The waveforms stay in memory across jobs,
+    and a job only uploads the waveforms that are not yet in memory.
+    When the memory is full the least recently used waveforms are overwritten.
+
+    The waveforms are uploaded relative to the oscillator frequency of the sequencer.
+    The library is cleared when this frequency changes.
+    '''
+    def __init__(self, channel_name, max_waveforms):
+        self.channel_name = channel_name
+        self.max_waveforms = max_waveforms
+        self.frequency = None
+        self._entries = OrderedDict()
+        self._n_uploaded = 0
+        self._n_reused = 0
+
+    def clear(self):
+        '''
+        Clears the library. The waveforms in sequencer memory will be overwritten.
+        '''
+        self._entries.clear()
+
+    def add_waveforms(self, waveforms, frequency):
+        '''
+        Adds the waveforms of a job to the library.
+        Args:
+            waveforms (List[Waveform]): unique waveforms of the job.
+            frequency (float): oscillator frequency of the sequencer.
+        Returns:
+            wave_numbers (List[int]): wave number in sequencer memory per waveform.
+            uploads (List[Tuple[int, Waveform]]): waveforms to upload with their wave number.
+        '''
+        if len(waveforms) > self.max_waveforms:
+            raise Exception(f'Too many waveforms for sequencer {self.channel_name}: '
+                            f'{len(waveforms)} > {self.max_waveforms}')
+        if frequency != self.frequency:
+            self.clear()
+            self.frequency = frequency
+
+        keys = [waveform.digest() for waveform in waveforms]
+        job_keys = set(keys)
+        wave_numbers = []
+        uploads = []
+        for key, waveform in zip(keys, waveforms):
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._n_reused += 1
+            else:
+                entry = _LibraryEntry(self._get_free_number(job_keys), waveform.duration)
+                self._entries[key] = entry
+                uploads.append((entry.number, waveform))
+                self._n_uploaded += 1
+            wave_numbers.append(entry.number)
+        return wave_numbers, uploads
+
+    def _get_free_number(self, job_keys):
+        if len(self._entries) < self.max_waveforms:
+            used = {entry.number for entry in self._entries.values()}
+            return min(set(range(self.max_waveforms)) - used)
+        # overwrite least recently used waveform that is not used by the job
+        for key in self._entries:
+            if key not in job_keys:
+                return self._entries.pop(key).number
+
+    def stats(self):
+        return SequencerWaveformLibraryStats(self.channel_name, self.max_waveforms, len(self._entries),
+                                             sum(entry.duration for entry in self._entries.values()),
+                                             self._n_uploaded, self._n_reused)
@@ -6,6 +6,85 @@ import numpy as np
 
 from dataclasses import dataclass
 
+from pulse_lib.segments.data_classes.waveform_cache import WaveformCache
+
+
+def _cosine_window(*coefficients):
+    '''
+    Returns a generalized cosine window function with the given coefficients.
+    '''
+    def window(x, n_points):
+        w = np.full(len(x), coefficients[0])
+        for k, a in enumerate(coefficients[1:], 1):
+            w += (-1)**k * a * np.cos(2*np.pi*k*x)
+        return w
+    return window
+
+def _gaussian_window(x, n_points, std):
+    # NOTE: std is expressed in 1/10 of a sample for compatibility with
+    #       the former implementation, which used a 10 times oversampled window.
+    return np.exp(-0.5*((x - 0.5)*10*n_points/std)**2)
+
+def _tukey_window(x, n_points, alpha=0.5):
+    if alpha <= 0:
+        return np.ones(len(x))
+    if alpha >= 1:
+        return _cosine_window(0.5, 0.5)(x, n_points)
+    w = np.ones(len(x))
+    left = x < alpha/2
+    right = x > 1 - alpha/2
+    w[left] = 0.5*(1 + np.cos(np.pi*(-1 + 2*x[left]/alpha)))
+    w[right] = 0.5*(1 + np.cos(np.pi*(-2/alpha + 1 + 2*x[right]/alpha)))
+    return w
+
+def _bartlett_window(x, n_points):
+    return 1 - np.abs(2*x - 1)
+
+def _boxcar_window(x, n_points):
+    return np.ones(len(x))
+
+# windows that are evaluated directly at the sample points.
+# window functions have arguments (x, n_points, *args) where x is the relative position in the window [0, 1).
+_windows = {
+        'hann': _cosine_window(0.5, 0.5),
+        'hamming': _cosine_window(0.54, 0.46),
+        'blackman': _cosine_window(0.42, 0.50, 0.08),
+        'blackmanharris': _cosine_window(0.35875, 0.48829, 0.14128, 0.01168),
+        'nuttall': _cosine_window(0.3635819, 0.4891775, 0.1365995, 0.0106411),
+        'flattop': _cosine_window(0.21557895, 0.41663158, 0.277263158, 0.083578947, 0.006947368),
+        'gaussian': _gaussian_window,
+        'tukey': _tukey_window,
+        'bartlett': _bartlett_window,
+        'boxcar': _boxcar_window,
+        }
+_windows['hanning'] = _windows['hann']
+_windows['gauss'] = _windows['gaussian']
+_windows['ones'] = _windows['boxcar']
+_windows['rect'] = _windows['boxcar']
+_windows['rectangular'] = _windows['boxcar']
+
+
+def get_window(window, n_points):
+    '''
+    Returns the window evaluated at the sample points k/n_points, k = 0, ..., int(n_points)-1.
+    The window is periodic like scipy.signal.get_window, i.e. the window is 0 at x=0 and would be 0 again at x=1.
+
+    Args:
+        window (str or tuple): window specification as for scipy.signal.get_window.
+        n_points (float): (fractional) number of points of the pulse.
+    '''
+    if isinstance(window, tuple):
+        name, args = window[0], window[1:]
+    else:
+        name, args = window, ()
+    window_function = _windows.get(name)
+    if window_function is None:
+        # evaluate other windows on 10 times oversampled window.
+        return signal.get_window(window, int(n_points*10))[::10][:int(n_points)]
+    x = np.arange(int(n_points)) / n_points
+    return window_function(x, n_points, *args)
+
+
 class envelope_generator():
     """
     Object that handles envelope functions that can be used in spin qubit experiments.
@@ -13,7 +92,12 @@ class envelope_generator():
         * Makes sure average amplitude of the evelope is the one expressed
         * Executes some subsampling functions to give greater time resolution than the sample rate of the AWG.
         * Allows for plotting the FT of the envelope function.
+
+    Rendered envelopes are cached in `envelope_cache`, which is shared by all envelope generators.
+    The size of the cache is limited in bytes. The cached envelopes are read-only.
     """
+    envelope_cache = WaveformCache(32_000_000)
+
     def __init__(self, AM_envelope_function = None, PM_envelope_function = None):
         """
         define envelope funnctions.
@@ -25,6 +109,41 @@ class envelope_generator():
         self.AM_envelope_function = AM_envelope_function
         self.PM_envelope_function = PM_envelope_function
 
+    @classmethod
+    def set_envelope_cache_bytes(cls, max_bytes):
+        '''
+        Set the new maximum size of the envelope cache in bytes.
+        The cache is cleared when its size changes.
+        '''
+        if max_bytes != cls.envelope_cache.max_bytes:
+            cls.envelope_cache = WaveformCache(max_bytes)
+
+    @classmethod
+    def clear_envelope_cache(cls):
+        cls.envelope_cache.clear()
+
+    def _get_envelope(self, envelope_function, delta_t, sample_rate):
+        n_points = delta_t*sample_rate
+        if isinstance(envelope_function, (tuple, str)):
+            key = (envelope_function, n_points)
+        else:
+            key = (envelope_function, delta_t, sample_rate)
+
+        entry = self.envelope_cache.lookup(key)
+        if entry is not None:
+            return entry.value
+
+        if isinstance(envelope_function, (tuple, str)):
+            envelope = get_window(envelope_function, n_points)
+        else:
+            envelope = envelope_function(delta_t, sample_rate) # user reponsible to do good subsampling him/herself.
+        if isinstance(envelope, np.ndarray):
+            # cache a read-only copy; the array of the user function is not changed.
+            envelope = envelope.copy()
+            envelope.flags.writeable = False
+        self.envelope_cache.put(key, envelope)
+        return envelope
+
     def get_AM_envelope(self, delta_t, sample_rate=1):
         """
         Render the envelope for the given waveshape (in init).
@@ -43,10 +162,8 @@ class envelope_generator():
 
         if self.AM_envelope_function is None:
             envelope = 1.0  #assume constant envelope
-        elif isinstance(self.AM_envelope_function, tuple) or isinstance(self.AM_envelope_function, str):
-            envelope = signal.get_window(self.AM_envelope_function, int(n_points*10))[::10][:int(n_points)] #ugly fix
         else:
-            envelope = self.AM_envelope_function(delta_t, sample_rate) # user reponsible to do good subsampling him/herself.
+            envelope = self._get_envelope(self.AM_envelope_function, delta_t, sample_rate)
 
         return envelope
 
@@ -68,10 +185,8 @@ class envelope_generator():
 
         if self.PM_envelope_function is None:
             envelope = 0
-        elif isinstance(self.PM_envelope_function, tuple) or isinstance(self.PM_envelope_function, str):
-            envelope = signal.get_window(self.PM_envelope_function, int(n_points*10))[::10]
         else:
-            envelope = self.PM_envelope_function(delta_t, sample_rate) # user reponsible to do good subsampling him/herself.
+            envelope = self._get_envelope(self.PM_envelope_function, delta_t, sample_rate)
 
         return envelope
 
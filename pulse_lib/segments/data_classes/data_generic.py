@@ -3,9 +3,10 @@ Generic data class where all others should be derived from.
 """
 import uuid
 import logging
+import warnings
 from abc import ABC, abstractmethod
 import numpy as np
-from pulse_lib.segments.data_classes.lru_cache import LruCache
+from pulse_lib.segments.data_classes.waveform_cache import WaveformCache
 
 import copy
 
@@ -17,27 +18,78 @@ class parent_data(ABC):
     start_time = 0
     software_marker_data = dict()
 
-    waveform_cache = LruCache(100)
+    waveform_cache = WaveformCache(1_000_000_000)
+
+    _id = None
 
     def __init__(self):
-        self.id = uuid.uuid4()
+        self._id = None
+
+    @property
+    def id(self):
+        '''
+        Unique id of the data object. It is used as key in the waveform cache.
+        The id is created on first use, because uuid4() is relatively expensive
+        and most copies of the data are never rendered.
+        '''
+        if self._id is None:
+            self._id = uuid.uuid4()
+        return self._id
+
+    @classmethod
+    def set_waveform_cache_bytes(cls, max_bytes, policy=None):
+        '''
+        Set the new maximum size of the waveform cache in bytes.
+        The cache is cleared when its size or policy changes.
+
+        Args:
+            max_bytes (int): maximum size of the cached waveforms in bytes.
+            policy (str or policy object): eviction policy: 'lru' or 'gdsf'.
+                If None the current policy is kept.
+        '''
+        cls._set_waveform_cache(max_bytes, policy, cls.waveform_cache.max_entries)
 
     @classmethod
     def set_waveform_cache_size(cls, size):
         '''
-        Set the new (maximum) size of the waveform cache.
+        Set the maximum number of waveforms in the cache.
         The cache is cleared when its size changes.
+
+        Deprecated: the cache is limited in bytes. Use set_waveform_cache_bytes.
         '''
-        if size != cls.waveform_cache.max_size:
-            cls.waveform_cache = LruCache(size)
+        warnings.warn('set_waveform_cache_size(size) is deprecated. '
+                      'Use set_waveform_cache_bytes(max_bytes).',
+                      DeprecationWarning, stacklevel=2)
+        cls._set_waveform_cache(cls.waveform_cache.max_bytes, None, size)
+
+    @classmethod
+    def _set_waveform_cache(cls, max_bytes, policy, max_entries):
+        cache = cls.waveform_cache
+        if policy is None:
+            policy_name = cache.policy
+        else:
+            policy_name = policy if isinstance(policy, str) else policy.name
+        if (max_bytes != cache.max_bytes
+            or max_entries != cache.max_entries
+            or policy_name != cache.policy):
+            if policy is None:
+                # new instance of the current policy
+                policy = type(cache._policy)()
+            cls.waveform_cache = WaveformCache(max_bytes, policy, max_entries)
 
     @classmethod
     def clear_waveform_cache(cls):
         '''
         Clears the waveform cache (freeing memory).
         '''
-        # clear the cache by initializing a new one of the same size
-        cls.waveform_cache = LruCache(cls.waveform_cache.max_size)
+        cls.waveform_cache.clear()
+
+    @classmethod
+    def cache_stats(cls):
+        '''
+        Returns the statistics of the waveform cache.
+        '''
+        return cls.waveform_cache.stats()
 
     @abstractmethod
     def append():
@@ -122,30 +174,201 @@ class parent_data(ABC):
             pulse (np.ndarray) : numpy array of the pulse
         '''
         # Render only when there is no matching cached waveform
-        cache_entry = self._get_cached_data_entry()
+        cache_key, cache_tag = self._get_cache_key(sample_rate, ref_channel_states)
+        cache_entry = self.waveform_cache.lookup(cache_key, cache_tag)
 
-        if (cache_entry.data is None
-            or cache_entry.data['sample_rate'] != sample_rate
-            or cache_entry.data['ref_states'] != ref_channel_states):
+        if cache_entry is None or cache_entry.value is None:
             waveform = self._render(sample_rate, ref_channel_states)
-            cache_entry.data = {
-                'sample_rate' : sample_rate,
-                'waveform' : waveform,
-                'ref_states' : ref_channel_states
-            }
+            self.waveform_cache.put(cache_key, waveform, cache_tag)
         else:
-            waveform = cache_entry.data['waveform']
+            waveform = cache_entry.value
 
         return waveform
 
-    def _get_cached_data_entry(self):
-        return self.waveform_cache[self.id]
+    def render_into(self, out, offset, sample_rate=1e9, ref_channel_states=None):
+        '''
+        renders pulse in out[offset:offset+n_samples].
+        Samples that fall outside out are discarded.
+
+        The waveform is rendered directly in out the first time it is requested.
+        It is only stored in the waveform cache when it is requested again.
+
+        Args:
+            out (np.ndarray): buffer to write the samples into.
+            offset (int): sample index in out for the first sample. Can be negative.
+            sample_rate (double) : rate at which the AWG will be run
+            ref_channel_states (RefChannels): start time and phases of the reference channels.
+        Returns:
+            n_samples (int): number of samples of the pulse.
+        '''
+        cache_key, cache_tag = self._get_cache_key(sample_rate, ref_channel_states)
+        cache_entry = self.waveform_cache.lookup(cache_key, cache_tag)
+
+        if cache_entry is not None:
+            waveform = cache_entry.value
+            if waveform is None:
+                # waveform is reused: keep it in cache
+                waveform = self._render(sample_rate, ref_channel_states)
+                self.waveform_cache.put(cache_key, waveform, cache_tag)
+        else:
+            n_samples = self._get_n_samples(sample_rate)
+            if n_samples is not None and offset >= 0 and offset + n_samples <= len(out):
+                wvf = out[offset:offset+n_samples]
+                wvf[:] = 0.0
+                self._render_into(wvf, sample_rate, ref_channel_states)
+                # register rendering without storing the waveform.
+                self.waveform_cache.put(cache_key, None, cache_tag)
+                return n_samples
+
+            waveform = self._render(sample_rate, ref_channel_states)
+            self.waveform_cache.put(cache_key, waveform, cache_tag)
+
+        copy_into(out, offset, waveform)
+        return len(waveform)
+
+    def get_fingerprint(self, sample_rate, ref_channel_states):
+        '''
+        Returns a fingerprint of the rendered waveform, or None if the data class does not
+        support fingerprints. Data objects with equal fingerprint render equal waveforms.
+
+        Args:
+            sample_rate (double) : rate at which the AWG will be run
+            ref_channel_states (RefChannels): start time and phases of the reference channels.
+        '''
+        return None
+
+    def _get_cache_key(self, sample_rate, ref_channel_states):
+        '''
+        Returns the key and tag for the waveform cache.
+        Waveforms are cached on fingerprint when available. Otherwise they are cached
+        on the id of the object, with sample rate and reference channel states as tag.
+        '''
+        fingerprint = self.get_fingerprint(sample_rate, ref_channel_states)
+        if fingerprint is not None:
+            return fingerprint, None
+        return self.id, (sample_rate, ref_channel_states)
+
+    def _get_n_samples(self, sample_rate):
+        '''
+        Returns the number of samples of the rendered waveform, or None if the
+        data class cannot render directly into a buffer.
+        '''
+        return None
+
+    def _render_into(self, wvf, sample_rate, ref_channel_states):
+        '''
+        Renders the waveform in wvf. Must be implemented when _get_n_samples is implemented.
+        '''
+        raise NotImplementedError()
+
+    @classmethod
+    def _render_batch(cls, out, items, sample_rate):
+        '''
+        Renders a batch of data objects of this class in the rows of out.
+        Data classes can override this method to share work between the data objects.
+
+        Args:
+            out (np.ndarray): 2D array with waveform per row. The samples must be 0.
+            items (list): tuples (row, offset, data, ref_channel_states).
+            sample_rate (double) : rate at which the AWG will be run
+        '''
+        for row, offset, data, ref_channel_states in items:
+            data.render_into(out[row], offset, sample_rate, ref_channel_states)
+
+    @classmethod
+    def _render_affine_into(cls, out, rows, offsets, elements, sample_rate):
+        '''
+        Renders data objects that are affine in a loop parameter in the rows of out.
+        Data classes can override this method to render only the components.
+
+        Args:
+            out (np.ndarray): 2D array with waveform per row. The samples must be 0.
+            rows (list[int]): row in out per element.
+            offsets (list[int]): sample index in the row for the first sample of the element.
+            elements (list[parent_data]): data objects of this class.
+            sample_rate (double) : rate at which the AWG will be run
+
+        Returns:
+            bool: False if the elements are not rendered.
+        '''
+        return False
 
     def get_metadata(self, name):
         logging.warning(f'metadata not implemented for {name}')
         return {}
 
 
+class IndexedWaveform:
+    '''
+    Waveform of a channel in a segment for a single index of the sequence.
+    It contains only the data of the index and can be pickled to render it in another process.
+
+    Args:
+        data (parent_data): data of the index.
+        ref_channel_states: states of the reference channels, or None.
+    '''
+    def __init__(self, data, ref_channel_states=None):
+        self.data = data
+        self.ref_channel_states = ref_channel_states
+
+    def render(self, sample_rate):
+        return self.data.render(sample_rate, self.ref_channel_states)
+
+    def render_into(self, out, offset, sample_rate):
+        return self.data.render_into(out, offset, sample_rate, self.ref_channel_states)
+
+
+def render_batch_into(out, offsets, elements, sample_rate=1e9, ref_channel_states=None, rows=None):
+    '''
+    Renders elements[i] in out[rows[i], offsets[i]:]. Samples that fall outside out are discarded.
+    An element that occurs multiple times with equal offset and reference channel states
+    is rendered once and copied. Indices on broadcast axes map to the same element.
+
+    Args:
+        out (np.ndarray): 2D array with waveform per row. The samples must be 0.
+        offsets (list[int]): sample index in the row for the first sample of the element.
+        elements (list[parent_data]): data object per row.
+        sample_rate (double) : rate at which the AWG will be run
+        ref_channel_states (list[RefChannels]): states of the reference channels per element, or None.
+        rows (list[int]): row in out per element. Default: row i for element i.
+    '''
+    if rows is None:
+        rows = range(len(elements))
+    batches = {}
+    rendered = {}
+    copies = []
+    for i, (row, offset, data) in enumerate(zip(rows, offsets, elements)):
+        states = ref_channel_states[i] if ref_channel_states is not None else None
+        n_samples = data._get_n_samples(sample_rate)
+        if n_samples is not None:
+            key = (id(data), offset)
+            source = rendered.get(key)
+            if source is not None and source[1] == states:
+                copies.append((row, source[0], offset, n_samples))
+                continue
+            rendered[key] = (row, states)
+        batches.setdefault(type(data), []).append((row, offset, data, states))
+
+    for data_class, items in batches.items():
+        data_class._render_batch(out, items, sample_rate)
+
+    for row, source_row, offset, n_samples in copies:
+        start = max(0, offset)
+        stop = min(out.shape[1], offset + n_samples)
+        out[row, start:stop] = out[source_row, start:stop]
+
+
+def copy_into(out, offset, wvf):
+    '''
+    Copies wvf to out[offset:offset+len(wvf)].
+    Samples that fall outside out are discarded.
+    '''
+    start = max(0, -offset)
+    stop = min(len(wvf), len(out) - offset)
+    if stop > start:
+        out[offset+start:offset+stop] = wvf[start:stop]
+
+
 def map_index(index, shape):
     '''
     Maps an index on a potentially smaller shape.
@@ -211,7 +434,14 @@ class data_container(np.ndarray):
     def __copy__(self):
         cpy = data_container(shape = self.shape)
 
+        # elements that are referenced on multiple indices are copied once.
+        copies = {}
         for i in range(self.size):
-            cpy.flat[i] = copy.copy(self.flat[i])
+            element = self.flat[i]
+            element_copy = copies.get(id(element))
+            if element_copy is None:
+                element_copy = copy.copy(element)
+                copies[id(element)] = element_copy
+            cpy.flat[i] = element_copy
 
         return cpy
@@ -2,6 +2,7 @@
 data class to make pulses.
 """
 import logging
+import threading
 import numpy as np
 import copy
 from dataclasses import dataclass
@@ -9,68 +10,209 @@ from numbers import Number
 from typing import Any, Dict, Callable, List
 
 from pulse_lib.segments.utility.rounding import iround
+from pulse_lib.segments.utility.fingerprint import Fingerprint, NotFingerprintable
 from pulse_lib.segments.data_classes.data_generic import parent_data
 from pulse_lib.segments.data_classes.data_IQ import envelope_generator
 
+# envelope used for MW pulses without envelope. Stateless; shared by all pulses.
+_default_envelope = envelope_generator()
+
 total_pulse_deltas = 0
 
 def get_total_deltas():
     return total_pulse_deltas
 
+def is_near_zero(step, ramp):
+    '''
+    Returns True if a delta with this step and ramp has no effect on the waveform.
+    Works on scalars and numpy arrays.
+    '''
+    # near zero if |step| < 1 uV and |ramp| < 1e-9 mV/ns (= 1 mV/s)
+    # note: max ramp: 2V/ns = 2000 mV/ns, min ramp: 1 mV/s = 1e-9 mV/ns. ~ 12 orders of magnitude.
+    # Regular floats have 16 digits precision.
+    return (np.abs(step) < 1e-3) & (np.abs(ramp) < 1e-9)
+
+
 @dataclass
 class pulse_delta:
+    '''
+    Delta in the waveform. pulse_data stores the deltas in a PulseDeltaStore.
+    This class is kept for code that adds or inspects single deltas.
+    '''
     time: float
     step: float = 0.0
     ramp: float = 0.0
 
-    def __post_init__(self):
-        global total_pulse_deltas
-        total_pulse_deltas += 1
+    @property
+    def is_near_zero(self):
+        return bool(is_near_zero(self.step, self.ramp))
 
-    def __add__(self, other):
-        if isinstance(other, Number):
-            return pulse_delta(self.time,
-                               self.step + other,
-                               self.ramp)
-        elif isinstance(other, pulse_delta):
-            return pulse_delta(self.time,
-                               self.step + other.step,
-                               self.ramp + other.ramp)
-        else:
-            raise Exception(f'Cannot add pulse_data to {type(other)}')
 
-    def __iadd__(self, other):
-        if isinstance(other, Number):
-           self.step += other
-        elif isinstance(other, pulse_delta):
-           self.step += other.step
-           self.ramp += other.ramp
-        else:
-            raise Exception(f'Cannot add pulse_data to {type(other)}')
-        return self
+class PulseDeltaStore:
+    '''
+    Growable storage of pulse deltas with columns time, step and ramp.
+    The columns are stored as rows of a single numpy array of which the capacity
+    is doubled when it is full.
+    '''
+    # serializes consolidation of stores shared between pulse_data rendered in different threads.
+    _consolidate_lock = threading.Lock()
 
-    def __mul__(self, other):
-        if isinstance(other, Number):
-            return pulse_delta(self.time,
-                               self.step * other,
-                               self.ramp * other)
-        else:
-            raise Exception(f'Cannot multiply pulse_data with {type(other)}')
+    def __init__(self, capacity=16):
+        self._data = np.empty((3, capacity))
+        self._n = 0
+        self._consolidated = False
 
-    def __imul__(self, other):
-        if isinstance(other, Number):
-           self.step *= other
-           self.ramp *= other
-        else:
-            raise Exception(f'Cannot multiply pulse_data with {type(other)}')
-        return self
+    @classmethod
+    def from_arrays(cls, time, step, ramp):
+        store = cls.__new__(cls)
+        store._data = np.array([time, step, ramp], dtype=float).reshape(3, -1)
+        store._n = store._data.shape[1]
+        store._consolidated = False
+        return store
+
+    def __len__(self):
+        return self._n
+
+    def __repr__(self):
+        return f'PulseDeltaStore(time={self.time}, step={self.step}, ramp={self.ramp})'
+
+    def __getitem__(self, i):
+        '''
+        Returns a copy of delta i as pulse_delta.
+        '''
+        if not -self._n <= i < self._n:
+            raise IndexError(f'delta index {i} out of range')
+        time, step, ramp = self._data[:, i % self._n]
+        return pulse_delta(float(time), float(step), float(ramp))
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield self[i]
 
     @property
-    def is_near_zero(self):
-        # near zero if |step| < 1 uV and |ramp| < 1e-9 mV/ns (= 1 mV/s)
-        # note: max ramp: 2V/ns = 2000 mV/ns, min ramp: 1 mV/s = 1e-9 mV/ns. ~ 12 orders of magnitude.
-        # Regular floats have 16 digits precision.
-        return -1e-3 < self.step < 1e-3 and -1e-9 < self.ramp < 1e-9
+    def time(self):
+        return self._data[0, :self._n]
+
+    @property
+    def step(self):
+        return self._data[1, :self._n]
+
+    @property
+    def ramp(self):
+        return self._data[2, :self._n]
+
+    def _reserve(self, n):
+        capacity = self._data.shape[1]
+        if n > capacity:
+            data = np.empty((3, max(n, 2*capacity)))
+            data[:, :self._n] = self._data[:, :self._n]
+            self._data = data
+
+    def append(self, time, step, ramp):
+        n = self._n
+        if n == self._data.shape[1]:
+            self._reserve(n+1)
+        data = self._data
+        data[0, n] = time
+        data[1, n] = step
+        data[2, n] = ramp
+        self._n = n+1
+        self._consolidated = False
+
+    def extend(self, other, time_shift=0.0):
+        '''
+        Appends the deltas of other, shifted in time by time_shift.
+        '''
+        n = self._n
+        m = other._n
+        self._reserve(n+m)
+        self._data[:, n:n+m] = other._data[:, :m]
+        if time_shift != 0:
+            self._data[0, n:n+m] += time_shift
+        self._n = n+m
+        self._consolidated = False
+
+    def copy(self):
+        return PulseDeltaStore.from_arrays(*self._data[:, :self._n])
+
+    def __getstate__(self):
+        # pickle only the used part of the storage
+        return {'_data': self._data[:, :self._n].copy(), '_n': self._n, '_consolidated': self._consolidated}
+
+    def __add__(self, other):
+        result = PulseDeltaStore(self._n + other._n)
+        result.extend(self)
+        result.extend(other)
+        return result
+
+    def shift_time(self, delta):
+        self._data[0, :self._n] += delta
+
+    def scale(self, factor):
+        self._data[1:, :self._n] *= factor
+        self._consolidated = False
+
+    def repeat(self, n, period):
+        '''
+        Returns a store with the deltas repeated n times with the given period.
+        '''
+        m = self._n
+        data = np.empty((3, n, m))
+        data[:] = self._data[:, None, :m]
+        data[0] += (np.arange(n) * period)[:, None]
+        return PulseDeltaStore.from_arrays(*data.reshape(3, n*m))
+
+    def consolidate(self):
+        '''
+        Sorts the deltas on time, merges deltas with equal time and removes deltas with no effect.
+        '''
+        if self._consolidated:
+            return
+        with PulseDeltaStore._consolidate_lock:
+            if self._consolidated or self._n == 0:
+                self._consolidated = True
+                return
+            order = np.argsort(self.time, kind='stable')
+            time, step, ramp = self._data[:, :self._n][:, order]
+            if self._n > 1:
+                first = np.flatnonzero(np.concatenate(([True], time[1:] != time[:-1])))
+                if len(first) < self._n:
+                    time = time[first]
+                    step = np.add.reduceat(step, first)
+                    ramp = np.add.reduceat(ramp, first)
+            keep = ~is_near_zero(step, ramp)
+            self._data = np.array([time[keep], step[keep], ramp[keep]])
+            self._n = self._data.shape[1]
+            self._consolidated = True
+
+    def slice(self, start, end):
+        '''
+        Slices the deltas between start and end and shifts them to start at 0.
+        Deltas before start are merged in a delta at start, and deltas after end in a delta at end.
+        Deltas at infinity are kept at infinity.
+        '''
+        time, step, ramp = self._data[:, :self._n]
+        before = time <= start
+        inside = (time > start) & (time < end)
+        at_inf = time == np.inf
+        after = ~(before | inside | at_inf)
+
+        start_step = np.sum(step[before] + (start - time[before]) * ramp[before])
+        start_ramp = np.sum(ramp[before])
+
+        store = PulseDeltaStore(np.count_nonzero(inside) + 3)
+        if not is_near_zero(start_step, start_ramp):
+            store.append(start, start_step, start_ramp)
+        m = np.count_nonzero(inside)
+        store._data[:, store._n:store._n+m] = self._data[:, :self._n][:, inside]
+        store._n += m
+        for mask, t in [(after, end), (at_inf, np.inf)]:
+            end_step = np.sum(step[mask])
+            end_ramp = np.sum(ramp[mask])
+            if not is_near_zero(end_step, end_ramp):
+                store.append(t, end_step, end_ramp)
+        store.shift_time(-start)
+        return store
 
 @dataclass
 class custom_pulse_element:
@@ -98,6 +240,9 @@ def get_max_time(data:List[Any]) -> float:
         stop = max(stop, element.stop)
     return stop
 
+def copy_elements(data:List[Any]) -> List[Any]:
+    return [copy.copy(element) for element in data]
+
 def shift_time(data:List[Any], delta) -> None:
     for element in data:
         element.time += delta
@@ -120,31 +265,127 @@ class PhaseShift:
 class pulse_data(parent_data):
     """
     class defining base (utility) operations for baseband and microwave pulses.
+
+    Copies share the pulse deltas and the lists with MW pulses, custom pulses and
+    phase shifts (copy-on-write). The storage is cloned on the first mutation.
+    Elements in the lists are never modified in place, but replaced by modified copies.
+
+    A repeated waveform is stored as unit cell with a repeat count and period.
+    It is rendered once and tiled. Access to the storage via the public attributes
+    expands the repetition to explicit elements.
     """
     def __init__(self):
         super().__init__()
 #        self.baseband_pulse_data = pulse_data_single_sequence()
-        self.pulse_deltas = list()
-        self.MW_pulse_data = list()
-        self.custom_pulse_data = list()
-        self.phase_shifts = list()
+        self._pulse_deltas = PulseDeltaStore()
+        self._MW_pulse_data = list()
+        self._custom_pulse_data = list()
+        self._phase_shifts = list()
+        # (n, period) if the storage contains a unit cell that is repeated n times.
+        self._repeat = None
 
         self.start_time = 0
         self._end_time = 0
         self.global_phase = 0
         self._consolidated = False
         self._preprocessed = False
+        # storage is shared with a copy
+        self._shared = False
+        # content fingerprint. None: not calculated, False: not available.
+        self._fingerprint = None
+
+    @property
+    def pulse_deltas(self):
+        if self._repeat is not None:
+            self._expand()
+        return self._pulse_deltas
+
+    @pulse_deltas.setter
+    def pulse_deltas(self, value):
+        if not isinstance(value, PulseDeltaStore):
+            # list of pulse_delta
+            value = PulseDeltaStore.from_arrays([delta.time for delta in value],
+                                                [delta.step for delta in value],
+                                                [delta.ramp for delta in value])
+        self._pulse_deltas = value
+
+    @property
+    def MW_pulse_data(self):
+        if self._repeat is not None:
+            self._expand()
+        return self._MW_pulse_data
+
+    @MW_pulse_data.setter
+    def MW_pulse_data(self, value):
+        self._MW_pulse_data = value
+
+    @property
+    def custom_pulse_data(self):
+        if self._repeat is not None:
+            self._expand()
+        return self._custom_pulse_data
+
+    @custom_pulse_data.setter
+    def custom_pulse_data(self, value):
+        self._custom_pulse_data = value
+
+    @property
+    def phase_shifts(self):
+        if self._repeat is not None:
+            self._expand()
+        return self._phase_shifts
+
+    @phase_shifts.setter
+    def phase_shifts(self, value):
+        self._phase_shifts = value
+
+    def _unshare(self):
+        '''
+        Clones the storage if it is shared with a copy.
+        Must be called before the storage is modified in place.
+        '''
+        self._fingerprint = None
+        if self._repeat is not None:
+            # expansion creates new storage
+            self._expand()
+        elif self._shared:
+            self._pulse_deltas = self._pulse_deltas.copy()
+            self._MW_pulse_data = copy.copy(self._MW_pulse_data)
+            self._custom_pulse_data = copy.copy(self._custom_pulse_data)
+            self._phase_shifts = copy.copy(self._phase_shifts)
+            self._shared = False
+
+    def _is_empty(self):
+        return (len(self._pulse_deltas) == 0
+                and len(self._MW_pulse_data) == 0
+                and len(self._custom_pulse_data) == 0
+                and len(self._phase_shifts) == 0)
+
+    def add_delta(self, time, step=0.0, ramp=0.0):
+        '''
+        Adds a delta in the waveform.
 
-    def add_delta(self, delta):
-        if not delta.is_near_zero:
-            self.pulse_deltas.append(delta)
+        Args:
+            time (float or pulse_delta): time of the delta. np.inf for a delta at the end of the segment.
+                A pulse_delta with time, step and ramp is accepted as well.
+            step (float): step in amplitude [mV].
+            ramp (float): change of slope [mV/ns].
+        '''
+        if isinstance(time, pulse_delta):
+            time, step, ramp = time.time, time.step, time.ramp
+        global total_pulse_deltas
+        total_pulse_deltas += 1
+        if not (-1e-3 < step < 1e-3 and -1e-9 < ramp < 1e-9):
+            self._unshare()
+            self.pulse_deltas.append(time, step, ramp)
             self._consolidated = False
         # always update end time
-        self._update_end_time(delta.time)
+        self._update_end_time(time)
 
     def _update_end_time(self, t):
         if t != np.inf and t > self._end_time:
             self._end_time = t
+            self._fingerprint = None
 
     def add_MW_data(self, MW_data_object):
         """
@@ -153,14 +394,17 @@ class pulse_data(parent_data):
         Args:
             MW_data_object (IQ_data_single) : description MW pulse (see pulse_lib.segments.data_classes.data_IQ)
         """
+        self._unshare()
         self.MW_pulse_data.append(MW_data_object)
         self._update_end_time(MW_data_object.stop)
 
     def add_custom_pulse_data(self, custom_pulse:custom_pulse_element):
+        self._unshare()
         self.custom_pulse_data.append(custom_pulse)
         self._update_end_time(custom_pulse.stop)
 
     def add_phase_shift(self, phase_shift:PhaseShift):
+        self._unshare()
         self.phase_shifts.append(phase_shift)
         self._update_end_time(phase_shift.time)
 
@@ -197,6 +441,7 @@ class pulse_data(parent_data):
             time (double) : time in ns to wait
         """
         self._end_time += time
+        self._fingerprint = None
 
     def append(self, other, time = None):
         '''
@@ -212,17 +457,16 @@ class pulse_data(parent_data):
         else:
             self.slice_time(0, time)
 
-        other_MW_pulse_data = copy.deepcopy(other.MW_pulse_data)
+        other_MW_pulse_data = copy_elements(other.MW_pulse_data)
         shift_start_stop(other_MW_pulse_data, time)
-        other_custom_pulse_data = copy.deepcopy(other.custom_pulse_data)
+        other_custom_pulse_data = copy_elements(other.custom_pulse_data)
         shift_start_stop(other_custom_pulse_data, time)
 
-        other_phase_shifts = copy.deepcopy(other.phase_shifts)
+        other_phase_shifts = copy_elements(other.phase_shifts)
         shift_time(other_phase_shifts, time)
-        other_pulse_deltas = copy.deepcopy(other.pulse_deltas)
-        shift_time(other_pulse_deltas, time)
 
-        self.pulse_deltas += other_pulse_deltas
+        self._unshare()
+        self.pulse_deltas.extend(other.pulse_deltas, time)
         self.MW_pulse_data += other_MW_pulse_data
         self.custom_pulse_data += other_custom_pulse_data
         self.phase_shifts += other_phase_shifts
@@ -237,37 +481,87 @@ class pulse_data(parent_data):
             n (int) : number of times to repeat
         """
         time = self.total_time
+        if self._repeat is not None:
+            n_cell, period = self._repeat
+            if n_cell * period != time:
+                self._expand()
+
+        if self._repeat is not None:
+            self._repeat = (n_cell * (n+1), period)
+        elif not self._is_empty():
+            self._consolidate()
+            self._repeat = (n+1, time)
+            self._preprocessed = False
 
-        new_pulse_deltas = copy.copy(self.pulse_deltas)
-        new_MW_pulse_data =  copy.copy(self.MW_pulse_data)
-        new_custom_pulse_data =  copy.copy(self.custom_pulse_data)
-        new_phase_shifts =  copy.copy(self.phase_shifts)
+        self._end_time = (n+1) * time
+        self._fingerprint = None
 
-        for i in range(n):
-            shifted_pulse_deltas = copy.deepcopy(self.pulse_deltas)
-            shift_time(shifted_pulse_deltas, (i+1)*time)
-            new_pulse_deltas += shifted_pulse_deltas
+    def _expand(self):
+        '''
+        Replaces the repeated unit cell by explicit elements.
+        '''
+        n, period = self._repeat
+        self._repeat = None
 
-            shifted_MW_pulse_data = copy.deepcopy(self.MW_pulse_data)
-            shift_start_stop(shifted_MW_pulse_data, (i+1)*time)
-            new_MW_pulse_data +=  shifted_MW_pulse_data
+        new_MW_pulse_data = []
+        new_custom_pulse_data = []
+        new_phase_shifts = []
 
-            shifted_custom_pulse_data = copy.deepcopy(self.custom_pulse_data)
-            shift_start_stop(shifted_custom_pulse_data, (i+1)*time)
-            new_custom_pulse_data +=  shifted_custom_pulse_data
+        for i in range(n):
+            shifted_MW_pulse_data = copy_elements(self._MW_pulse_data)
+            shift_start_stop(shifted_MW_pulse_data, i*period)
+            new_MW_pulse_data += shifted_MW_pulse_data
 
-            shifted_phase_shifts = copy.deepcopy(self.phase_shifts)
-            shift_time(shifted_phase_shifts, (i+1)*time)
-            new_phase_shifts += shifted_phase_shifts
+            shifted_custom_pulse_data = copy_elements(self._custom_pulse_data)
+            shift_start_stop(shifted_custom_pulse_data, i*period)
+            new_custom_pulse_data += shifted_custom_pulse_data
 
-        self.pulse_deltas = new_pulse_deltas
-        self.MW_pulse_data = new_MW_pulse_data
-        self.custom_pulse_data = new_custom_pulse_data
-        self.phase_shifts = new_phase_shifts
+            shifted_phase_shifts = copy_elements(self._phase_shifts)
+            shift_time(shifted_phase_shifts, i*period)
+            new_phase_shifts += shifted_phase_shifts
 
+        self._pulse_deltas = self._pulse_deltas.repeat(n, period)
+        self._MW_pulse_data = new_MW_pulse_data
+        self._custom_pulse_data = new_custom_pulse_data
+        self._phase_shifts = new_phase_shifts
+        # new storage is not shared
+        self._shared = False
         self._consolidated = False
-        self._end_time = (n+1) * time
 
+    def _get_repeat_offsets(self):
+        '''
+        Returns the time offsets of the repetitions of the unit cell.
+        '''
+        if self._repeat is None:
+            return [0]
+        n, period = self._repeat
+        return [i*period for i in range(n)]
+
+    def _is_periodic(self):
+        '''
+        Returns True if the baseband waveform of the unit cell starts and ends at 0.
+        Only then the rendered cell can be tiled. Deltas at the end of the segment (np.inf)
+        are not repeated.
+        '''
+        self._pre_process()
+        if len(self._times) == 0:
+            return True
+        return (not self._has_inf_delta
+                and abs(self._amplitudes[-1]) < 1e-6
+                and abs(self._ramps[-1]) < 1e-12)
+
+    def _get_repeat_period_pt(self, sample_rate):
+        '''
+        Returns the number of samples of the repeated unit cell, or None if the
+        unit cell cannot be rendered once and tiled.
+
+        Args:
+            sample_rate (float): sample rate in GSa/s.
+        '''
+        period_pt = self._repeat[1] * sample_rate
+        if abs(period_pt - iround(period_pt)) > 1e-6 or not self._is_periodic():
+            return None
+        return iround(period_pt)
 
     def slice_time(self, start, end):
         '''
@@ -276,13 +570,14 @@ class pulse_data(parent_data):
             Start (double) : enforced minimal starting time
             End (double) : enforced max time
         '''
-        self.__slice_pulse_delta_data(start, end)
+        self.pulse_deltas = self.pulse_deltas.slice(start, end)
         self.__slice_MW_data(start, end)
         self.__slice_custom_pulse_data(start, end)
         self.__slice_phase_shift_data(start, end)
 
         self._consolidated = False
         self._end_time = end - start
+        self._fingerprint = None
 
 
     '''
@@ -298,7 +593,7 @@ class pulse_data(parent_data):
         '''
         new_MW_data = []
 
-        for i in self.MW_pulse_data:
+        for i in copy_elements(self.MW_pulse_data):
             if i.start < start:
                 i.start = start
             if i.stop > end:
@@ -321,7 +616,7 @@ class pulse_data(parent_data):
         '''
         new_custom_data = []
 
-        for i in self.custom_pulse_data:
+        for i in copy_elements(self.custom_pulse_data):
             if i.start < start:
                 i.start = start
             if i.stop > end:
@@ -350,40 +645,6 @@ class pulse_data(parent_data):
 
         self.phase_shifts = new_phase_shifts
 
-    def __slice_pulse_delta_data(self, start, end):
-        '''
-        slice pulse delta data
-
-        Args:
-            start (double) : enforced minimal starting time
-            end (double) : enforced max time
-        '''
-        new_pulse_deltas = []
-
-        start_delta = pulse_delta(start, 0.0, 0.0)
-        end_delta = pulse_delta(end, 0.0, 0.0)
-        inf_delta = pulse_delta(np.inf, 0.0, 0.0)
-
-        for entry in self.new_pulse_deltas:
-            if entry.time <= start:
-                start_delta.step += entry.step + (start-entry.time) * entry.ramp
-                start_delta.ramp += entry.ramp
-            elif entry.time < end:
-                new_pulse_deltas.append(entry)
-            elif entry.time != np.inf:
-                end_delta += entry
-            else:
-                inf_delta += entry
-
-        if not start_delta.is_near_zero:
-            new_pulse_deltas.insert(0,start_delta)
-        if not end_delta.is_near_zero:
-            new_pulse_deltas.append(end_delta)
-        if not inf_delta.is_near_zero:
-            new_pulse_deltas.append(inf_delta)
-
-        self.pulse_deltas = new_pulse_deltas
-
     def shift_MW_frequency(self, frequency):
         '''
         shift the frequency of a MW signal that is defined. This is needed for dealing with the upconverion of a IQ signal.
@@ -391,7 +652,9 @@ class pulse_data(parent_data):
         Args:
             frequency (float) : frequency you want to shift
         '''
-        for IQ_data_single_object in self.MW_pulse_data:
+        self._fingerprint = None
+        self._MW_pulse_data = copy_elements(self._MW_pulse_data)
+        for IQ_data_single_object in self._MW_pulse_data:
             IQ_data_single_object.frequency -= frequency
 
     def shift_MW_phases(self, phase_shift):
@@ -404,7 +667,9 @@ class pulse_data(parent_data):
         if phase_shift == 0:
             return
 
-        for IQ_data_single_object in self.MW_pulse_data:
+        self._fingerprint = None
+        self._MW_pulse_data = copy_elements(self._MW_pulse_data)
+        for IQ_data_single_object in self._MW_pulse_data:
             IQ_data_single_object.start_phase += phase_shift
 
 
@@ -415,18 +680,36 @@ class pulse_data(parent_data):
         # NOTE: copy is called in pulse_data_all, before adding virtual channels.
         self._consolidate()
         my_copy = pulse_data()
-        my_copy.pulse_deltas = copy.deepcopy(self.pulse_deltas)
-        my_copy.MW_pulse_data = copy.deepcopy(self.MW_pulse_data)
-        my_copy.phase_shifts = copy.copy(self.phase_shifts)
-        my_copy.custom_pulse_data = copy.deepcopy(self.custom_pulse_data)
+        # share storage. It will be cloned on first mutation.
+        self._shared = True
+        my_copy._shared = True
+        my_copy._pulse_deltas = self._pulse_deltas
+        my_copy._MW_pulse_data = self._MW_pulse_data
+        my_copy._phase_shifts = self._phase_shifts
+        my_copy._custom_pulse_data = self._custom_pulse_data
+        my_copy._repeat = self._repeat
         my_copy.start_time = copy.copy(self.start_time)
         my_copy.software_marker_data = copy.copy(self.software_marker_data)
         my_copy.global_phase = copy.copy(self.global_phase)
         my_copy._end_time = self._end_time
         my_copy._consolidated = self._consolidated
+        my_copy._fingerprint = self._fingerprint
 
         return my_copy
 
+    def __getstate__(self):
+        '''
+        Returns the state for pickling without the data derived during rendering.
+        '''
+        self._consolidate()
+        state = self.__dict__.copy()
+        for name in ['_times', '_intervals', '_amplitudes', '_amplitudes_end', '_ramps']:
+            state.pop(name, None)
+        state['_preprocessed'] = False
+        # unpickled object owns its storage
+        state['_shared'] = False
+        return state
+
     def __add__(self, other):
         '''
         define addition operator for pulse_data object
@@ -435,7 +718,18 @@ class pulse_data(parent_data):
         new_data.start_time = copy.copy(self.start_time)
         new_data.global_phase = copy.copy(self.global_phase)
 
-        if isinstance(other, pulse_data):
+        if isinstance(other, pulse_data) and self._can_add_repeated(other):
+            # result is repeated
+            self._consolidate()
+            other._consolidate()
+            new_data._repeat = self._repeat or other._repeat
+            new_data._pulse_deltas = self._pulse_deltas + other._pulse_deltas
+            new_data._MW_pulse_data = self._MW_pulse_data + other._MW_pulse_data
+            new_data._phase_shifts = self._phase_shifts + other._phase_shifts
+            new_data._custom_pulse_data = self._custom_pulse_data + other._custom_pulse_data
+            new_data._end_time = max(self._end_time, other._end_time)
+
+        elif isinstance(other, pulse_data):
             new_data.pulse_deltas = self.pulse_deltas + other.pulse_deltas
             new_data.MW_pulse_data = self.MW_pulse_data + other.MW_pulse_data
             new_data.phase_shifts = self.phase_shifts + other.phase_shifts
@@ -443,11 +737,10 @@ class pulse_data(parent_data):
             new_data._end_time = max(self._end_time, other._end_time)
 
         elif isinstance(other, Number):
-            # copy, because only new elements added to list
-            new_pulse = copy.copy(self.pulse_deltas)
-            new_pulse.insert(0, pulse_delta(0, other, 0))
-            new_pulse.append(pulse_delta(np.inf, -other, 0))
-            new_data.pulse_deltas = new_pulse
+            # copy, because only new elements added to store
+            new_data.pulse_deltas = self.pulse_deltas.copy()
+            new_data.pulse_deltas.append(0, other, 0)
+            new_data.pulse_deltas.append(np.inf, -other, 0)
 
             new_data.MW_pulse_data = copy.copy(self.MW_pulse_data)
             new_data.phase_shifts = copy.copy(self.phase_shifts)
@@ -463,16 +756,30 @@ class pulse_data(parent_data):
         '''
         define addition operator for pulse_data object
         '''
-        if isinstance(other, pulse_data):
-            self.pulse_deltas += other.pulse_deltas
+        if isinstance(other, pulse_data) and self._can_add_repeated(other):
+            # result is repeated. Add the unit cells.
+            repeat = self._repeat or other._repeat
+            self._repeat = None
+            self._unshare()
+            self._repeat = repeat
+            self._pulse_deltas.extend(other._pulse_deltas)
+            self._MW_pulse_data += other._MW_pulse_data
+            self._phase_shifts += other._phase_shifts
+            self._custom_pulse_data += other._custom_pulse_data
+            self._end_time = max(self._end_time, other._end_time)
+
+        elif isinstance(other, pulse_data):
+            self._unshare()
+            self.pulse_deltas.extend(other.pulse_deltas)
             self.MW_pulse_data += other.MW_pulse_data
             self.phase_shifts += other.phase_shifts
             self.custom_pulse_data += other.custom_pulse_data
             self._end_time = max(self._end_time, other._end_time)
 
         elif isinstance(other, Number):
-            self.pulse_deltas.insert(0, pulse_delta(0, other, 0))
-            self.pulse_deltas.append(pulse_delta(np.inf, -other, 0))
+            self._unshare()
+            self.pulse_deltas.append(0, other, 0)
+            self.pulse_deltas.append(np.inf, -other, 0)
 
         else:
             raise TypeError(f'Cannot add pulse_data to {type(other)}')
@@ -480,6 +787,17 @@ class pulse_data(parent_data):
         self._consolidated = False
         return self
 
+    def _can_add_repeated(self, other):
+        '''
+        Returns True if the sum of self and other can be stored as repeated unit cell.
+        '''
+        if self._repeat is None and other._repeat is None:
+            return False
+        if self._repeat == other._repeat:
+            return True
+        # one of both is repeated, the other must be empty.
+        return self._is_empty() or other._is_empty()
+
     def __mul__(self, other):
         '''
         multiplication operator for segment_single
@@ -488,20 +806,19 @@ class pulse_data(parent_data):
         new_data = pulse_data()
 
         if isinstance(other, Number):
-            # deepcopy, because elements are modified
-            new_data.pulse_deltas = copy.deepcopy(self.pulse_deltas)
-            for delta in new_data.pulse_deltas:
-                delta *= other
+            new_data._repeat = self._repeat
+            new_data._pulse_deltas = self._pulse_deltas.copy()
+            new_data._pulse_deltas.scale(other)
 
-            new_data.MW_pulse_data = copy.deepcopy(self.MW_pulse_data)
-            for IQ_data_single_object in new_data.MW_pulse_data:
+            new_data._MW_pulse_data = copy_elements(self._MW_pulse_data)
+            for IQ_data_single_object in new_data._MW_pulse_data:
                 IQ_data_single_object.amplitude *=other
 
-            new_data.custom_pulse_data = copy.deepcopy(self.custom_pulse_data)
-            for custom_pulse in new_data.custom_pulse_data:
+            new_data._custom_pulse_data = copy_elements(self._custom_pulse_data)
+            for custom_pulse in new_data._custom_pulse_data:
                 custom_pulse.amplitude *= other
 
-            new_data.phase_shifts = copy.copy(self.phase_shifts)
+            new_data._phase_shifts = copy.copy(self._phase_shifts)
             new_data._end_time = self._end_time
         else:
             raise TypeError(f'Cannot multiply pulse_data with {type(other)}')
@@ -512,33 +829,25 @@ class pulse_data(parent_data):
         # merge deltas with same time.
         if self._consolidated:
             return
-        if len(self.pulse_deltas) == 1:
-            logging.error(f'Asjemenou {self.pulse_deltas}')
-            raise Exception(f'Error in pulse data: {self.pulse_deltas}')
-
-        if len(self.pulse_deltas) > 1:
-            self.pulse_deltas.sort(key=lambda p:p.time)
-            new_deltas = []
-            last = self.pulse_deltas[0]
-            for delta in self.pulse_deltas[1:]:
-                if delta.time == last.time:
-                    last = last + delta
-                else:
-                    if not last.is_near_zero:
-                        new_deltas.append(last)
-                    last = delta
-            if not last.is_near_zero:
-                new_deltas.append(last)
+        if len(self._pulse_deltas) == 1:
+            logging.error(f'Asjemenou {self._pulse_deltas}')
+            raise Exception(f'Error in pulse data: {self._pulse_deltas}')
 
-            self.pulse_deltas = new_deltas
+        if len(self._pulse_deltas) > 1:
+            self._pulse_deltas.consolidate()
 
         self._consolidated = True
         self._preprocessed = False
 
     def _pre_process(self):
+        '''
+        Calculates the amplitudes and ramps between the deltas.
+        For a repeated waveform it is calculated for the unit cell.
+        '''
         self._consolidate()
         if not self._preprocessed:
-            n = len(self.pulse_deltas)
+            n = len(self._pulse_deltas)
+            self._has_inf_delta = False
             if n == 0:
                 times = np.zeros(0)
                 intervals = np.zeros(0)
@@ -546,17 +855,14 @@ class pulse_data(parent_data):
                 amplitudes_end = np.zeros(0)
                 ramps = np.zeros(0)
             else:
-                times = np.zeros(n)
+                times = self._pulse_deltas.time.copy()
                 intervals = np.zeros(n)
-                steps = np.zeros(n)
-                ramps = np.zeros(n)
+                steps = self._pulse_deltas.step
+                ramps = self._pulse_deltas.ramp
                 amplitudes = np.zeros(n)
-                for i,delta in enumerate(self.pulse_deltas):
-                    times[i] = delta.time
-                    steps[i] = delta.step
-                    ramps[i] = delta.ramp
                 if times[-1] == np.inf:
-                    times[-1] = self._end_time
+                    self._has_inf_delta = True
+                    times[-1] = self._end_time if self._repeat is None else self._repeat[1]
                 intervals[:-1] = times[1:] - times[:-1]
                 ramps = np.cumsum(ramps)
                 amplitudes[1:] = ramps[:-1] * intervals[:-1]
@@ -570,6 +876,52 @@ class pulse_data(parent_data):
             self._ramps = ramps
         self._preprocessed = True
 
+    @property
+    def fingerprint(self):
+        '''
+        Content fingerprint of the pulse data: deltas, MW pulses, custom pulses and phase shifts.
+        Equal pulse data has an equal fingerprint.
+        None if the data contains elements without canonical representation,
+        e.g. a custom pulse with a callable object.
+        '''
+        if self._fingerprint is None:
+            self._consolidate()
+            try:
+                fp = Fingerprint()
+                fp.add(self._end_time)
+                fp.add(self._repeat)
+                fp.add(self._pulse_deltas.time)
+                fp.add(self._pulse_deltas.step)
+                fp.add(self._pulse_deltas.ramp)
+                for mw in self._MW_pulse_data:
+                    envelope = mw.envelope
+                    if envelope is not None:
+                        envelope = (envelope.AM_envelope_function, envelope.PM_envelope_function)
+                    fp.add((mw.start, mw.stop, mw.amplitude, mw.frequency, mw.start_phase,
+                            envelope, mw.ref_channel))
+                for custom_pulse in self._custom_pulse_data:
+                    fp.add((custom_pulse.start, custom_pulse.stop, custom_pulse.amplitude,
+                            custom_pulse.func, custom_pulse.kwargs))
+                for ps in self._phase_shifts:
+                    fp.add((ps.time, ps.phase_shift, ps.channel_name))
+                self._fingerprint = fp.digest()
+            except NotFingerprintable:
+                self._fingerprint = False
+        return self._fingerprint or None
+
+    def get_fingerprint(self, sample_rate, ref_channel_states):
+        fingerprint = self.fingerprint
+        if fingerprint is None:
+            return None
+        fp = Fingerprint()
+        fp.add(fingerprint)
+        fp.add(sample_rate)
+        if len(self._MW_pulse_data) > 0 and ref_channel_states:
+            # MW phase depends on start time and phase of reference channels
+            fp.add(ref_channel_states.start_time)
+            fp.add(ref_channel_states.start_phase)
+        return fp.digest()
+
     def integrate_waveform(self, sample_rate):
         '''
         takes a full integral of the currently scheduled waveform.
@@ -578,45 +930,114 @@ class pulse_data(parent_data):
         Returns:
             integrate (double) : the integrated value of the waveform (unit is mV/sec).
         '''
+        if self._repeat is not None and not self._is_periodic():
+            self._expand()
+
         self._pre_process()
 
         integrated_value = 0
 
-        if len(self.pulse_deltas) > 0:
+        if len(self._pulse_deltas) > 0:
             integrated_value = 0.5*np.dot((self._amplitudes[:-1] + self._amplitudes_end[1:]),
                                           self._intervals[:-1])
 
-        for custom_pulse in self.custom_pulse_data:
+        for custom_pulse in self._custom_pulse_data:
             integrated_value += np.sum(self._render_custom_pulse(custom_pulse, sample_rate))
 
+        if self._repeat is not None:
+            # integral of unit cell times number of repetitions
+            integrated_value *= self._repeat[0]
+
         integrated_value *= 1e-9
 
         return integrated_value
 
+    def get_baseband_intervals(self, sample_rate=1e9):
+        '''
+        Returns the linear intervals of the baseband waveform. Sample k of an interval
+        has the value `amplitude + k*step`, like the rendered waveform.
+        MW pulses and custom pulses are not included.
+
+        Args:
+            sample_rate (float): sample rate in Sa/s.
+        Returns:
+            start_pt, n_pt (np.ndarray[int]): first sample and number of samples of the intervals.
+            amplitudes, steps (np.ndarray[float]): value of first sample and increment per sample.
+        '''
+        if self._repeat is not None:
+            self._expand()
+
+        self._pre_process()
+
+        t_pt = iround(self._times * sample_rate * 1e-9)
+        if len(t_pt) < 2:
+            empty = np.zeros(0)
+            return empty.astype(int), empty.astype(int), empty, empty
+
+        n_pt = t_pt[1:] - t_pt[:-1]
+        amplitudes = self._amplitudes[:-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            steps = (self._amplitudes_end[1:] - amplitudes) / np.maximum(n_pt, 1)
+        steps[self._ramps[:-1] == 0] = 0.0
+        keep = n_pt > 0
+        return t_pt[:-1][keep], n_pt[keep], amplitudes[keep], steps[keep]
+
 
     def _render_custom_pulse(self, custom_pulse, sample_rate):
         duration = custom_pulse.stop - custom_pulse.start
         data = custom_pulse.func(duration, sample_rate, custom_pulse.amplitude, **custom_pulse.kwargs)
         return data
 
-    def _render(self, sample_rate, ref_channel_states):
-        '''
-        make a full rendering of the waveform at a predetermined sample rate.
+    def _render_baseband(self, wvf, t_pt):
         '''
-        self._pre_process()
-
-        # express in Gs/s
-        sample_rate = sample_rate*1e-9
+        Renders the piecewise linear baseband waveform in wvf using vectorized operations.
+        The result is identical to `_render_baseband_loop`: every sample is computed
+        as `start + k*step` like np.linspace does.
 
-        t_tot = self.total_time
-
-        # get number of points that need to be rendered
-        t_tot_pt = iround(t_tot * sample_rate) + 1
-
-        wvf = np.zeros([int(t_tot_pt)])
+        Args:
+            wvf (np.ndarray): waveform to write the samples into.
+            t_pt (np.ndarray[int]): sample index of every delta. Must be non-decreasing and within wvf.
+        '''
+        pt_start = t_pt[0]
+        pt_stop = t_pt[-1]
+        if pt_start == pt_stop:
+            return
+        n_pt = t_pt[1:] - t_pt[:-1]
+        amplitudes = self._amplitudes[:-1]
+        ramps = self._ramps[:-1]
+        # linspace step per interval. Intervals without samples get a dummy divisor.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            steps = (self._amplitudes_end[1:] - amplitudes) / np.maximum(n_pt, 1)
+        steps[ramps == 0] = 0.0
+
+        # sample index relative to the start of its interval
+        k = np.arange(pt_stop - pt_start, dtype=float)
+        k -= np.repeat((t_pt[:-1] - pt_start).astype(float), n_pt)
+        k *= np.repeat(steps, n_pt)
+        k += np.repeat(amplitudes, n_pt)
+        wvf[pt_start:pt_stop] = k
+
+    def _render_baseband_cell(self, wvf, sample_rate):
+        '''
+        Renders the baseband waveform of the deltas in the storage in wvf.
 
+        Args:
+            wvf (np.ndarray): waveform to write the samples into.
+            sample_rate (float): sample rate in GSa/s.
+        '''
         t_pt = iround(self._times * sample_rate)
 
+        if len(t_pt) > 1:
+            if t_pt[0] >= 0 and t_pt[-1] <= len(wvf) and np.all(t_pt[1:] >= t_pt[:-1]):
+                self._render_baseband(wvf, t_pt)
+            else:
+                self._render_baseband_loop(wvf, t_pt)
+
+    def _render_baseband_loop(self, wvf, t_pt):
+        '''
+        Renders the piecewise linear baseband waveform in wvf interval by interval.
+        Used when the sample indices cannot be bucketed, e.g. when they fall outside wvf.
+        '''
         for i in range(len(t_pt)-1):
             pt0 = t_pt[i]
             pt1 = t_pt[i+1]
@@ -626,70 +1047,465 @@ class pulse_data(parent_data):
                 else:
                     wvf[pt0:pt1] = self._amplitudes[i]
 
-        # render MW pulses.
-        # create list with phase shifts per ref_channel
+    def _get_phase_shift_lookup(self):
+        '''
+        Returns per reference channel the phase shifts sorted on time and
+        the cumulative phase shift. The cumulative phase has an extra leading 0.0,
+        such that the phase shift at time t is `cumulative[np.searchsorted(times, t, side='right')]`.
+        '''
         phase_shifts_channels = {}
-        for ps in self.phase_shifts:
+        for ps in self._phase_shifts:
             ps_ch = phase_shifts_channels.setdefault(ps.channel_name, [])
             ps_ch.append(ps)
 
-        for IQ_data_single_object in self.MW_pulse_data:
-            # start stop time of MW pulse
+        lookup = {}
+        for channel_name, phase_shifts in phase_shifts_channels.items():
+            times = np.array([ps.time for ps in phase_shifts], dtype=float)
+            phases = np.array([ps.phase_shift for ps in phase_shifts], dtype=float)
+            order = np.argsort(times, kind='stable')
+            lookup[channel_name] = (times[order], np.concatenate(([0.0], np.cumsum(phases[order]))))
+        return lookup
 
+    @staticmethod
+    def _get_sample_indices(start_pts, n_pts):
+        '''
+        Returns the concatenated sample indices start_pt + arange(n_pt) of all pulses.
+        '''
+        offsets = np.cumsum(n_pts) - n_pts
+        return np.arange(np.sum(n_pts)) + np.repeat(start_pts - offsets, n_pts)
+
+    @staticmethod
+    def _expand_envelopes(scalars, arrays, offsets, n_pts):
+        '''
+        Returns the concatenated envelopes of all pulses.
+        Envelopes in arrays (dict: pulse index -> np.ndarray) replace the scalar value of the pulse.
+        '''
+        result = np.repeat(scalars, n_pts)
+        for i, envelope in arrays.items():
+            result[offsets[i]:offsets[i]+n_pts[i]] = envelope
+        return result
+
+    def _render_MW_pulses(self, sample_rate, ref_channel_states):
+        '''
+        Renders all MW pulses in a single buffer with one evaluation of np.sin.
+        The pulses of a repeated unit cell are evaluated once and tiled. The phase
+        is calculated for every repetition.
+
+        Args:
+            sample_rate (float): sample rate in GSa/s.
+            ref_channel_states (RefChannels): start time and phases of the reference channels.
+        Returns:
+            start_pts (np.ndarray[int]): start sample of every pulse.
+            n_pts (np.ndarray[int]): number of samples of every pulse.
+            wvf (np.ndarray): concatenated samples of all pulses.
+        '''
+        MW_pulse_data = self._MW_pulse_data
+        n_pulses = len(MW_pulse_data)
+        phase_shift = np.zeros(n_pulses)
+        # phase shift per repetition of the unit cell
+        phase_shift_period = np.zeros(n_pulses)
+        ref_start_time = np.zeros(n_pulses)
+        ref_start_phase = np.zeros(n_pulses)
+
+        if ref_channel_states:
+            pulses_channels = {}
+            for i, IQ_data_single_object in enumerate(MW_pulse_data):
+                ref_channel = IQ_data_single_object.ref_channel
+                if ref_channel in ref_channel_states.start_phase:
+                    ref_start_time[i] = ref_channel_states.start_time
+                    ref_start_phase[i] = ref_channel_states.start_phase[ref_channel]
+                    pulses_channels.setdefault(ref_channel, []).append(i)
+
+            phase_shift_lookup = self._get_phase_shift_lookup()
+            for ref_channel, indices in pulses_channels.items():
+                if ref_channel in phase_shift_lookup:
+                    times, cumulative_phase = phase_shift_lookup[ref_channel]
+                    start_pulses = [MW_pulse_data[i].start for i in indices]
+                    phase_shift[indices] = cumulative_phase[np.searchsorted(times, start_pulses, side='right')]
+                    phase_shift_period[indices] = cumulative_phase[-1]
+
+        start_pts = np.zeros(n_pulses, dtype=int)
+        n_pts = np.zeros(n_pulses, dtype=int)
+        amplitudes = np.zeros(n_pulses)
+        frequencies = np.zeros(n_pulses)
+        phases = np.zeros(n_pulses)
+        # envelopes are stored as scalar per pulse, or array per pulse in dict.
+        amp_envelopes = np.zeros(n_pulses)
+        phase_envelopes = np.zeros(n_pulses)
+        amp_envelope_arrays = {}
+        phase_envelope_arrays = {}
+
+        for i, IQ_data_single_object in enumerate(MW_pulse_data):
+            # start stop time of MW pulse
             start_pulse = IQ_data_single_object.start
             stop_pulse = IQ_data_single_object.stop
 
-            # max amp, freq and phase.
-            amp  =  IQ_data_single_object.amplitude
-            freq =  IQ_data_single_object.frequency
-            phase = IQ_data_single_object.start_phase
-            if ref_channel_states and IQ_data_single_object.ref_channel in ref_channel_states.start_phase:
-                ref_start_time = ref_channel_states.start_time
-                ref_start_phase = ref_channel_states.start_phase[IQ_data_single_object.ref_channel]
-                if IQ_data_single_object.ref_channel in phase_shifts_channels:
-                    phase_shifts = [
-                            ps.phase_shift
-                            for ps in phase_shifts_channels[IQ_data_single_object.ref_channel]
-                            if ps.time <= start_pulse
-                            ]
-                    phase_shift = sum(phase_shifts)
-                else:
-                    phase_shift = 0
-            else:
-                ref_start_time = 0
-                ref_start_phase = 0
-                phase_shift = 0
-
-            # envelope data of the pulse
-            if IQ_data_single_object.envelope is None:
-                IQ_data_single_object.envelope = envelope_generator()
+            # envelope data of the pulse. The pulse is not modified; it can be shared by copies.
+            envelope = IQ_data_single_object.envelope
+            if envelope is None:
+                envelope = _default_envelope
 
-            amp_envelope = IQ_data_single_object.envelope.get_AM_envelope((stop_pulse - start_pulse), sample_rate)
-            phase_envelope = np.asarray(IQ_data_single_object.envelope.get_PM_envelope((stop_pulse - start_pulse), sample_rate))
+            amp_envelope = envelope.get_AM_envelope((stop_pulse - start_pulse), sample_rate)
+            phase_envelope = envelope.get_PM_envelope((stop_pulse - start_pulse), sample_rate)
 
             #self.baseband_pulse_data[-1,0] convert to point numbers
             n_pt = int((stop_pulse - start_pulse) * sample_rate) if isinstance(amp_envelope, float) else len(amp_envelope)
-            start_pt = iround(start_pulse * sample_rate)
-            stop_pt = start_pt + n_pt
+            start_pts[i] = iround(start_pulse * sample_rate)
+            n_pts[i] = n_pt
+            amplitudes[i] = IQ_data_single_object.amplitude
+            frequencies[i] = IQ_data_single_object.frequency
+            phases[i] = IQ_data_single_object.start_phase
+            if isinstance(amp_envelope, np.ndarray):
+                amp_envelope_arrays[i] = amp_envelope
+            else:
+                amp_envelopes[i] = amp_envelope
+            if isinstance(phase_envelope, np.ndarray):
+                phase_envelope_arrays[i] = phase_envelope
+            else:
+                phase_envelopes[i] = phase_envelope
+
+        # expand the per pulse values to all samples of the pulse
+        offsets = np.cumsum(n_pts) - n_pts
+        amp_envelope = self._expand_envelopes(amp_envelopes, amp_envelope_arrays, offsets, n_pts)
+        phase_envelope = self._expand_envelopes(phase_envelopes, phase_envelope_arrays, offsets, n_pts)
+
+        if self._repeat is not None:
+            n_rep = self._repeat[0]
+            period_pt = iround(self._repeat[1] * sample_rate)
+            i_rep = np.repeat(np.arange(n_rep), n_pulses)
+            start_pts = np.tile(start_pts, n_rep) + i_rep * period_pt
+            phase_shift = np.tile(phase_shift, n_rep) + i_rep * np.tile(phase_shift_period, n_rep)
+            n_pts = np.tile(n_pts, n_rep)
+            amplitudes = np.tile(amplitudes, n_rep)
+            frequencies = np.tile(frequencies, n_rep)
+            phases = np.tile(phases, n_rep)
+            ref_start_time = np.tile(ref_start_time, n_rep)
+            ref_start_phase = np.tile(ref_start_phase, n_rep)
+            amp_envelope = np.tile(amp_envelope, n_rep)
+            phase_envelope = np.tile(phase_envelope, n_rep)
+            offsets = np.cumsum(n_pts) - n_pts
+
+        t = np.arange(np.sum(n_pts), dtype=float)
+        t -= np.repeat(offsets, n_pts)
+        t += np.repeat(start_pts + ref_start_time/sample_rate, n_pts)
+        total_phase = np.repeat(phase_shift + phases, n_pts)
+        total_phase += phase_envelope
+        total_phase += np.repeat(ref_start_phase, n_pts)
+
+        t *= np.repeat(2*np.pi*frequencies/sample_rate*1e-9, n_pts)
+        t += total_phase
+        wvf = np.repeat(amplitudes, n_pts)
+        wvf *= amp_envelope
+        wvf *= np.sin(t)
+
+        return start_pts, n_pts, wvf
+
+    def _get_n_samples(self, sample_rate):
+        return iround(self.total_time * sample_rate * 1e-9)
 
-            # add the sin pulse
-            total_phase = phase_shift + phase + phase_envelope + ref_start_phase
-            t = start_pt+ref_start_time/sample_rate + np.arange(n_pt)
-            wvf[start_pt:stop_pt] += amp*amp_envelope*np.sin(2*np.pi*freq/sample_rate*1e-9*t + total_phase)
+    def _render(self, sample_rate, ref_channel_states):
+        '''
+        make a full rendering of the waveform at a predetermined sample rate.
+        '''
+        wvf = np.zeros(self._get_n_samples(sample_rate))
+        self._render_into(wvf, sample_rate, ref_channel_states)
+        return wvf
 
-        for custom_pulse in self.custom_pulse_data:
-            data = self._render_custom_pulse(custom_pulse, sample_rate*1e9)
-            start_pt = iround(custom_pulse.start * sample_rate)
-            stop_pt = start_pt + len(data)
-            wvf[start_pt:stop_pt] += data
+    def _render_into(self, wvf, sample_rate, ref_channel_states):
+        '''
+        Renders the waveform in wvf. The samples of wvf must be 0.
+        A repeated waveform is rendered once and tiled.
+        Samples of pulses that extend beyond the end of wvf are discarded.
+        '''
+        # express in Gs/s
+        sample_rate = sample_rate*1e-9
+
+        period_pt = None
+        if self._repeat is not None:
+            period_pt = self._get_repeat_period_pt(sample_rate)
+            if period_pt is None:
+                self._expand()
+
+        self._pre_process()
+
+        n_samples = len(wvf)
+
+        if self._repeat is not None:
+            n_rep = self._repeat[0]
+            cell = np.zeros(period_pt+1)
+            self._render_baseband_cell(cell, sample_rate)
+            custom_pulses = []
+            for custom_pulse in self._custom_pulse_data:
+                data = self._render_custom_pulse(custom_pulse, sample_rate*1e9)
+                start_pt = iround(custom_pulse.start * sample_rate)
+                if start_pt + len(data) <= period_pt:
+                    cell[start_pt:start_pt+len(data)] += data
+                else:
+                    custom_pulses.append((start_pt, data))
+            wvf[:n_rep*period_pt] = np.tile(cell[:period_pt], n_rep)
+            for start_pt, data in custom_pulses:
+                for offset in range(0, n_rep*period_pt, period_pt):
+                    wvf_slice = wvf[offset+start_pt:offset+start_pt+len(data)]
+                    wvf_slice += data[:len(wvf_slice)]
+        else:
+            self._render_baseband_cell(wvf, sample_rate)
+
+        self._render_pulses_into(wvf, sample_rate, ref_channel_states)
 
-        # remove last value. t_tot_pt = t_tot + 1. Last value is always 0. It is only needed in the loop on the pulses.
-        return wvf[:-1]
+    def _render_pulses_into(self, wvf, sample_rate, ref_channel_states):
+        '''
+        Adds the MW pulses and, for a waveform without repeat, the custom pulses to wvf.
+
+        Args:
+            wvf (np.ndarray): waveform with the rendered baseband.
+            sample_rate (float): sample rate in GSa/s.
+            ref_channel_states (RefChannels): start time and phases of the reference channels.
+        '''
+        n_samples = len(wvf)
+
+        # render MW pulses.
+        if len(self._MW_pulse_data) > 0:
+            start_pts, n_pts, mw_wvf = self._render_MW_pulses(sample_rate, ref_channel_states)
+            stop_pts = start_pts + n_pts
+            if np.all(start_pts[1:] >= stop_pts[:-1]):
+                for start_pt, stop_pt, data in zip(start_pts, stop_pts, np.split(mw_wvf, np.cumsum(n_pts)[:-1])):
+                    wvf[start_pt:stop_pt] += data[:n_samples-start_pt]
+            else:
+                # overlapping pulses: add sample by sample in order of the pulses.
+                indices = self._get_sample_indices(start_pts, n_pts)
+                if stop_pts.max() > n_samples:
+                    in_range = indices < n_samples
+                    indices = indices[in_range]
+                    mw_wvf = mw_wvf[in_range]
+                np.add.at(wvf, indices, mw_wvf)
+
+        if self._repeat is None:
+            for custom_pulse in self._custom_pulse_data:
+                data = self._render_custom_pulse(custom_pulse, sample_rate*1e9)
+                start_pt = iround(custom_pulse.start * sample_rate)
+                stop_pt = start_pt + len(data)
+                wvf[start_pt:stop_pt] += data[:n_samples-start_pt]
+
+    @staticmethod
+    def _render_baseband_rows(out, rows, offset, t_pt, elements):
+        '''
+        Renders the baseband of pulse data with equal sample positions of the deltas
+        in the rows of out. The result is identical to `_render_baseband` per element.
+        '''
+        if rows[-1] - rows[0] == len(rows) - 1:
+            # consecutive rows: write in a view of out
+            rows = slice(rows[0], rows[-1] + 1)
+        n_pt = t_pt[1:] - t_pt[:-1]
+        amplitudes = np.array([data._amplitudes[:-1] for data in elements])
+        amplitudes_end = np.array([data._amplitudes_end[1:] for data in elements])
+        ramps = np.array([data._ramps[:-1] for data in elements])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            steps = (amplitudes_end - amplitudes) / np.maximum(n_pt, 1)
+        steps[ramps == 0] = 0.0
+        # same computation as _render_baseband, but interval by interval for all rows at once.
+        for i in np.nonzero(n_pt)[0]:
+            pt0 = offset + t_pt[i]
+            pt1 = offset + t_pt[i+1]
+            if np.all(steps[:, i] == 0):
+                out[rows, pt0:pt1] = amplitudes[:, i:i+1]
+            elif isinstance(rows, slice):
+                wvf = out[rows, pt0:pt1]
+                np.multiply(np.arange(n_pt[i], dtype=float), steps[:, i:i+1], out=wvf)
+                wvf += amplitudes[:, i:i+1]
+            else:
+                out[rows, pt0:pt1] = np.arange(n_pt[i], dtype=float) * steps[:, i:i+1] + amplitudes[:, i:i+1]
+
+    def _get_shift_key(self, t_pt):
+        '''
+        Returns a key for the baseband waveform relative to its first delta, or None.
+        Pulse data with equal key renders to the same samples shifted in time.
+        A constant level till the end of the segment is excluded from the key.
+
+        Returns:
+            (key, n_intervals): key and number of intervals that are equal.
+        '''
+        n_intervals = len(t_pt) - 1
+        if n_intervals < 1 or t_pt[0] == t_pt[-1]:
+            return None
+        if self._has_inf_delta and n_intervals > 1 and self._ramps[-2] == 0:
+            n_intervals -= 1
+        key = ((t_pt[:n_intervals+1] - t_pt[0]).tobytes(),
+               self._amplitudes[:n_intervals].tobytes(),
+               self._amplitudes_end[1:n_intervals+1].tobytes(),
+               self._ramps[:n_intervals].tobytes())
+        return key, n_intervals
+
+    @staticmethod
+    def _render_shifted_rows(out, groups, sample_rate_GHz, n_intervals):
+        '''
+        Renders the baseband of pulse data that is shifted in time in the rows of out.
+        The baseband is rendered once and copied to the rows. A constant level till the
+        end of the segment is filled per group.
+        '''
+        data = groups[0][0][2]
+        t_pt = iround(data._times * sample_rate_GHz)
+        t_rel = t_pt - t_pt[0]
+        wvf = np.zeros(t_rel[-1])
+        data._render_baseband(wvf, t_rel)
+        wvf = wvf[:t_rel[n_intervals]]
+        for group in groups:
+            _, offset, data, _ = group[0]
+            t_pt = iround(data._times * sample_rate_GHz)
+            rows = [item[0] for item in group]
+            if rows[-1] - rows[0] == len(rows) - 1:
+                rows = slice(rows[0], rows[-1] + 1)
+            start = offset + t_pt[0]
+            out[rows, start:start+len(wvf)] = wvf
+            if n_intervals < len(t_pt) - 1:
+                out[rows, offset+t_pt[n_intervals]:offset+t_pt[-1]] = data._amplitudes[n_intervals]
+
+    @classmethod
+    def _render_batch(cls, out, items, sample_rate):
+        '''
+        Renders a batch of pulse data in the rows of out.
+        The baseband of pulse data with the same sample positions of the deltas is
+        rendered in one vectorized operation. Only the amplitudes differ per row.
+        The baseband of pulse data that is only shifted in time, e.g. in a sweep of
+        the start of a pulse, is rendered once and copied to the rows.
+        MW pulses are rendered per row, because their phase depends on the start time.
+        '''
+        sample_rate_GHz = sample_rate*1e-9
+        groups = {}
+        for item in items:
+            row, offset, data, ref_channel_states = item
+            if data._repeat is not None:
+                data.render_into(out[row], offset, sample_rate, ref_channel_states)
+                continue
+            data._pre_process()
+            n_samples = data._get_n_samples(sample_rate)
+            t_pt = iround(data._times * sample_rate_GHz)
+            if (offset < 0 or offset + n_samples > out.shape[1]
+                or (len(t_pt) > 1 and (t_pt[0] < 0 or t_pt[-1] > n_samples or np.any(t_pt[1:] < t_pt[:-1])))):
+                data.render_into(out[row], offset, sample_rate, ref_channel_states)
+                continue
+            groups.setdefault((t_pt.tobytes(), offset, n_samples), []).append(item)
+
+        shifted = {}
+        for group in groups.values():
+            data = group[0][2]
+            shift_key = data._get_shift_key(iround(data._times * sample_rate_GHz))
+            # no key: no baseband samples to render
+            if shift_key is not None:
+                shifted.setdefault(shift_key, []).append(group)
+
+        for (_, n_intervals), shift_groups in shifted.items():
+            if len(shift_groups) > 1:
+                cls._render_shifted_rows(out, shift_groups, sample_rate_GHz, n_intervals)
+                continue
+            group = shift_groups[0]
+            _, offset, data, _ = group[0]
+            n_samples = data._get_n_samples(sample_rate)
+            t_pt = iround(data._times * sample_rate_GHz)
+            # render in blocks of ~8 MB to keep the data in the CPU cache
+            n_rows = max(1, 1048576 // n_samples)
+            for start in range(0, len(group), n_rows):
+                block = group[start:start+n_rows]
+                cls._render_baseband_rows(out, [item[0] for item in block], offset, t_pt,
+                                          [item[2] for item in block])
+
+        for group in groups.values():
+            for row, offset, data, ref_channel_states in group:
+                n_samples = data._get_n_samples(sample_rate)
+                data._render_pulses_into(out[row, offset:offset+n_samples], sample_rate_GHz, ref_channel_states)
+
+    @staticmethod
+    def get_affine_components(elements):
+        '''
+        Decomposes pulse data that only differs in the amplitudes of the deltas as
+        elements[i] = elements[0] + coeffs[i]*delta.
+        This is the case for sweeps of the amplitude of blocks and ramps.
+
+        Returns:
+            (delta, coeffs): pulse_data with the difference and coefficient per element,
+                or None if the elements are not affine or contain MW pulses, custom pulses
+                or repetitions.
+        '''
+        first = elements[0]
+        for data in elements:
+            if (not isinstance(data, pulse_data)
+                or data._repeat is not None
+                or len(data._MW_pulse_data) > 0
+                or len(data._custom_pulse_data) > 0
+                or data._end_time != first._end_time):
+                return None
+            data._consolidate()
+
+        # align the deltas on the union of the delta times. Zero steps are not stored.
+        times = np.unique(np.concatenate([data._pulse_deltas.time for data in elements]))
+        steps = np.zeros((len(elements), len(times)))
+        ramps = np.zeros((len(elements), len(times)))
+        for i, data in enumerate(elements):
+            pos = np.searchsorted(times, data._pulse_deltas.time)
+            steps[i, pos] = data._pulse_deltas.step
+            ramps[i, pos] = data._pulse_deltas.ramp
+
+        # compare steps and ramps on the same scale: the change in amplitude over the waveform.
+        duration = max(1.0, first._end_time)
+        values = np.concatenate([steps, ramps*duration], axis=1)
+        diff = values - values[0]
+        ref = np.argmax(np.abs(diff).max(axis=1))
+        norm = np.dot(diff[ref], diff[ref])
+        coeffs = diff @ diff[ref] / norm if norm > 0 else np.zeros(len(elements))
+        tolerance = 1e-9 * max(1.0, np.abs(values).max())
+        if np.abs(diff - np.outer(coeffs, diff[ref])).max() > tolerance:
+            return None
+
+        delta = pulse_data()
+        delta._pulse_deltas = PulseDeltaStore.from_arrays(times, steps[ref]-steps[0], ramps[ref]-ramps[0])
+        delta._end_time = first._end_time
+        # times are unique and sorted. Zero deltas do not affect the waveform.
+        delta._consolidated = True
+        return delta, coeffs
+
+    @classmethod
+    def _render_affine_into(cls, out, rows, offsets, elements, sample_rate):
+        '''
+        Renders pulse data that only differs in the amplitudes of the deltas.
+        Only the first element and the difference are rendered. The rows are
+        computed as base + coeff*delta.
+        '''
+        n_samples = elements[0]._get_n_samples(sample_rate)
+        if any(offset < 0 or offset + n_samples > out.shape[1] for offset in offsets):
+            return False
+        components = cls.get_affine_components(elements)
+        if components is None:
+            return False
+        delta, coeffs = components
+        base_wvf = elements[0].render(sample_rate)
+        delta_wvf = delta._render(sample_rate, None)
+        # samples where the elements differ
+        nonzero = np.flatnonzero(delta_wvf)
+        delta_start, delta_stop = (nonzero[0], nonzero[-1]+1) if len(nonzero) else (0, 0)
+        delta_wvf = delta_wvf[delta_start:delta_stop]
+
+        groups = {}
+        for row, offset, coeff in zip(rows, offsets, coeffs):
+            groups.setdefault(offset, []).append((row, coeff))
+        # process in blocks of ~8 MB to keep the data in the CPU cache
+        n_rows = max(1, 1048576 // max(1, n_samples))
+        for offset, group in groups.items():
+            for start in range(0, len(group), n_rows):
+                block_rows = [row for row, _ in group[start:start+n_rows]]
+                block_coeffs = np.array([coeff for _, coeff in group[start:start+n_rows]])
+                if block_rows[-1] - block_rows[0] == len(block_rows) - 1:
+                    # consecutive rows: write in a view of out
+                    block_rows = slice(block_rows[0], block_rows[-1] + 1)
+                out[block_rows, offset:offset+n_samples] = base_wvf
+                if len(delta_wvf) > 0:
+                    out[block_rows, offset+delta_start:offset+delta_stop] += block_coeffs[:, None] * delta_wvf
+        return True
 
     def get_accumulated_phase(self):
         phase = 0
-        for shift in self.phase_shifts:
+        for shift in self._phase_shifts:
             phase += shift.phase_shift
+        if self._repeat is not None:
+            phase *= self._repeat[0]
         # print(f'accumulated {phase} ({len(self.phase_shifts)})')
         return phase
 
@@ -717,70 +1533,35 @@ class pulse_data(parent_data):
         '''
         elements = []
 
-        self._pre_process()
-
         # express in Gs/s
         sample_rate = sample_rate*1e-9
 
-        # render MW pulses.
-        # create list with phase shifts per ref_channel
-        phase_shifts_channels = {}
-        for ps in self.phase_shifts:
-            ps_ch = phase_shifts_channels.setdefault(ps.channel_name, [])
-            ps_ch.append(ps)
-
-        for IQ_data_single_object in self.MW_pulse_data:
-            # start stop time of MW pulse
+        if self._repeat is not None and self._get_repeat_period_pt(sample_rate) is None:
+            self._expand()
 
-            start_pulse = IQ_data_single_object.start
-            stop_pulse = IQ_data_single_object.stop
-
-            # max amp, freq and phase.
-            amp  =  IQ_data_single_object.amplitude
-            freq =  IQ_data_single_object.frequency
-            phase = IQ_data_single_object.start_phase
-            if ref_channel_states and IQ_data_single_object.ref_channel in ref_channel_states.start_phase:
-                ref_start_time = ref_channel_states.start_time
-                ref_start_phase = ref_channel_states.start_phase[IQ_data_single_object.ref_channel]
-                phase_shift = 0
-                if IQ_data_single_object.ref_channel in phase_shifts_channels:
-                    for ps in phase_shifts_channels[IQ_data_single_object.ref_channel]:
-                         if ps.time <= start_pulse:
-                             phase_shift += ps.phase_shift
-            else:
-                ref_start_time = 0
-                ref_start_phase = 0
-                phase_shift = 0
-
-            # envelope data of the pulse
-            if IQ_data_single_object.envelope is None:
-                IQ_data_single_object.envelope = envelope_generator()
-
-            amp_envelope = IQ_data_single_object.envelope.get_AM_envelope((stop_pulse - start_pulse), sample_rate)
-            phase_envelope = IQ_data_single_object.envelope.get_PM_envelope((stop_pulse - start_pulse), sample_rate)
-
-            #self.baseband_pulse_data[-1,0] convert to point numbers
-            n_pt = int((stop_pulse - start_pulse) * sample_rate) if isinstance(amp_envelope, float) else len(amp_envelope)
-            start_pt = iround(start_pulse * sample_rate)
-            stop_pt = start_pt + n_pt
+        self._pre_process()
 
-            # add the sin pulse
-            total_phase = phase_shift + phase + phase_envelope + ref_start_phase
-            t = start_pt+ref_start_time/sample_rate + np.arange(n_pt)
-            wvf = amp*amp_envelope*np.sin(2*np.pi*freq/sample_rate*1e-9*t + total_phase)
-            elements.append(rendered_element(start_pt, stop_pt, wvf))
+        # render MW pulses.
+        if len(self._MW_pulse_data) > 0:
+            start_pts, n_pts, mw_wvf = self._render_MW_pulses(sample_rate, ref_channel_states)
+            for start_pt, n_pt, wvf in zip(start_pts, n_pts, np.split(mw_wvf, np.cumsum(n_pts)[:-1])):
+                elements.append(rendered_element(start_pt, start_pt+n_pt, wvf))
 
-        for custom_pulse in self.custom_pulse_data:
+        offsets_pt = [iround(offset * sample_rate) for offset in self._get_repeat_offsets()]
+        for custom_pulse in self._custom_pulse_data:
             wvf = self._render_custom_pulse(custom_pulse, sample_rate*1e9)
             start_pt = iround(custom_pulse.start * sample_rate)
             stop_pt = start_pt + len(wvf)
-            elements.append(rendered_element(start_pt, stop_pt, wvf))
+            for offset_pt in offsets_pt:
+                elements.append(rendered_element(start_pt+offset_pt, stop_pt+offset_pt, wvf))
 
         return self._merge_elements(elements)
 
     def get_metadata(self, name):
         metadata = {}
 
+        if self._repeat is not None:
+            self._expand()
         self._pre_process()
 
         # TODO: add custom pulses
@@ -822,7 +1603,7 @@ class pulse_data(parent_data):
             pd['start_phase'] = pulse.start_phase + phase_shift
             envelope = pulse.envelope
             if envelope is None:
-                envelope = envelope_generator()
+                envelope = _default_envelope
             pd['AM_envelope'] = repr(envelope.AM_envelope_function)
             pd['PM_envelope'] = repr(envelope.PM_envelope_function)
             all_pulse[('p%i' %i)] = pd
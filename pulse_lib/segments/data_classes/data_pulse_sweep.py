@@ -0,0 +1,351 @@
+"""
+Vectorized pulse data for all indices of a sweep.
+"""
+import copy
+
+import numpy as np
+
+from pulse_lib.segments.utility.looping import loop_obj
+from pulse_lib.segments.utility.data_handling_functions import get_new_dim_loop, find_common_dimension
+from pulse_lib.segments.data_classes.data_generic import data_container, map_index
+from pulse_lib.segments.data_classes.data_pulse import pulse_data, PulseDeltaStore, is_near_zero
+
+
+def _index_on_shape(index, shape):
+    # index in an array that broadcasts to the shape of the sweep
+    ndim = len(shape)
+    return tuple(i if n > 1 else 0 for i, n in zip(index[len(index)-ndim:], shape))
+
+
+class _DeltaGroup:
+    '''
+    Deltas of which the parameters time, step and ramp have the same shapes.
+    '''
+    def __init__(self, shapes):
+        self.shapes = shapes
+        # list with tuples (time, step, ramp)
+        self._deltas = []
+        # sequence number of the deltas in the sweep
+        self._seq_numbers = []
+        self._stacked = None
+
+    def __len__(self):
+        return len(self._deltas)
+
+    def append(self, delta, seq_number):
+        self._deltas.append(delta)
+        self._seq_numbers.append(seq_number)
+        self._stacked = None
+
+    def __copy__(self):
+        cpy = _DeltaGroup(self.shapes)
+        # the deltas are never modified in place
+        cpy._deltas = list(self._deltas)
+        cpy._seq_numbers = list(self._seq_numbers)
+        return cpy
+
+    @property
+    def nbytes(self):
+        return sum(value.nbytes for delta in self._deltas for value in delta)
+
+    def get(self, index):
+        '''
+        Returns the sequence numbers and the deltas (3, n) at the index in the sweep.
+        '''
+        if self._stacked is None:
+            self._stacked = (np.array(self._seq_numbers),
+                             [np.stack(values, axis=-1) for values in zip(*self._deltas)])
+        seq_numbers, stacked = self._stacked
+        return seq_numbers, np.array([values[_index_on_shape(index, shape)]
+                                      for values, shape in zip(stacked, self.shapes)])
+
+
+class pulse_data_sweep:
+    '''
+    Baseband pulse data of all indices of a sweep ("sweep tensor").
+
+    It is an alternative for a data_container with a pulse_data object per index.
+    The parameters of the pulses are stored as numeric arrays that are broadcast over
+    the shape of the sweep. A parameter that does not change along a loop axis has size 1
+    on that axis. The pulse_data of a single index is only created on request, e.g. for rendering.
+
+    The parameters of the methods can be numbers, numpy arrays that broadcast to the
+    shape of the sweep, or loop objects. Loop objects extend the shape of the sweep like
+    the loops on a segment.
+
+    A segment_pulse uses it after `segment_pulse.enable_sweep_data()`.
+    '''
+    def __init__(self):
+        self._shape = (1,)
+        # {(time.shape, step.shape, ramp.shape): _DeltaGroup}
+        self._groups = {}
+        self._n_deltas = 0
+        self._start_time = np.zeros(())
+        self._end_time = np.zeros(())
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def ndim(self):
+        return len(self._shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self._shape))
+
+    @property
+    def total_time(self):
+        return np.broadcast_to(self._end_time, self._shape)
+
+    @property
+    def start_time(self):
+        return np.broadcast_to(self._start_time, self._shape)
+
+    @property
+    def nbytes(self):
+        '''
+        Number of bytes used for the pulse parameters.
+        '''
+        return sum(group.nbytes for group in self._groups.values())
+
+    @property
+    def is_empty(self):
+        return self._n_deltas == 0 and not np.any(self._end_time)
+
+    def broadcast_to(self, shape):
+        '''
+        Extends the shape of the sweep. The data is not copied.
+        Returns:
+            self
+        '''
+        self._shape = tuple(find_common_dimension(self._shape, shape))
+        return self
+
+    def __copy__(self):
+        cpy = pulse_data_sweep()
+        cpy._shape = self._shape
+        cpy._groups = {shapes: copy.copy(group) for shapes, group in self._groups.items()}
+        cpy._n_deltas = self._n_deltas
+        cpy._start_time = self._start_time
+        cpy._end_time = self._end_time
+        return cpy
+
+    def _to_array(self, value):
+        '''
+        Converts a parameter to a float array that broadcasts to the shape of the sweep.
+        A loop object extends the shape of the sweep.
+        '''
+        if isinstance(value, loop_obj):
+            shape = list(value.shape)
+            for i in range(len(value.axis)-1, -1, -1):
+                new_dim, axis = get_new_dim_loop(self._shape, value.axis[i], value.shape[i])
+                value.axis[i] = axis
+                self._shape = tuple(new_dim)
+            # put the loop dimensions on their position in the sweep
+            ndim = max(value.axis) + 1
+            array_shape = [1]*ndim
+            for axis, n in zip(value.axis, shape):
+                array_shape[ndim-axis-1] = n
+            return np.asarray(value.data, dtype=float).reshape(array_shape)
+
+        value = np.asarray(value, dtype=float)
+        if value.ndim > 0:
+            new_shape = np.broadcast_shapes(self._shape, value.shape)
+            if new_shape != self._shape:
+                raise ValueError(f'Shape of parameter {value.shape} does not broadcast '
+                                 f'to shape of sweep {self._shape}')
+        return value
+
+    @staticmethod
+    def _reduce(value):
+        # remove leading dimensions of size 1. Broadcasting restores them.
+        shape = value.shape
+        n = 0
+        while n < len(shape) and shape[n] == 1:
+            n += 1
+        return value.reshape(shape[n:])
+
+    def _add_delta(self, time, step=0.0, ramp=0.0, active=True):
+        '''
+        Adds a delta to all indices of the sweep.
+        The end time is updated for the active indices.
+        '''
+        time, step, ramp, active = (np.asarray(value) for value in (time, step, ramp, active))
+        if not np.all(active):
+            step = np.where(active, step, 0.0)
+            ramp = np.where(active, ramp, 0.0)
+        delta = tuple(self._reduce(np.asarray(value, dtype=float)) for value in (time, step, ramp))
+        shapes = tuple(value.shape for value in delta)
+        group = self._groups.get(shapes)
+        if group is None:
+            group = _DeltaGroup(shapes)
+            self._groups[shapes] = group
+        group.append(delta, self._n_deltas)
+        self._n_deltas += 1
+
+        update = active & (time != np.inf) & (time > self._end_time)
+        if np.any(update):
+            self._end_time = self._reduce(np.where(update, time, self._end_time))
+
+    def add_block(self, start, stop, amplitude):
+        '''
+        Adds a block pulse on top of the existing pulse.
+        A stop time of -1 continues the block till the end of the segment.
+        '''
+        start = self._to_array(start)
+        stop = self._to_array(stop)
+        amplitude = self._to_array(amplitude)
+        self._add_delta(start + self._start_time, step=amplitude)
+        self._add_delta(np.where(stop != -1, stop + self._start_time, np.inf), step=-amplitude)
+
+    def add_ramp(self, start, stop, amplitude, keep_amplitude=False):
+        '''
+        Adds a linear ramp from 0 to amplitude.
+        '''
+        self.add_ramp_ss(start, stop, 0.0, amplitude, keep_amplitude)
+
+    def add_ramp_ss(self, start, stop, start_amplitude, stop_amplitude, keep_amplitude=False):
+        '''
+        Adds a linear ramp from start_amplitude to stop_amplitude.
+        keep_amplitude keeps the stop amplitude till the end of the segment.
+        '''
+        start = self._to_array(start)
+        stop = self._to_array(stop)
+        start_amplitude = self._to_array(start_amplitude)
+        stop_amplitude = self._to_array(stop_amplitude)
+        is_ramp = start != stop
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ramp = np.where(is_ramp, (stop_amplitude-start_amplitude) / (stop-start), 0.0)
+
+        self._add_delta(start + self._start_time, step=start_amplitude, ramp=ramp, active=is_ramp)
+        if keep_amplitude:
+            self._add_delta(stop + self._start_time,
+                            step=np.where(is_ramp, 0.0, stop_amplitude),
+                            ramp=-ramp)
+            self._add_delta(np.inf, step=-stop_amplitude)
+        else:
+            self._add_delta(stop + self._start_time, step=-stop_amplitude, ramp=-ramp,
+                            active=is_ramp)
+
+    def reset_time(self, time=None, extend_only=False):
+        '''
+        Resets the time to the given time, or to the total time if time is None.
+        '''
+        if time is None:
+            time = self._end_time
+        else:
+            time = self._to_array(time)
+            self._end_time = self._reduce(np.maximum(self._end_time, time))
+        if not extend_only:
+            self._start_time = self._reduce(np.asarray(time, dtype=float))
+
+    def wait(self, time):
+        '''
+        Extends the total time of the segment with time.
+        '''
+        self._end_time = self._reduce(self._end_time + self._to_array(time))
+
+    def _value_at(self, value, index):
+        return float(value[_index_on_shape(index, value.shape)])
+
+    def __getitem__(self, index):
+        '''
+        Returns the pulse_data of the index.
+        '''
+        if not isinstance(index, tuple):
+            index = (index,)
+        index = map_index(index, self._shape)
+        seq_numbers = []
+        deltas = []
+        for group in self._groups.values():
+            group_seq_numbers, group_deltas = group.get(index)
+            seq_numbers.append(group_seq_numbers)
+            deltas.append(group_deltas)
+
+        data = pulse_data()
+        if len(deltas) > 0:
+            # restore the order of the deltas
+            order = np.argsort(np.concatenate(seq_numbers))
+            time, step, ramp = np.concatenate(deltas, axis=1)[:, order]
+            keep = ~is_near_zero(step, ramp)
+            data.pulse_deltas = PulseDeltaStore.from_arrays(time[keep], step[keep], ramp[keep])
+        data.start_time = self._value_at(self._start_time, index)
+        data._end_time = self._value_at(self._end_time, index)
+        return data
+
+    def to_data_container(self):
+        '''
+        Returns a data_container with a pulse_data object per index.
+        '''
+        container = data_container(shape=self._shape)
+        for index in np.ndindex(self._shape):
+            container[index] = self[index]
+        return container
+
+
+class pulse_data_sweep_sum:
+    '''
+    Sum of a pulse_data_sweep and the data of the reference channels (virtual gates)
+    multiplied with their factor. The pulse_data of an index is created on request.
+
+    Args:
+        sweep (pulse_data_sweep): data of the channel.
+        references (List[Tuple[data, float]]): data of the reference channels with factor.
+            The data is a data_container or a pulse_data_sweep.
+    '''
+    def __init__(self, sweep, references):
+        self._sweep = sweep
+        self._references = references
+        shape = sweep.shape
+        for data, _ in references:
+            shape = find_common_dimension(shape, data.shape)
+        self._shape = tuple(shape)
+        # (index, pulse_data) of last request
+        self._last = (None, None)
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def ndim(self):
+        return len(self._shape)
+
+    @property
+    def total_time(self):
+        total_time = np.broadcast_to(self._sweep.total_time, self._shape)
+        for data, _ in self._references:
+            total_time = np.maximum(total_time, np.broadcast_to(data.total_time, self._shape))
+        return total_time
+
+    @property
+    def start_time(self):
+        return np.broadcast_to(self._sweep.start_time, self._shape)
+
+    def broadcast_to(self, shape):
+        '''
+        Extends the shape. The data is not copied.
+        Returns:
+            self
+        '''
+        self._shape = tuple(find_common_dimension(self._shape, shape))
+        return self
+
+    def __getitem__(self, index):
+        '''
+        Returns the pulse_data of the index.
+        '''
+        if not isinstance(index, tuple):
+            index = (index,)
+        index = map_index(index, self._shape)
+        # the uploader requests the same index several times
+        last_index, last_data = self._last
+        if index == last_index:
+            return last_data
+        data = self._sweep[index]
+        for ref_data, factor in self._references:
+            data = data + ref_data[map_index(index, ref_data.shape)] * factor
+        self._last = (index, data)
+        return data
@@ -0,0 +1,305 @@
+import heapq
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+
+@dataclass
+class CacheStats:
+    '''
+    Statistics of the waveform cache.
+    '''
+    policy: str
+    max_bytes: int
+    nbytes: int
+    n_entries: int
+    n_pinned: int
+    hits: int
+    misses: int
+    evictions: int
+
+    @property
+    def hit_rate(self):
+        n_lookups = self.hits + self.misses
+        return self.hits / n_lookups if n_lookups > 0 else 0.0
+
+    def __str__(self):
+        return (f'{self.policy} cache: {self.nbytes/1e6:.1f}/{self.max_bytes/1e6:.1f} MB, '
+                f'{self.n_entries} entries ({self.n_pinned} pinned), '
+                f'hits:{self.hits} misses:{self.misses} ({self.hit_rate:.1%}) evictions:{self.evictions}')
+
+
+class LruPolicy:
+    '''
+    Evicts the least recently used entry.
+    '''
+    name = 'lru'
+
+    def __init__(self):
+        self._order = OrderedDict()
+
+    def insert(self, entry):
+        self._order[entry.key] = entry
+
+    def access(self, entry):
+        self._order.move_to_end(entry.key)
+
+    def remove(self, entry):
+        del self._order[entry.key]
+
+    def select_victim(self, pinned):
+        for key in self._order:
+            if key not in pinned:
+                return key
+        return None
+
+    def clear(self):
+        self._order.clear()
+
+
+class GdsfPolicy:
+    '''
+    Greedy-Dual-Size-Frequency eviction. The priority of an entry is
+    `clock + frequency / size`. Large waveforms that are rarely used are evicted first.
+    The clock is raised to the priority of the evicted entry, which ages the entries
+    that are not used anymore.
+    '''
+    name = 'gdsf'
+
+    def __init__(self):
+        self._clock = 0.0
+        self._heap = []
+        self._priority = {}
+        self._frequency = {}
+        self._counter = 0
+
+    def _push(self, entry):
+        priority = self._clock + self._frequency[entry.key] / max(entry.nbytes, 1)
+        self._priority[entry.key] = priority
+        self._counter += 1
+        heapq.heappush(self._heap, (priority, self._counter, entry.key))
+
+    def insert(self, entry):
+        self._frequency[entry.key] = self._frequency.get(entry.key, 0) + 1
+        self._push(entry)
+
+    def access(self, entry):
+        self._frequency[entry.key] += 1
+        self._push(entry)
+
+    def remove(self, entry):
+        # heap entries are invalidated lazily
+        del self._priority[entry.key]
+        del self._frequency[entry.key]
+        if len(self._heap) > 4 * len(self._priority) + 64:
+            self._heap = [item for item in self._heap if self._priority.get(item[2]) == item[0]]
+            heapq.heapify(self._heap)
+
+    def select_victim(self, pinned):
+        skipped = []
+        victim = None
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            priority, _, key = item
+            if self._priority.get(key) != priority:
+                # outdated heap entry
+                continue
+            if key in pinned:
+                skipped.append(item)
+                continue
+            victim = key
+            self._clock = priority
+            break
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        return victim
+
+    def clear(self):
+        self._heap.clear()
+        self._priority.clear()
+        self._frequency.clear()
+
+
+_policies = {
+    'lru': LruPolicy,
+    'gdsf': GdsfPolicy,
+    }
+
+
+class _CacheEntry:
+    def __init__(self, key, value, tag, nbytes):
+        self.key = key
+        self.value = value
+        self.tag = tag
+        self.nbytes = nbytes
+
+
+class WaveformCache:
+    '''
+    Cache for rendered waveforms with a maximum size in bytes.
+
+    An entry has a tag which must match on lookup, e.g. the sample rate of the waveform.
+    The value of an entry can be None to register that a key has been seen.
+
+    Pinned entries are not evicted. Pins are counted per key, so an entry stays pinned
+    until all pins of the key are removed. The keys accessed by a thread can be recorded
+    with `record_keys` to pin the waveforms of an upload job.
+
+    Args:
+        max_bytes (int): maximum total size of the cached values.
+        policy (str or policy object): eviction policy: 'lru' or 'gdsf'.
+        max_entries (Optional[int]): maximum number of entries. None means no limit.
+    '''
+    # estimate of memory used by entry administration
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_bytes, policy='lru', max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._policy = _policies[policy]() if isinstance(policy, str) else policy
+        self._entries = {}
+        self._nbytes = 0
+        # {key: number of pins}
+        self._pinned = {}
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def policy(self):
+        return self._policy.name
+
+    def lookup(self, key, tag=None):
+        '''
+        Returns the cache entry with matching key and tag, or None.
+        The lookup is counted as hit when the entry has a value.
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.tag == tag:
+                self._policy.access(entry)
+                self._record(key)
+                if entry.value is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                return entry
+            self.misses += 1
+            self._record(key)
+            return None
+
+    def put(self, key, value, tag=None):
+        '''
+        Adds or replaces the entry for key.
+        The value is not stored when it is larger than the cache.
+        '''
+        nbytes = getattr(value, 'nbytes', 0) + WaveformCache.ENTRY_OVERHEAD
+        with self._lock:
+            self._remove(key)
+            if nbytes > self.max_bytes or self.max_entries == 0:
+                self.evictions += 1
+                return
+            entry = _CacheEntry(key, value, tag, nbytes)
+            self._entries[key] = entry
+            self._nbytes += nbytes
+            self._policy.insert(entry)
+            self._record(key)
+            self._evict()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._nbytes -= entry.nbytes
+            self._policy.remove(entry)
+
+    def _is_full(self):
+        return (self._nbytes > self.max_bytes
+                or (self.max_entries is not None and len(self._entries) > self.max_entries))
+
+    def _evict(self):
+        while self._is_full():
+            key = self._policy.select_victim(self._pinned)
+            if key is None:
+                # only pinned entries left
+                return
+            self._remove(key)
+            self.evictions += 1
+
+    def _record(self, key):
+        keys = getattr(self._local, 'keys', None)
+        if keys is not None:
+            keys.add(key)
+
+    @contextmanager
+    def record_keys(self, keys):
+        '''
+        Context in which the keys looked up and put by the current thread are added to keys.
+        Args:
+            keys (set): set to add the keys to.
+        '''
+        previous = getattr(self._local, 'keys', None)
+        self._local.keys = keys
+        try:
+            yield
+        finally:
+            self._local.keys = previous
+
+    def pin(self, key):
+        '''
+        Pins entry. Pinned entries are not evicted.
+        '''
+        self.pin_keys([key])
+
+    def pin_keys(self, keys):
+        '''
+        Pins the entries with the keys. Keys without entry are pinned as well,
+        because the entry can be added later.
+        '''
+        with self._lock:
+            for key in keys:
+                self._pinned[key] = self._pinned.get(key, 0) + 1
+
+    def unpin_keys(self, keys):
+        '''
+        Removes a pin of the keys.
+        '''
+        with self._lock:
+            for key in keys:
+                n = self._pinned.get(key, 0) - 1
+                if n > 0:
+                    self._pinned[key] = n
+                else:
+                    self._pinned.pop(key, None)
+            self._evict()
+
+    def unpin_all(self):
+        with self._lock:
+            self._pinned = {}
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._policy.clear()
+            self._nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def stats(self):
+        with self._lock:
+            return CacheStats(self.policy, self.max_bytes, self._nbytes, len(self._entries),
+                              len(self._pinned & self._entries.keys()),
+                              self.hits, self.misses, self.evictions)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
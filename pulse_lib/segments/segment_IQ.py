@@ -21,7 +21,7 @@ import numpy as np
 import copy
 
 from pulse_lib.segments.segment_base import last_edited, segment_base
-from pulse_lib.segments.utility.data_handling_functions import loop_controller, update_dimension
+from pulse_lib.segments.utility.data_handling_functions import loop_controller, update_dimension, materialize_shared
 from pulse_lib.segments.data_classes.data_pulse import pulse_data, PhaseShift
 from pulse_lib.segments.data_classes.data_IQ import envelope_generator, IQ_data_single, make_chirp
 from pulse_lib.segments.data_classes.data_markers import marker_data
@@ -144,6 +144,7 @@ class segment_IQ(segment_base):
         '''
         my_marker_data = update_dimension(data_container(marker_data()), self.shape)
         my_marker_data = my_marker_data.flatten()
+        materialize_shared(my_marker_data)
 
         # make a flat reference.
         local_data = self.data.flatten()
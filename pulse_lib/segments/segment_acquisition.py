@@ -4,7 +4,7 @@ File containing the parent class where all segment objects are derived from.
 
 import numpy as np
 
-from pulse_lib.segments.utility.data_handling_functions import loop_controller
+from pulse_lib.segments.utility.data_handling_functions import loop_controller, materialize_shared
 from pulse_lib.segments.data_classes.data_generic import data_container
 from pulse_lib.segments.data_classes.data_acquisition import acquisition_data, acquisition
 from pulse_lib.segments.utility.looping import loop_obj
@@ -117,6 +117,8 @@ class segment_acquisition():
         Args:
             *key (int/slice object) : key of the element -- just use numpy style accessing (slicing supported)
         '''
+        # the slice references the elements of this segment. They should not be shared with other indices.
+        materialize_shared(self.data)
         data_item = self.data[key[0]]
         if not isinstance(data_item, data_container):
             # If the slice contains only 1 element, then it's not a data_container anymore.
@@ -5,11 +5,14 @@ File containing the parent class where all segment objects are derived from.
 import numpy as np
 import matplotlib.pyplot as plt
 
-from pulse_lib.segments.utility.data_handling_functions import loop_controller, get_union_of_shapes, update_dimension, find_common_dimension
+from pulse_lib.segments.utility.data_handling_functions import (
+        loop_controller, linear_loop_args, get_union_of_shapes, update_dimension, find_common_dimension,
+        materialize_shared)
 from pulse_lib.segments.data_classes.data_generic import data_container
 from pulse_lib.segments.utility.looping import loop_obj
 from pulse_lib.segments.utility.setpoint_mgr import setpoint_mgr
-from pulse_lib.segments.data_classes.data_generic import map_index
+from pulse_lib.segments.data_classes.data_generic import map_index, IndexedWaveform, render_batch_into
+from pulse_lib.segments.utility.rounding import iround
 
 from functools import wraps
 import copy
@@ -35,6 +38,16 @@ class last_edit:
     ToRender = -1
     Rendered = 0
 
+def _merge_linear_loop_axes(linear_axes1, linear_axes2):
+    '''
+    Returns the loop axes along which the sum of two segments is affine in the loop parameter.
+    '''
+    result = dict(linear_axes1)
+    for axis, is_linear in linear_axes2.items():
+        result[axis] = result.get(axis, True) and is_linear
+    return result
+
+
 class segment_base():
     '''
     Class defining base function of a segment. All segment types should support all operators.
@@ -73,6 +86,8 @@ class segment_base():
 
         # setpoints of the loops (with labels and units)
         self._setpoints = setpoint_mgr()
+        # {loop axis: bool} True if the data is affine in the loop parameter of the axis.
+        self._linear_loop_axes = {}
 
     def _copy(self, cpy):
         cpy.type = copy.copy(self.type)
@@ -87,6 +102,7 @@ class segment_base():
 
         # setpoints of the loops (with labels and units)
         cpy._setpoints = copy.copy(self._setpoints)
+        cpy._linear_loop_axes = copy.copy(self._linear_loop_axes)
 
         return cpy
 
@@ -130,6 +146,8 @@ class segment_base():
             other_data = update_dimension(other.data, new_shape)
             new_segment.data= update_dimension(new_segment.data, new_shape)
             new_segment.data += other_data
+            new_segment._linear_loop_axes = _merge_linear_loop_axes(self._linear_loop_axes,
+                                                                    other._linear_loop_axes)
 
         elif type(other) == int or type(other) == float:
             new_segment.data += other
@@ -165,6 +183,8 @@ class segment_base():
         Args:
             *key (int/slice object) : key of the element -- just use numpy style accessing (slicing supported)
         '''
+        # the slice references the elements of this segment. They should not be shared with other indices.
+        materialize_shared(self.data)
         data_item = self.data[key[0]]
         if not isinstance(data_item, data_container):
             # If the slice contains only 1 element, then it's not a data_container anymore.
@@ -215,6 +235,7 @@ class segment_base():
         return self.data_tmp
 
     @loop_controller
+    @linear_loop_args('loop_obj')
     def update_dim(self, loop_obj):
         '''
         update the dimesion of the segment by providing a loop object to it (decorator takes care of it).
@@ -301,7 +322,11 @@ class segment_base():
                 # make sure both have the same size.
                 my_shape = find_common_dimension(self._pulse_data_all.shape, ref_chan.segment.shape)
                 self._pulse_data_all = update_dimension(self._pulse_data_all, my_shape)
-                self._pulse_data_all += ref_chan.segment.data*ref_chan.multiplication_factor
+                ref_data = ref_chan.segment.data
+                if not isinstance(ref_data, data_container):
+                    # vectorized sweep data
+                    ref_data = ref_data.to_data_container()
+                self._pulse_data_all += ref_data*ref_chan.multiplication_factor
                 ref_chan.segment._last_edit = last_edit.Rendered
             for ref_chan in self.IQ_ref_channels:
                 # todo -- update dim functions
@@ -365,6 +390,152 @@ class segment_base():
             A numpy array that contains the points for each ns
             points is the expected lenght.
         '''
+        ref_channel_states = self._filter_ref_channel_states(ref_channel_states)
+        return self._get_data_all_at(index).render(sample_rate, ref_channel_states)
+
+    def render_into(self, out, offset, index, sample_rate=1e9, ref_channel_states=None):
+        '''
+        Renders the segment in a buffer of the caller.
+        The samples are written to out[offset:offset+n_samples]. Samples that fall
+        outside out are discarded.
+
+        Args:
+            out (np.ndarray): buffer to write the samples into.
+            offset (int): sample index in out for the first sample, including delay. Can be negative.
+            index of segment (list) : which segment to render (e.g. [0] if dimension is 1 or [2,5,10] if dimension is 3)
+            sample_rate (float) : #/s (number of samples per second)
+
+        Returns:
+            n_samples (int): number of samples of the segment.
+        '''
+        ref_channel_states = self._filter_ref_channel_states(ref_channel_states)
+        return self._get_data_all_at(index).render_into(out, offset, sample_rate, ref_channel_states)
+
+    def render_all(self, sample_rate=1e9, ref_channel_states=None):
+        '''
+        Renders the waveforms of all indices of the segment in one array.
+        Work is shared between the indices: equal waveforms are rendered once and
+        waveforms that only differ in amplitudes are rendered in one vectorized operation.
+        Waveforms of amplitude sweeps are computed from two rendered components: base + coeff*delta.
+
+        Args:
+            sample_rate (float) : #/s (number of samples per second)
+
+        Returns:
+            np.ndarray[n_indices, n_samples]: waveform per index in the order of
+                np.ndindex(self.pulse_data_all.shape), which includes the loops of the reference channels.
+                Waveforms shorter than the longest waveform are padded with zeros.
+        '''
+        # the shape of pulse_data_all includes the loops of the reference channels
+        data = self.pulse_data_all
+        indices = list(np.ndindex(data.shape))
+        n_samples = int(np.max(iround(data.total_time * sample_rate * 1e-9)))
+        out = np.zeros((len(indices), n_samples))
+        self.render_indices_into(out, [0]*len(indices), indices, sample_rate,
+                                 [ref_channel_states]*len(indices))
+        return out
+
+    def render_indices_into(self, out, offsets, indices, sample_rate=1e9, ref_channel_states=None):
+        '''
+        Renders the waveforms of the indices in the rows of out.
+        The waveform of indices[i] is written to out[i, offsets[i]:offsets[i]+n_samples].
+        Samples that fall outside out are discarded.
+
+        Args:
+            out (np.ndarray): 2D array with a row per index. The samples must be 0.
+            offsets (list[int]): sample index in the row for the first sample of the segment.
+            indices (list[tuple]): indices to render.
+            sample_rate (float) : #/s (number of samples per second)
+            ref_channel_states (list[RefChannels]): states of the reference channels per index, or None.
+        '''
+        data = self.pulse_data_all
+        elements = [data[map_index(index, data.shape)] for index in indices]
+        rows = list(range(len(indices)))
+        linear_axes = self._get_linear_loop_axes()
+        if len(linear_axes) > 0:
+            rows = self._render_affine_into(out, offsets, indices, elements, linear_axes, sample_rate)
+        if ref_channel_states is not None:
+            ref_channel_states = [self._filter_ref_channel_states(ref_channel_states[row]) for row in rows]
+        render_batch_into(out, [offsets[row] for row in rows], [elements[row] for row in rows],
+                          sample_rate, ref_channel_states, rows=rows)
+
+    def _get_linear_loop_axes(self):
+        '''
+        Returns the loop axes along which the pulse data of all the reference channels
+        is expected to be affine in the loop parameter.
+        '''
+        if len(self.IQ_ref_channels) > 0:
+            # MW pulses are not rendered as affine components
+            return []
+        linear_axes = self._linear_loop_axes
+        for ref_chan in self.reference_channels:
+            linear_axes = _merge_linear_loop_axes(linear_axes, ref_chan.segment._linear_loop_axes)
+        return [axis for axis, is_linear in linear_axes.items() if is_linear]
+
+    def _render_affine_into(self, out, offsets, indices, elements, linear_axes, sample_rate):
+        '''
+        Renders the indices that only differ on linear loop axes as base + coeff*delta.
+        The data is checked to be affine before it is rendered this way.
+        Sweeps on multiple linear axes are only affine along all axes when the loop
+        parameters are dependent. Otherwise the indices are rendered per linear axis.
+
+        Returns:
+            list[int]: rows that have not been rendered.
+        '''
+        shape = self.pulse_data_all.shape
+        ndim = len(shape)
+        mapped_indices = [map_index(index, shape) for index in indices]
+        remaining = list(range(len(indices)))
+        candidate_axes = [linear_axes]
+        if len(linear_axes) > 1:
+            candidate_axes += [[axis] for axis in linear_axes]
+        for axes in candidate_axes:
+            lines = {}
+            for row in remaining:
+                key = tuple(i for dim, i in enumerate(mapped_indices[row]) if ndim-dim-1 not in axes)
+                lines.setdefault(key, []).append(row)
+
+            remaining = []
+            for rows in lines.values():
+                line_elements = [elements[row] for row in rows]
+                data_class = type(line_elements[0])
+                # rendering of base and delta only pays off for 3 or more elements
+                if (len(rows) < 3
+                    or any(type(data) != data_class for data in line_elements)
+                    or not data_class._render_affine_into(out, rows, [offsets[row] for row in rows],
+                                                          line_elements, sample_rate)):
+                    remaining += rows
+        return sorted(remaining)
+
+    def get_indexed_waveform(self, index, ref_channel_states=None):
+        '''
+        Returns the waveform description for a single index, which can be rendered in another process.
+
+        Args:
+            index of segment (list) : which segment to render (e.g. [0] if dimension is 1 or [2,5,10] if dimension is 3)
+
+        Returns:
+            IndexedWaveform
+        '''
+        ref_channel_states = self._filter_ref_channel_states(ref_channel_states)
+        return IndexedWaveform(self._get_data_all_at(index), ref_channel_states)
+
+    def get_fingerprint(self, index, sample_rate=1e9, ref_channel_states=None):
+        '''
+        Returns the fingerprint of the rendered segment. Segments with equal fingerprint
+        render to the same waveform. It can be used to reuse rendered or uploaded waveforms.
+
+        Args:
+            index of segment (list) : which segment to render (e.g. [0] if dimension is 1 or [2,5,10] if dimension is 3)
+            sample_rate (float) : #/s (number of samples per second)
+
+        Returns:
+            fingerprint (bytes): fingerprint or None if not available.
+        '''
+        ref_channel_states = self._filter_ref_channel_states(ref_channel_states)
+        return self._get_data_all_at(index).get_fingerprint(sample_rate, ref_channel_states)
+
+    def _filter_ref_channel_states(self, ref_channel_states):
         if ref_channel_states:
             # Filter reference channels for use in data_pulse cache
             ref_channel_states = copy.copy(ref_channel_states)
@@ -373,8 +544,7 @@ class segment_base():
             ref_channel_states.start_phase = {key:value
                                               for (key,value) in ref_channel_states.start_phase.items()
                                               if key in ref_names}
-
-        return self._get_data_all_at(index).render(sample_rate, ref_channel_states)
+        return ref_channel_states
 
     def v_max(self, index, sample_rate = 1e9):
         return self._get_data_all_at(index).get_vmax(sample_rate)
@@ -352,6 +352,31 @@ class segment_container():
         '''
         return getattr(self, channel).get_segment(index, sample_rate, ref_channel_states)
 
+    def render_into(self, channel, out, offset, index=[0], sample_rate=1e9, ref_channel_states=None):
+        '''
+        Renders the waveform of a channel in a buffer of the caller.
+        Args:
+            channel (str) : channel name of the waveform you want
+            out (np.ndarray): buffer to write the samples into.
+            offset (int): sample index in out for the first sample. Can be negative.
+            index (tuple) :
+        returns:
+            n_samples (int): number of samples of the waveform.
+        '''
+        return getattr(self, channel).render_into(out, offset, index, sample_rate, ref_channel_states)
+
+    def get_fingerprint(self, channel, index=[0], sample_rate=1e9, ref_channel_states=None):
+        '''
+        Returns the fingerprint of the waveform of a channel.
+        Waveforms with equal fingerprint are equal.
+        Args:
+            channel (str) : channel name of the waveform you want
+            index (tuple) :
+        returns:
+            bytes: fingerprint or None if not available.
+        '''
+        return getattr(self, channel).get_fingerprint(index, sample_rate, ref_channel_states)
+
     def extend_dim(self, shape=None, ref = False):
         '''
         extend the dimensions of the waveform to a given shape.
@@ -2,14 +2,37 @@
 Class that is used to make DC pulses.
 """
 import numpy as np
+from functools import wraps
 
-from pulse_lib.segments.segment_base import last_edited, segment_base
-from pulse_lib.segments.utility.data_handling_functions import loop_controller
-from pulse_lib.segments.data_classes.data_pulse import pulse_data, custom_pulse_element, pulse_delta
+from pulse_lib.segments.segment_base import last_edited, last_edit, segment_base
+from pulse_lib.segments.utility.data_handling_functions import loop_controller, linear_loop_args, _get_loop_info
+from pulse_lib.segments.utility.looping import loop_obj
+from pulse_lib.segments.data_classes.data_pulse import pulse_data, custom_pulse_element
+from pulse_lib.segments.data_classes.data_pulse_sweep import pulse_data_sweep, pulse_data_sweep_sum
 from pulse_lib.segments.data_classes.data_IQ import IQ_data_single
 from pulse_lib.segments.segment_IQ import segment_IQ
 from dataclasses import dataclass
 
+def sweep_data_method(f):
+    '''
+    Calls the method with the same name on the pulse_data_sweep when the segment uses sweep data.
+    '''
+    @wraps(f)
+    def wrapper(self, *args, **kwargs):
+        if not isinstance(self.data, pulse_data_sweep):
+            return f(self, *args, **kwargs)
+        self._last_edit = last_edit.ToRender
+        getattr(self.data, f.__name__)(*args, **kwargs)
+        # register the setpoints of the loops with the axes assigned by the sweep data.
+        for arg in list(args) + list(kwargs.values()):
+            if isinstance(arg, loop_obj):
+                setpoints = _get_loop_info(arg, None)['setpnt']
+                if setpoints is not None:
+                    for setpoint in setpoints:
+                        self._setpoints += setpoint
+    return wrapper
+
+
 # @@@ TODO: This is very similar to IQ_out_channel_info + qubit_channel
 @dataclass
 class IQ_render_info:
@@ -36,21 +59,73 @@ class segment_pulse(segment_base):
         '''
         super().__init__(name, pulse_data(), HVI_variable_data,segment_type)
 
+    def enable_sweep_data(self):
+        '''
+        Stores the pulses of all indices of the sweep in a pulse_data_sweep instead of a
+        pulse_data object per index. The pulse_data of an index is only created for rendering.
+        This reduces memory and construction time of large sweeps.
+
+        Only add_block, add_ramp, add_ramp_ss, wait and reset_time are supported.
+        It must be called before pulses are added to the segment.
+        '''
+        if isinstance(self.data, pulse_data_sweep):
+            return
+        if self.data.shape != (1,) or self.data[0].total_time != 0 or len(self.data[0].pulse_deltas) > 0:
+            raise Exception(f'Segment {self.name} already has pulses. Enable sweep data before adding pulses.')
+        if len(self.IQ_ref_channels) > 0 or len(self.references_markers) > 0:
+            raise Exception(f'Sweep data is not supported on channel {self.name} with IQ or marker references')
+        self.data = pulse_data_sweep()
+        self._last_edit = last_edit.ToRender
+
+    @property
+    def pulse_data_all(self):
+        if not isinstance(self.data, pulse_data_sweep):
+            return super().pulse_data_all
+        if self.last_edit == last_edit.ToRender or self._pulse_data_all is None:
+            # reference data is added when the pulse data of an index is requested
+            self._pulse_data_all = pulse_data_sweep_sum(
+                    self.data,
+                    [(ref_chan.segment.data, ref_chan.multiplication_factor)
+                     for ref_chan in self.reference_channels])
+            for ref_chan in self.reference_channels:
+                ref_chan.segment._last_edit = last_edit.Rendered
+            self._last_edit = last_edit.Rendered
+        return self._pulse_data_all
+
+    def get_metadata(self):
+        if isinstance(self.data, pulse_data_sweep):
+            # Uses highest index of the sweep, like data_tmp
+            return self.data[tuple(n-1 for n in self.data.shape)].get_metadata(self.name)
+        return super().get_metadata()
+
+    @sweep_data_method
+    def reset_time(self, time=None, extend_only=False):
+        '''
+        resets the time back to zero after a certain point
+        Args:
+            time (double) : (optional), after time to reset back to 0. Note that this is absolute time and not rescaled time.
+            extend_only (bool) : will just extend the time in the segment and not reset it if set to true [do not use when composing wavoforms...].
+        '''
+        return super().reset_time(time, extend_only)
 
+    @sweep_data_method
     @last_edited
     @loop_controller
+    @linear_loop_args('amplitude')
     def add_block(self,start,stop, amplitude):
         '''
         add a block pulse on top of the existing pulse.
         '''
-        self.data_tmp.add_delta(pulse_delta(start + self.data_tmp.start_time,
-                                            step=amplitude))
-        self.data_tmp.add_delta(pulse_delta(stop + self.data_tmp.start_time if stop != -1 else np.inf,
-                                            step=-amplitude))
+        self.data_tmp.add_delta(start + self.data_tmp.start_time,
+                                step=amplitude)
+        self.data_tmp.add_delta(stop + self.data_tmp.start_time if stop != -1 else np.inf,
+                                step=-amplitude)
         return self.data_tmp
 
+    @sweep_data_method
     @last_edited
     @loop_controller
+    @linear_loop_args('amplitude')
     def add_ramp(self, start, stop, amplitude, keep_amplitude=False):
         '''
         Makes a linear ramp
@@ -62,8 +137,10 @@ class segment_pulse(segment_base):
         '''
         return self._add_ramp(start, stop, 0, amplitude, keep_amplitude)
 
+    @sweep_data_method
     @last_edited
     @loop_controller
+    @linear_loop_args('start_amplitude', 'stop_amplitude')
     def add_ramp_ss(self, start, stop, start_amplitude, stop_amplitude, keep_amplitude=False):
         '''
         Makes a linear ramp (with start and stop amplitude)
@@ -86,27 +163,28 @@ class segment_pulse(segment_base):
         '''
         if start != stop:
             ramp = (stop_amplitude-start_amplitude) / (stop-start)
-            self.data_tmp.add_delta(pulse_delta(start + self.data_tmp.start_time,
-                                                step=start_amplitude,
-                                                ramp=ramp))
+            self.data_tmp.add_delta(start + self.data_tmp.start_time,
+                                    step=start_amplitude,
+                                    ramp=ramp)
             if keep_amplitude:
-                self.data_tmp.add_delta(pulse_delta(stop + self.data_tmp.start_time,
-                                                    ramp=-ramp))
-                self.data_tmp.add_delta(pulse_delta(np.inf,
-                                                    step=-stop_amplitude))
+                self.data_tmp.add_delta(stop + self.data_tmp.start_time,
+                                        ramp=-ramp)
+                self.data_tmp.add_delta(np.inf,
+                                        step=-stop_amplitude)
             else:
-                self.data_tmp.add_delta(pulse_delta(stop + self.data_tmp.start_time,
-                                                    step=-stop_amplitude,
-                                                    ramp=-ramp))
+                self.data_tmp.add_delta(stop + self.data_tmp.start_time,
+                                        step=-stop_amplitude,
+                                        ramp=-ramp)
         elif keep_amplitude:
-            self.data_tmp.add_delta(pulse_delta(stop + self.data_tmp.start_time,
-                                                step=stop_amplitude))
-            self.data_tmp.add_delta(pulse_delta(np.inf,
-                                                step=-stop_amplitude))
+            self.data_tmp.add_delta(stop + self.data_tmp.start_time,
+                                    step=stop_amplitude)
+            self.data_tmp.add_delta(np.inf,
+                                    step=-stop_amplitude)
 
         return self.data_tmp
 
 
+    @sweep_data_method
     @last_edited
     @loop_controller
     def wait(self, wait):
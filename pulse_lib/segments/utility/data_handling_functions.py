@@ -2,6 +2,7 @@ from pulse_lib.segments.utility.looping import loop_obj
 from pulse_lib.segments.data_classes.data_generic import data_container
 from pulse_lib.segments.utility.setpoint_mgr import setpoint
 from functools import wraps
+import inspect
 import numpy as np
 import copy
 
@@ -46,113 +47,47 @@ def find_common_dimension(dim_1, dim_2):
 
 def update_dimension(data, new_dimension_info, use_ref = False):
     '''
-    update dimension of the data object to the one specified in new dimension_info
+    update dimension of the data object to the one specified in new dimension_info.
+    The data is broadcast to the new shape, i.e. the elements are referenced on all the
+    indices along the new dimensions instead of copied. Elements that are referenced
+    multiple times are copied when they are modified (see materialize_shared).
     Args:
         data (np.ndarray[dtype = object]) : numpy object that contains all the segment data of every iteration.
         new_dimension_info (list/np.ndarray) : list of the new dimensions of the array
-        use_ref (bool) : use pointer to copy, or take full copy (False is full copy)
+        use_ref (bool) : kept for backwards compatibility. Elements are always referenced and copied on write.
     Returns:
         data (np.ndarray[dtype = object]) : same as input data, but with new_dimension_info.
     '''
+    if not isinstance(data, np.ndarray):
+        # vectorized data, e.g. pulse_data_sweep, broadcasts itself
+        return data.broadcast_to(new_dimension_info)
+    shape = np.broadcast_shapes(data.shape, tuple(new_dimension_info))
+    if shape == data.shape:
+        return data
 
-    new_dimension_info = np.array(new_dimension_info)
+    # copy of the references only. This does not copy the elements.
+    return np.broadcast_to(data, shape, subok=True).copy()
 
-    for i in range(len(new_dimension_info)):
-        if data.ndim < i+1:
-            data = _add_dimensions(data, new_dimension_info[-i-1:], use_ref)
 
-        elif list(data.shape)[-i -1] != new_dimension_info[-i -1]:
-            shape = list(data.shape)
-            shape[-i-1] = new_dimension_info[-i-1]
-            data = _extend_dimensions(data, shape, use_ref)
-
-    return data
-
-def _add_dimensions(data, shape, use_ref):
-    """
-    Function that can be used to add and extra dimension of an array object. A seperate function is needed since we want to make a copy and not a reference.
-    Note that only one dimension can be extended!
-    Args:
-        data (np.ndarray[dtype = object]) : numpy object that contains all the segment data of every iteration.
-        shape (list/np.ndarray) : list of the new dimensions of the array
-        use_ref (bool) : use pointer to copy, or take full copy (False is full copy)
-    """
-    new_data =  data_container(shape = shape)
-    for i in range(shape[0]):
-        new_data[i] = cpy_numpy_shallow(data, use_ref)
-    return new_data
-
-def _extend_dimensions(data, shape, use_ref):
+def materialize_shared(data):
     '''
-    Extends the dimensions of a existing array object. This is useful if one would have first defined sweep axis 2 without defining axis 1.
-    In this case axis 1 is implicitly made, only harbouring 1 element.
-    This function can be used to change the axis 1 to a different size.
+    Copies the elements that are referenced on multiple indices of the data object, e.g. after
+    update_dimension, such that every index has its own element.
+    This must be called before the elements are modified in place.
 
     Args:
         data (np.ndarray[dtype = object]) : numpy object that contains all the segment data of every iteration.
-        shape (list/np.ndarray) : list of the new dimensions of the array (should have the same lenght as the dimension of the data!)
-        use_ref (bool) : use pointer to copy, or take full copy (False is full copy)
-    '''
-    new_data = data_container(shape = shape)
-    for i in range(len(shape)):
-        if data.shape[i] != shape[i]:
-            if i == 0:
-                for j in range(len(new_data)):
-                    new_data[j] = cpy_numpy_shallow(data, use_ref)
-            else:
-                new_data = new_data.swapaxes(i, 0)
-                data = data.swapaxes(i, 0)
-
-                for j in range(len(new_data)):
-                    new_data[j] = cpy_numpy_shallow(data, use_ref)
-
-                new_data = new_data.swapaxes(i, 0)
-
-
-    return new_data
-
-
-def cpy_numpy_shallow(data, use_ref):
-    '''
-    Makes a shallow copy of an numpy object array.
-
-    Args:
-        data : data element
-        use_ref (bool) : use reference to copy
+            The data is updated in place. The first reference keeps the original element.
     '''
+    if len(set(map(id, data.flat))) == data.size:
+        return
 
-    if use_ref == True:
-        if type(data) != data_container:
-            return data
-
-        if data.shape == (1,):
-            return data[0]
-
-        shape = data.shape
-        data_flat = data.flatten()
-        new_arr = np.empty(data_flat.shape, dtype=object)
-
-        for i in range(len(new_arr)):
-            new_arr[i] = data_flat[i]
-
-        new_arr = new_arr.reshape(shape)
-
-    else:
-        if type(data) != data_container:
-            return copy(data)
-
-        if data.shape == (1,):
-            return data[0].__copy__()
-
-        shape = data.shape
-        data_flat = data.flatten()
-        new_arr = np.empty(data_flat.shape, dtype=object)
-
-        for i in range(len(new_arr)):
-            new_arr[i] = copy.copy(data_flat[i])
-
-        new_arr = new_arr.reshape(shape)
-    return new_arr
+    ids = set()
+    for i, element in enumerate(data.flat):
+        if id(element) in ids:
+            data.flat[i] = copy.copy(element)
+        else:
+            ids.add(id(element))
 
 
 def _get_loop_info(lp, index):
@@ -176,6 +111,36 @@ def _get_loop_info(lp, index):
     return info
 
 
+def linear_loop_args(*arg_names):
+    '''
+    Decorator declaring that the waveform added by the function is linear in the
+    arguments arg_names, e.g. the amplitude of a block pulse.
+    A loop over only these arguments gives pulse data that is affine in the loop parameter.
+    It must be applied before loop_controller.
+    '''
+    def decorator(func):
+        func.linear_loop_args = arg_names
+        return func
+    return decorator
+
+
+def _update_linear_loop_axes(obj, loop_info, arg_names, linear_args):
+    # loop axes along which the pulse data is affine in the loop parameter.
+    # The axis is marked non-linear when any other loop argument is on the same axis.
+    linear_axes = getattr(obj, '_linear_loop_axes', None)
+    if linear_axes is None:
+        return
+    for lp in loop_info:
+        nth_arg = lp['nth_arg']
+        if isinstance(nth_arg, int):
+            name = arg_names[nth_arg] if nth_arg < len(arg_names) else None
+        else:
+            name = nth_arg
+        is_linear = name in linear_args
+        for axis in lp['axis']:
+            linear_axes[axis] = linear_axes.get(axis, True) and is_linear
+
+
 def loop_controller(func):
     '''
     Checks if there are there are parameters given that are loopable.
@@ -183,13 +148,20 @@ def loop_controller(func):
     If loop:
         * then check how many new loop parameters on which axis
         * extend data format to the right shape (simple python list used).
+        * copy the elements that are shared by the extended data (see materialize_shared)
         * loop over the data and add called function
+        * register whether the data is affine along the loop axes (see linear_loop_args)
 
     if no loop, just apply func on all data (easy)
     '''
+    arg_names = list(inspect.signature(func).parameters)
+    linear_args = getattr(func, 'linear_loop_args', ())
+
     @wraps(func)
     def wrapper(*args, **kwargs):
         obj = args[0]
+        if not isinstance(obj.data, np.ndarray):
+            raise NotImplementedError(f'{func.__name__} is not supported on sweep data of {obj.name}')
 
         loop_info_args = []
         loop_info_kwargs = []
@@ -224,6 +196,8 @@ def loop_controller(func):
 #            new_dim = get_new_dim_loop(obj.data.shape, lp)
 #            obj.data = update_dimension(obj.data, new_dim)
 
+        _update_linear_loop_axes(obj, loop_info_args + loop_info_kwargs, arg_names, linear_args)
+        materialize_shared(obj.data)
         loop_over_data(func, obj.data, args, loop_info_args, kwargs, loop_info_kwargs)
 
 
@@ -270,6 +244,7 @@ def loop_controller_post_processing(func):
         for lp in loop_info_kwargs:
             new_dim = get_new_dim_loop(obj.pulse_data_all.shape, lp)
             obj.pulse_data_all = update_dimension(obj.pulse_data_all, new_dim)
+        materialize_shared(obj.pulse_data_all)
         loop_over_data(func, obj.pulse_data_all, args, loop_info_args, kwargs, loop_info_kwargs)
 
 
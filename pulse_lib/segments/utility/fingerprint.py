@@ -0,0 +1,140 @@
+"""
+Content fingerprints of pulse descriptions.
+"""
+import hashlib
+import itertools
+import struct
+import threading
+import types
+import weakref
+from numbers import Number
+
+import numpy as np
+
+
+class NotFingerprintable(Exception):
+    '''
+    Raised when a value has no canonical representation, e.g. a callable object.
+    '''
+
+
+# Unique number per function object. Functions are keyed on identity, because
+# a function with equal name and code can call other functions or read other globals.
+# The numbers are never reused, unlike id(func).
+_function_numbers = weakref.WeakKeyDictionary()
+_function_counter = itertools.count()
+_function_lock = threading.Lock()
+
+
+def _function_number(func):
+    with _function_lock:
+        number = _function_numbers.get(func)
+        if number is None:
+            number = next(_function_counter)
+            _function_numbers[func] = number
+        return number
+
+
+def _global_names(code):
+    '''
+    Returns the names used by code and its nested code objects.
+    These are global names and attribute names.
+    '''
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _global_names(const)
+    return names
+
+
+class Fingerprint:
+    '''
+    Incremental calculation of a fingerprint (blake2b digest).
+
+    Supported values are None, bool, numbers, str, bytes, numpy arrays, functions and
+    lists, tuples and dicts of these. Other values raise NotFingerprintable.
+    A function is only fingerprintable when the globals and closure variables it uses
+    are modules, builtin functions, functions or fingerprintable values.
+    '''
+    def __init__(self):
+        self._hash = hashlib.blake2b(digest_size=16)
+
+    def add(self, value):
+        h = self._hash
+        if value is None:
+            h.update(b'N')
+        elif isinstance(value, (bool, np.bool_)):
+            h.update(b'T' if value else b'F')
+        elif isinstance(value, Number):
+            if isinstance(value, complex):
+                h.update(b'c' + struct.pack('<dd', value.real, value.imag))
+            else:
+                h.update(b'f' + struct.pack('<d', float(value)))
+        elif isinstance(value, str):
+            data = value.encode()
+            h.update(b's' + struct.pack('<q', len(data)) + data)
+        elif isinstance(value, bytes):
+            h.update(b'b' + struct.pack('<q', len(value)) + value)
+        elif isinstance(value, np.ndarray):
+            if value.dtype == object:
+                raise NotFingerprintable('object array')
+            h.update(b'a' + value.dtype.str.encode() + repr(value.shape).encode())
+            h.update(np.ascontiguousarray(value).tobytes())
+        elif isinstance(value, (list, tuple)):
+            h.update(b'l' + struct.pack('<q', len(value)))
+            for item in value:
+                self.add(item)
+        elif isinstance(value, dict):
+            h.update(b'd' + struct.pack('<q', len(value)))
+            for key in sorted(value, key=repr):
+                self.add(key)
+                self.add(value[key])
+        elif isinstance(value, types.FunctionType):
+            self._add_function(value, set())
+        else:
+            raise NotFingerprintable(f'{type(value)}')
+        return self
+
+    def _add_function(self, func, visited):
+        '''
+        Adds a function. The function is keyed on its identity. The values of the
+        globals and closure variables it uses are added, because they can change
+        after the function has been defined. Functions that use these are followed.
+        '''
+        h = self._hash
+        h.update(b'x' + struct.pack('<q', _function_number(func)))
+        if func in visited:
+            return
+        visited.add(func)
+        self.add(func.__defaults__)
+        self.add(func.__kwdefaults__)
+        if func.__closure__ is not None:
+            for cell in func.__closure__:
+                try:
+                    value = cell.cell_contents
+                except ValueError:
+                    # empty cell
+                    value = None
+                self._add_referenced_value(value, visited)
+        func_globals = func.__globals__
+        for name in sorted(_global_names(func.__code__)):
+            # names that are not in globals are builtins or attribute names
+            if name in func_globals:
+                self.add(name)
+                self._add_referenced_value(func_globals[name], visited)
+
+    def _add_referenced_value(self, value, visited):
+        h = self._hash
+        if isinstance(value, types.ModuleType):
+            self.add('module:' + value.__name__)
+        elif isinstance(value, types.FunctionType):
+            self._add_function(value, visited)
+        elif isinstance(value, (types.BuiltinFunctionType, np.ufunc)):
+            h.update(b'B')
+            self.add(f'{getattr(value, "__module__", None)}.{value.__name__}')
+        else:
+            # raises NotFingerprintable for classes, objects, etc.
+            self.add(value)
+
+    def digest(self):
+        return self._hash.digest()
@@ -0,0 +1,12 @@
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+
+@dataclass
+class RefChannels:
+    '''
+    Start time and phases of the reference channels of a segment.
+    '''
+    start_time: float
+    start_phase: Dict[str,float] = field(default_factory=dict)
+    start_phases_all: List[Dict[str,float]] = field(default_factory=list)
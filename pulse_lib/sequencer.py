@@ -3,17 +3,20 @@ from qcodes import Parameter
 from .schedule.hardware_schedule import HardwareSchedule
 from .segments.conditional_segment import conditional_segment
 from .segments.data_classes.data_HVI_variables import marker_HVI_variable
-from .segments.data_classes.data_generic import data_container, parent_data
+from .segments.data_classes.data_generic import data_container
+from .segments.segment_base import segment_base
 from .segments.segment_container import segment_container
 from .segments.utility.data_handling_functions import find_common_dimension, update_dimension
 from .segments.utility.setpoint_mgr import setpoint_mgr
 from .segments.utility.looping import loop_obj
 from .segments.utility.measurement_ref import MeasurementRef
+from .segments.utility.ref_channels import RefChannels
+from .segments.utility.rounding import iround
 from .measurements_description import measurements_description
 
 from si_prefix import si_format
 
-from typing import List
+from typing import Dict, List
 from collections.abc import Iterable
 import numpy as np
 import uuid
@@ -143,21 +146,6 @@ class sequencer():
             seg_container.enter_rendering_mode()
             self._shape = find_common_dimension(seg_container.shape, self._shape)
 
-        # Set the waveform cache equal to the sum over all channels and segments of the max axis length.
-        # The cache will than be big enough for 1D iterations along every axis. This gives best performance
-        total_axis_length = 0
-        for seg_container in self.sequence:
-            if not isinstance(seg_container, conditional_segment):
-                for channel_name in seg_container.channels:
-                    shape = seg_container[channel_name].data.shape
-                    total_axis_length += max(shape)
-            else:
-                for branch in seg_container.branches:
-                    for channel_name in branch.channels:
-                        shape = branch[channel_name].data.shape
-                        total_axis_length += max(shape)
-        parent_data.set_waveform_cache_size(total_axis_length)
-
         self._shape = tuple(self._shape)
         self._sweep_index = [0]*self.ndim
         self._HVI_variables = data_container(marker_HVI_variable())
@@ -270,6 +258,12 @@ class sequencer():
         Remark that upload and play can run at the same time and it is best to
         start multiple uploads at once (during upload you can do playback, when the first one is finihsed)
         (note that this is only possible if you AWG supports upload while doing playback)
+
+        With a pipelined Keysight uploader (`uploader.start_pipeline()`) the job is rendered and
+        uploaded in the background. The returned job is future-like: `job.result()` waits till
+        the upload is complete and raises the exception of a failed upload.
+        Returns:
+            upload job.
         '''
         self._validate_index(index)
         upload_job = self.uploader.create_job(self.sequence, index, self.id, self.n_rep, self._sample_rate, self.neutralize)
@@ -321,6 +315,76 @@ class sequencer():
         self.uploader.release_memory(self.id, index)
 
 
+    def render_sweep(self, axis=None, channels=None, index=None, sample_rate=None):
+        '''
+        Renders the waveforms of the sequence for all indices along a loop axis, or for all indices.
+        The segments are rendered for all indices at once. See segment_base.render_all.
+        Channel delays, DC compensation and bias-T compensation are not applied.
+
+        Args:
+            axis (int): loop axis to sweep. If None all indices are rendered.
+            channels (list[str]): channels to render. If None all channels are rendered.
+            index (tuple): index for the axes that are not swept. Default is (0,)*ndim.
+            sample_rate (float): sample rate for all segments. Default is the sample rate of the sequence.
+
+        Returns:
+            indices (list[tuple]): indices of the rows of the waveforms.
+            waveforms (Dict[str, np.ndarray[n_indices, n_samples]]): waveform per channel.
+                Waveforms shorter than the longest waveform are padded with zeros.
+        '''
+        for seg_container in self.sequence:
+            if isinstance(seg_container, conditional_segment):
+                raise Exception('render_sweep does not support conditional segments')
+
+        if sample_rate is None:
+            sample_rate = self._sample_rate
+        if channels is None:
+            seg_container = self.sequence[0]
+            channels = [name for name in seg_container.channels if isinstance(seg_container[name], segment_base)]
+
+        if axis is None:
+            indices = list(np.ndindex(self.shape))
+        else:
+            index = list(index) if index is not None else [0]*self.ndim
+            self._validate_index(index)
+            dim = self.ndim - 1 - axis
+            indices = []
+            for i in range(self.shape[dim]):
+                index[dim] = i
+                indices.append(tuple(index))
+
+        # start of segments in samples and ns.
+        n_indices = len(indices)
+        offsets = np.zeros((len(self.sequence)+1, n_indices), dtype=int)
+        for iseg, seg_container in enumerate(self.sequence):
+            npt = [iround(seg_container.get_total_time(index) * sample_rate * 1e-9) for index in indices]
+            offsets[iseg+1] = offsets[iseg] + npt
+        t_starts = offsets / (sample_rate * 1e-9)
+
+        # phase of the qubit channels at the start of the segments
+        qubit_channels = [qubit_channel.channel_name
+                          for IQ_channel in self.sequence[0]._IQ_channel_objs
+                          for qubit_channel in IQ_channel.qubit_channels]
+        phases = {name:np.zeros(n_indices) for name in qubit_channels}
+        ref_channel_states = []
+        for iseg, seg_container in enumerate(self.sequence):
+            ref_channel_states.append([RefChannels(t_starts[iseg, i],
+                                                   {name:phase[i] for name, phase in phases.items()})
+                                       for i in range(n_indices)])
+            for name, phase in phases.items():
+                seg_ch = seg_container[name]
+                phase += [seg_ch.get_accumulated_phase(index) for index in indices]
+
+        waveforms = {}
+        for channel_name in channels:
+            out = np.zeros((n_indices, np.max(offsets[-1])))
+            for iseg, seg_container in enumerate(self.sequence):
+                seg_container[channel_name].render_indices_into(out, offsets[iseg], indices, sample_rate,
+                                                                ref_channel_states[iseg])
+            waveforms[channel_name] = out
+
+        return indices, waveforms
+
     def set_sweep_index(self,dim,value):
         self._sweep_index[dim] = value
 
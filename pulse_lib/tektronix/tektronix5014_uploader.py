@@ -7,6 +7,8 @@ from typing import List, Dict, Optional
 from concurrent.futures.thread import ThreadPoolExecutor
 
 from pulse_lib.segments.data_classes.data_markers import marker_pulse
+from pulse_lib.segments.data_classes.data_generic import parent_data
+from pulse_lib.segments.utility.ref_channels import RefChannels
 
 from .wrapped_5014 import Wrapped5014
 
@@ -53,6 +55,7 @@ class Tektronix5014_Uploader:
         self.awg_sync = awg_sync
 
         self.job = None
+        self._pinned_keys = None
 
         self.setup_slaves()
 
@@ -97,7 +100,9 @@ class Tektronix5014_Uploader:
                                       self.digitizer_channels, self.digitizer_markers,
                                       self.qubit_channels, awg_sync)
 
-        aggregator.upload_job(job)
+        # record the cached waveforms used by the job
+        with parent_data.waveform_cache.record_keys(job.cache_keys):
+            aggregator.upload_job(job)
 
         self.job = job
 
@@ -133,6 +138,13 @@ class Tektronix5014_Uploader:
         """
 
         job =  self.__get_job(seq_id, index)
+        # keep the waveforms of the playing job in the waveform cache till the next job is played.
+        cache = parent_data.waveform_cache
+        cache.pin_keys(job.cache_keys)
+        if self._pinned_keys is not None:
+            cache.unpin_keys(self._pinned_keys)
+        self._pinned_keys = job.cache_keys
+
         enable_channels = dict()
         for channel in self.awg_channels.values():
             enable_channels.setdefault(channel.awg_name, set()).add(channel.channel_number)
@@ -184,6 +196,8 @@ class Job(object):
         self.playback_time = 0 #total playtime of the waveform
 
         self.released = False
+        # keys of the waveforms in the waveform cache used by the job
+        self.cache_keys = set()
 
         self.hw_schedule = None
         self.digitizer_triggers = []
@@ -255,13 +269,6 @@ class SegmentRenderInfo:
     def t_end(self):
         return self.t_start + self.npt / self.sample_rate
 
-@dataclass
-class RefChannels:
-    start_time: float
-    start_phase: Dict[str,float] = field(default_factory=dict)
-    start_phases_all: List[Dict[str,float]] = field(default_factory=list)
-
-
 class UploadAggregator:
     verbose = False
 
@@ -418,20 +425,17 @@ class UploadAggregator:
                 seg_ch = getattr(seg, channel_name)
                 ref_channel_states.start_time = seg_render.t_start
                 ref_channel_states.start_phase = ref_channel_states.start_phases_all[iseg]
+                if section != seg_render.section:
+                    logging.error(f'OOPS-2 section mismatch {iseg}, {channel_name}')
+                offset = seg_render.offset + n_delay
                 start = time.perf_counter()
                 #print(f'start: {channel_name}.{iseg}: {ref_channel_states.start_time}')
-                wvf = seg_ch.get_segment(job.index, sample_rate*1e9, ref_channel_states)
+                n_samples = seg_ch.render_into(buffer, offset, job.index, sample_rate*1e9, ref_channel_states)
                 duration = time.perf_counter() - start
-                logging.debug(f'generated [{job.index}]{iseg}:{channel_name} {len(wvf)} Sa, in {duration*1000:6.3f} ms')
-
-                if len(wvf) != seg_render.npt:
-                    logging.warn(f'waveform {iseg}:{channel_name} {len(wvf)} Sa <> sequence length {seg_render.npt}')
+                logging.debug(f'generated [{job.index}]{iseg}:{channel_name} {n_samples} Sa, in {duration*1000:6.3f} ms')
 
-                i_start = 0
-                if section != seg_render.section:
-                    logging.error(f'OOPS-2 section mismatch {iseg}, {channel_name}')
-                offset = seg_render.offset + n_delay
-                buffer[offset+i_start:offset + len(wvf)] = wvf[i_start:]
+                if n_samples != seg_render.npt:
+                    logging.warn(f'waveform {iseg}:{channel_name} {n_samples} Sa <> sequence length {seg_render.npt}')
 
 
             if job.neutralize:
@@ -11,21 +11,60 @@ from qcodes.instrument.base import Instrument
 
 
 class MemoryManager:
-    def __init__(self):
-        self._free_slots = [i for i in range(50)]
+    '''
+    Mock of the waveform memory of the AWG module.
+    Args:
+        n_slots (int): maximum number of waveforms.
+        capacity (int): size of the waveform memory in bytes.
+    '''
+    BYTES_PER_SAMPLE = 2
+
+    def __init__(self, n_slots=50, capacity=2_000_000_000):
+        self.n_slots = n_slots
+        self.capacity = capacity
+        self._free_slots = [i for i in range(n_slots)]
         self._used_slots = {}
+        self._memory_used = 0
 
     def allocate(self, size):
+        nbytes = size * MemoryManager.BYTES_PER_SAMPLE
+        if len(self._free_slots) == 0:
+            raise MemoryError(f'No free waveform slot ({self.n_slots} slots in use)')
+        if self._memory_used + nbytes > self.capacity:
+            raise MemoryError(f'Insufficient AWG memory for {nbytes} bytes '
+                              f'({self.memory_used}/{self.capacity} bytes in use)')
         slot = self._free_slots.pop(0)
         self._used_slots[slot] = size
+        self._memory_used += nbytes
         logging.info(f'allocated {slot}: {size}')
         return slot
 
     def free(self, slot):
         size = self._used_slots.pop(slot)
         self._free_slots.append(slot)
+        self._memory_used -= size * MemoryManager.BYTES_PER_SAMPLE
         logging.info(f'freed {slot}: {size}')
 
+    @property
+    def memory_used(self):
+        return self._memory_used
+
+    @property
+    def memory_free(self):
+        return self.capacity - self._memory_used
+
+    @property
+    def n_used_slots(self):
+        return len(self._used_slots)
+
+    def get_info(self):
+        return {
+            'n_slots': self.n_slots,
+            'n_used_slots': self.n_used_slots,
+            'capacity': self.capacity,
+            'memory_used': self.memory_used,
+            }
+
 @dataclass
 class WaveformReference:
     wave_number: int
@@ -84,7 +123,7 @@ class MockM3202A(Instrument):
 
     def awg_queue_waveform(self, channel, waveform_ref, trigger_mode, start_delay, cycles, prescaler):
         logging.info(f'{self.name}.awg_queue_waveform({channel}, {waveform_ref.wave_number}, {trigger_mode}, {start_delay}, {cycles}, {prescaler})')
-        self.channel_data[channel].append(waveform_ref.waveform * self.amplitudes[channel])
+        self.channel_data[channel].append(np.tile(waveform_ref.waveform, cycles) * self.amplitudes[channel])
         self.channel_prescaler[channel].append(prescaler)
 
     def awg_is_running(self, channel):
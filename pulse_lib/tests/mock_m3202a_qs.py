@@ -67,6 +67,10 @@ class Waveform:
         if not self.amplitude:
             return np.zeros(0)
         amplitude = self.amplitude
+        if self.frequency is None:
+            # baseband waveform
+            wave = 0.001 * amplitude * np.broadcast_to(self.am_envelope, (self.duration,))
+            return np.concatenate([np.zeros(self.offset), wave])
         t = starttime + self.offset + np.arange(self.duration)
         phase = phase + not_none(self.prephase, 0) + not_none(self.pm_envelope, 0)
         modulated_wave = 0.001 * amplitude * np.sin(2*np.pi*self.frequency*1e-9*t + phase)
@@ -133,13 +137,13 @@ class SequencerChannel:
     def load_schedule(self, schedule:List[AwgInstruction]):
         self._schedule = schedule
 
-    def _plot(self, phase, label):
-        if len(self._schedule) == 0:
-            return
+    def render(self, phase=None):
+        '''
+        Returns the output of the sequencer with 1 ns resolution.
+        '''
         starttime = 0
-        phase = phase
+        phase = self._phaseI if phase is None else phase
         wave = np.zeros(0)
-        print(f'{label}:{len(self._schedule)}')
         for inst in self._schedule:
             duration = inst.wait_after
             wvf_nr = inst.wave_numbers[0] if isinstance(inst, AwgConditionalInstruction) else inst.wave_number
@@ -153,6 +157,13 @@ class SequencerChannel:
             else:
                 wave = np.concatenate([wave, np.zeros(int(duration))])
             starttime += duration
+        return wave
+
+    def _plot(self, phase, label):
+        if len(self._schedule) == 0:
+            return
+        print(f'{label}:{len(self._schedule)}')
+        wave = self.render(phase)
         pt.plot(np.arange(len(wave)), wave, label=label)
 
     def plot(self):